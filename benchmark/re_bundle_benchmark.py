@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""Compares one NAMD unit per replica with NAMD multi-copy bundles, using the
+CDI replica exchange usecase (alanin). For every bundle size the run writes
+the usual RADICAL_ENMD_PROFILING profile; this script collects the MD step
+durations and the client-side overhead per cycle into a CSV file.
+"""
+
+import os
+import sys
+import csv
+import time
+import glob
+
+os.environ["RADICAL_ENMD_PROFILING"] = "1"
+
+USECASE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "..", "usecases", "cdi_replica_exchange")
+sys.path.insert(0, USECASE)
+
+from radical.ensemblemd import EnsemblemdError
+from radical.ensemblemd import SingleClusterEnvironment
+from replica_exchange_mode_1 import RePattern
+
+# ------------------------------------------------------------------------------
+# BENCHMARK PARAMETERS
+#
+config = {
+    "resource":     "xsede.stampede",
+    "project":      None,
+    "cores":        64,
+    "replicas":     [64],
+    "cycles":       4,
+    "bundle_sizes": [None, 8, 64],
+    "results":      "re_bundle_results.csv"
+ }
+
+def read_profile(profiler):
+    '''Returns a dictionary mapping (cycle, step) to durations from the
+    profile events of the replica exchange steps.
+    '''
+    probes = {}
+    for pattern, stage, iteration, instance, probe, timestamp in profiler.events():
+        if (pattern is not None) and (instance is None):
+            probes[(iteration, stage, probe)] = timestamp
+
+    durations = {}
+    for (cycle, stage, probe), start in probes.items():
+        if probe != "start":
+            continue
+        if (cycle, stage, "stop") in probes:
+            durations[(cycle, stage)] = probes[(cycle, stage, "stop")] - start
+        if (cycle, stage, "submit") in probes:
+            durations[(cycle, stage + "_enmd_overhead")] = probes[(cycle, stage, "submit")] - start
+    return durations
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == "__main__":
+
+    results = open(config["results"], "w")
+    writer = csv.writer(results)
+    writer.writerow(["replicas", "bundle_size", "units_per_cycle", "cycle",
+                     "md_step", "md_step_enmd_overhead", "total"])
+
+    try:
+        os.chdir(USECASE)
+
+        for replicas in config["replicas"]:
+            for bundle_size in config["bundle_sizes"]:
+
+                print "\n\nreplicas: %s bundle size: %s" % (replicas, bundle_size)
+
+                cluster = SingleClusterEnvironment(
+                    resource=config["resource"],
+                    cores=config["cores"],
+                    walltime=30,
+                    username=None,
+                    project=config["project"],
+                    database_url=os.environ.get("RADICAL_PILOT_DBURL")
+                )
+                cluster.allocate()
+
+                re_pattern = RePattern()
+                re_pattern.replicas = replicas
+                re_pattern.nr_cycles = config["cycles"]
+                re_pattern.bundle_size = bundle_size
+                re_pattern.checkpoint_file = None
+                re_pattern.add_replicas(re_pattern.initialize_replicas())
+
+                start = time.time()
+                cluster.run(re_pattern, force_plugin="replica_exchange.static_pattern_2")
+                total = time.time() - start
+
+                durations = read_profile(cluster._profiler)
+                cluster.deallocate()
+
+                units = replicas if bundle_size is None else \
+                        (replicas + bundle_size - 1) // bundle_size
+                for c in range(1, config["cycles"] + 1):
+                    writer.writerow([replicas, bundle_size, units, c,
+                                     durations.get((c, "md_step")),
+                                     durations.get((c, "md_step_enmd_overhead")),
+                                     total])
+                results.flush()
+
+                # remove generated files of this run
+                for f in glob.glob("alanin_base_*") + glob.glob("matrix_column_*"):
+                    os.remove(f)
+
+    except EnsemblemdError, er:
+        print "Ensemble MD Toolkit Error: {0}".format(str(er))
+
+    finally:
+        results.close()
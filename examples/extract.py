@@ -1,4 +1,7 @@
 import sys
 
+def extract(output):
+	return output.splitlines()[1].strip()
+
 if __name__ == '__main__':
-	print sys.stdin.readlines()[1].strip()
+	print extract(sys.stdin.read())
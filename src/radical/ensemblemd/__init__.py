@@ -10,6 +10,7 @@ from radical.ensemblemd.exceptions import NotImplementedError
 from radical.ensemblemd.exceptions import NoKernelPluginError
 from radical.ensemblemd.exceptions import NoExecutionPluginError
 from radical.ensemblemd.exceptions import NoKernelConfigurationError
+from radical.ensemblemd.exceptions import WalltimeError
 
 # Primitives / Building Blocks
 from radical.ensemblemd.file import File
@@ -24,3 +25,15 @@ from radical.ensemblemd.patterns.replica_exchange import Replica
 
 # Execution Contexts
 from radical.ensemblemd.single_cluster_environment import SingleClusterEnvironment as ResourceHandle
+from radical.ensemblemd.multi_cluster_environment import MultiClusterEnvironment
+from radical.ensemblemd.local_environment import LocalEnvironment
+from radical.ensemblemd.emulated_environment import EmulatedEnvironment
+from radical.ensemblemd.emulator import EmulationModel
+
+# Execution Policies
+from radical.ensemblemd.resize_policy import ResizePolicy
+from radical.ensemblemd.failure_policy import FailurePolicy
+from radical.ensemblemd.straggler_policy import StragglerPolicy
+from radical.ensemblemd.fair_share_policy import FairSharePolicy
+from radical.ensemblemd.walltime_policy import WalltimePolicy
+from radical.ensemblemd.task_cache import TaskCache
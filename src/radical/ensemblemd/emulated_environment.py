@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""A static execution context whose pilot and tasks are emulated.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import datetime
+import traceback
+import radical.utils as ru
+
+from radical.ensemblemd import version
+from radical.ensemblemd.exceptions import EnsemblemdError
+from radical.ensemblemd.emulator import EmulationModel, EmulatedPilot, EmulatedUnitManager
+from radical.ensemblemd.local_unit_manager import LocalSession
+from radical.ensemblemd.profiler import Profiler
+from radical.ensemblemd.single_cluster_environment import SingleClusterEnvironment
+
+
+#-------------------------------------------------------------------------------
+#
+class EmulatedEnvironment(SingleClusterEnvironment):
+    """An emulated environment runs a pattern with the static execution
+       plugins, but no task is launched: a discrete-event emulator plays
+       the pilot and the unit manager on a virtual clock, following an
+       EmulationModel of queue wait, launch overhead, staging bandwidth and
+       task durations. This makes it possible to study how a pattern and
+       EnsembleMD itself behave at 10k-1M tasks without a cluster.
+
+       The real time EnsembleMD spends between waits is added to the virtual
+       clock as client-side overhead. Patterns that read the output files of
+       their tasks on the client cannot be emulated, as no files are
+       produced.
+
+       Example::
+
+            cluster = EmulatedEnvironment(
+                resource="xsede.stampede", cores=4096, walltime=120,
+                model=EmulationModel(queue_wait=900, duration=300))
+            cluster.allocate()
+            cluster.run(pattern)
+            cluster.deallocate()
+            print cluster.metrics["makespan"], cluster.metrics["utilization"]
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, resource, cores, walltime, model=None, **kwargs):
+        """Creates a new ExecutionContext instance.
+
+        Arguments:
+        resource - resource whose machine configuration the kernels use
+        cores - number of cores of the emulated pilot
+        walltime - walltime of the emulated pilot in minutes
+        model - the EmulationModel, defaults to EmulationModel()
+        kwargs - further SingleClusterEnvironment arguments, they are
+        accepted but not emulated
+        """
+        super(EmulatedEnvironment, self).__init__(resource, cores, walltime, **kwargs)
+
+        if model is None:
+            model = EmulationModel()
+        self._model = model
+
+        # the emulated pilot cannot grow
+        self._resize_policy = None
+
+        self._logger  = ru.get_logger('radical.entk.EmulatedEnvironment')
+        self._reporter = ru.LogReporter(name='radical.entk.EmulatedEnvironment')
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def metrics(self):
+        """Returns the makespan, utilization and client-side overhead of the
+        emulated run, see EmulatedUnitManager.metrics, and the hidden_time.
+        """
+        if self._umgr is None:
+            return {}
+        metrics = self._umgr.metrics
+        metrics["hidden_time"] = self._hidden_time
+        return metrics
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def remaining_walltime(self):
+        """Returns the virtual seconds of walltime left.
+        """
+        if self._umgr is None or self._umgr.active_at is None:
+            return self._walltime * 60.0
+        return self._walltime * 60.0 - (self._umgr.now - self._umgr.active_at)
+
+    #---------------------------------------------------------------------------
+    #
+    def allocate(self, wait=False):
+        """Submits the emulated pilot.
+
+        Arguments:
+        wait - advance the virtual clock until the pilot is active
+        """
+        self._allocate_called = True
+
+        self._reporter.title('EnsembleMD (%s)' % version)
+        self._reporter.info('Starting emulated allocation on {0}'.format(self._resource_key))
+
+        uid = "enmd.emulated.{0}.{1}".format(
+            datetime.datetime.now().strftime("%Y%m%d.%H%M%S"), os.getpid())
+        self._session = LocalSession(uid)
+        self._allocate_time = datetime.datetime.now()
+
+        self._pilot = EmulatedPilot("pilot.0000", self._resource_key, self._cores,
+                                    self._walltime, "/emulated/{0}/pilot.0000/".format(uid))
+        self._pilots = [self._pilot]
+        self._umgr = EmulatedUnitManager(self._pilot, self._model, self.get_logger())
+
+        # events and unit states are profiled on the virtual clock
+        clock = lambda: self._umgr.now
+        self._profiler = Profiler(enabled=self._profiler.enabled, clock=clock, wallclock=clock)
+
+        if self._shared_data is not None:
+            self._pilot.stage_in(list(self._shared_data))
+
+        if wait is True:
+            self._umgr.wait_pilot()
+
+        self._reporter.ok('>> ok')
+
+    #---------------------------------------------------------------------------
+    #
+    def _wait_active(self):
+        """Advances the virtual clock until the emulated pilot is active.
+        """
+        self._umgr.wait_pilot()
+        return self._pilot
+
+    #---------------------------------------------------------------------------
+    #
+    def resize(self, cores):
+        """The emulated pilot is not resized.
+        """
+        return self.capacity
+
+    #---------------------------------------------------------------------------
+    #
+    def run_async(self, pattern, force_plugin=None, resume=None, weight=1.0):
+        """The emulator advances its clock in the thread that waits, so
+        patterns cannot run concurrently on it.
+        """
+        raise EnsemblemdError(
+            msg="EmulatedEnvironment does not support run_async(), use run().")
+
+    #---------------------------------------------------------------------------
+    #
+    def deallocate(self):
+        """Ends the emulation and reports its metrics.
+        """
+        self._reporter.info('\nStarting Deallocation..\n')
+
+        if self._exctype != None:
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error: {0}.".format(str(self._excvalue)))
+            traceback.print_tb(self._traceback)
+
+        if self._umgr is not None:
+            self._umgr.close()
+            m = self.metrics
+            report = "Emulated {0} units ({1} done, {2} failed): makespan {3:.1f}s, queue wait {4:.1f}s, utilization {5:.1%}, EnMD overhead {6:.1f}s, {7:.1f}s of it hidden in the queue wait".format(
+                m["units"], m["done"], m["failed"], m["makespan"], m["queue_wait"] or 0.0,
+                m["utilization"], m["overhead"], m["hidden_time"])
+            self.get_logger().info(report)
+            self._reporter.info(report + '\n')
+
+        self._write_profile()
+
+        self._reporter.ok('>>done \n')
@@ -0,0 +1,607 @@
+#!/usr/bin/env python
+
+"""Discrete-event emulation of a pilot and its unit manager.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import time
+import heapq
+import datetime
+import collections
+import radical.pilot
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+from radical.ensemblemd.local_unit_manager import LocalState, normalize_directive
+from radical.ensemblemd.profiler import FIELDS
+
+FINAL_STATES = [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]
+
+# Columns of an execution profile that may follow the Executing state
+_AFTER_EXECUTING = ["AgentStagingOutputPending", "AgentStagingOutput",
+                    "PendingOutputStaging", "StagingOutput", "Done"]
+
+# ------------------------------------------------------------------------------
+#
+def _timestamp(value):
+    """Returns a timestamp of an execution profile in seconds, or None.
+    """
+    value = value.strip()
+    if value in ["", "None"]:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ["%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"]:
+        try:
+            t = datetime.datetime.strptime(value, fmt)
+            return (t - datetime.datetime(1970, 1, 1)).total_seconds()
+        except ValueError:
+            pass
+    return None
+
+
+# ------------------------------------------------------------------------------
+#
+class EmulationModel(object):
+    """Describes the behaviour of an emulated resource: how long the pilot
+       waits in the batch queue, the launch overhead of every task, the
+       bandwidth of file transfers and the task durations.
+
+       A duration is either a number of seconds, a callable that is given
+       the unit description and returns the seconds the task runs (e.g. to
+       sample durations), or a list of durations that are used in the
+       order the tasks are submitted. EmulationModel.from_profile() replays
+       the durations of the profile written by a previous run.
+
+       Example::
+
+            model = EmulationModel(queue_wait=600, launch_overhead=0.5,
+                                   duration=lambda cud: random.gauss(300, 30))
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, duration=60.0, queue_wait=0.0, launch_overhead=0.1,
+                 bandwidth=None, file_size=0):
+        """Creates a new EmulationModel instance.
+
+        Arguments:
+        duration - task duration in seconds, callable or list of durations
+        queue_wait - seconds the pilot waits in the batch queue
+        launch_overhead - seconds between allocating the cores of a task and
+        its start
+        bandwidth - bytes per second of transfers and copies, None for
+        instantaneous staging
+        file_size - size in bytes assumed for files that do not exist locally
+        """
+        if isinstance(duration, list) and not duration:
+            raise EnsemblemdError(msg="EmulationModel needs at least one duration.")
+
+        if queue_wait < 0 or launch_overhead < 0 or (bandwidth is not None and bandwidth <= 0):
+            raise EnsemblemdError(
+                msg="Queue wait and launch overhead must not be negative, bandwidth must be positive.")
+
+        self.duration = duration
+        self.queue_wait = queue_wait
+        self.launch_overhead = launch_overhead
+        self.bandwidth = bandwidth
+        self.file_size = file_size
+        self._replayed = 0
+
+    #---------------------------------------------------------------------------
+    #
+    @classmethod
+    def from_profile(cls, path, **kwargs):
+        """Creates a model that replays the task durations recorded in an
+        execution profile, the time from Executing to the next recorded
+        state of every task.
+
+        Arguments:
+        path - an enmd_profile_*.csv file, or an execution_profile_*.csv
+        file of earlier versions
+        kwargs - further arguments of EmulationModel
+        """
+        durations = []
+        columns = None
+        # (pattern, stage, iteration, instance) -> {state: timestamp}
+        states = collections.OrderedDict()
+        with open(path) as f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                sep = ';' if ';' in line else ','
+                fields = [c.strip() for c in line.strip().split(sep)]
+                if fields == FIELDS:
+                    columns = FIELDS
+                    continue
+                if columns is FIELDS:
+                    if len(fields) == len(FIELDS):
+                        states.setdefault(tuple(fields[:4]), {})[fields[4]] = float(fields[5])
+                    continue
+                if "Executing" in fields:
+                    columns = fields
+                    continue
+                if columns is None or len(fields) < len(columns) - 1:
+                    continue
+
+                row = dict(zip(columns, fields))
+                start = _timestamp(row.get("Executing", ""))
+                ends = [_timestamp(row.get(c, "")) for c in _AFTER_EXECUTING]
+                ends = [t for t in ends if t is not None]
+                if start is not None and ends:
+                    durations.append(max(0.0, min(ends) - start))
+
+        for timestamps in states.values():
+            ends = [timestamps[s] for s in _AFTER_EXECUTING if s in timestamps]
+            if "Executing" in timestamps and ends:
+                durations.append(max(0.0, min(ends) - timestamps["Executing"]))
+
+        if not durations:
+            raise EnsemblemdError(msg="No task durations found in {0}.".format(path))
+
+        kwargs["duration"] = durations
+        return cls(**kwargs)
+
+    #---------------------------------------------------------------------------
+    #
+    def task_duration(self, cud):
+        """Returns the duration of the task of a unit description.
+        """
+        if callable(self.duration):
+            return max(0.0, float(self.duration(cud)))
+        if isinstance(self.duration, list):
+            d = self.duration[self._replayed % len(self.duration)]
+            self._replayed += 1
+            return d
+        return float(self.duration)
+
+    #---------------------------------------------------------------------------
+    #
+    def staging_time(self, directives):
+        """Returns the seconds the transfers and copies of a list of staging
+        directives take. Links are free.
+        """
+        if self.bandwidth is None or not directives:
+            return 0.0
+
+        size = 0
+        for d in directives:
+            d = normalize_directive(d)
+            if d['action'] == radical.pilot.LINK:
+                continue
+            source = d['source']
+            if source.startswith('file://'):
+                source = source[len('file://'):]
+            if '://' not in source and os.path.isfile(source):
+                size += os.path.getsize(source)
+            else:
+                size += self.file_size
+        return size / float(self.bandwidth)
+
+
+# ------------------------------------------------------------------------------
+#
+class EmulatedUnit(object):
+    """A compute unit whose life cycle is emulated.
+    """
+
+    __slots__ = ["uid", "name", "description", "working_directory", "state",
+                 "state_history", "stdout", "stderr", "log", "cores",
+                 "start_time", "stop_time"]
+
+    def __init__(self, uid, description, working_directory):
+        self.uid = uid
+        self.name = description.name
+        self.description = description
+        self.working_directory = working_directory
+        self.state = radical.pilot.NEW
+        self.state_history = []
+        self.stdout = ""
+        self.stderr = None
+        self.log = []
+        self.cores = description.cores or 1
+        self.start_time = None
+        self.stop_time = None
+
+
+# ------------------------------------------------------------------------------
+#
+class EmulatedPilot(object):
+    """A pilot whose queue wait and walltime are emulated.
+    """
+
+    def __init__(self, uid, resource, cores, walltime, sandbox):
+        self.uid = uid
+        self.state = radical.pilot.PENDING_ACTIVE
+        self.description = {'resource': resource, 'cores': cores, 'runtime': walltime}
+        self.sandbox = sandbox
+        self.staged = 0
+
+    def stage_in(self, directives):
+        """Accepts data for the staging area, the emulated files take no
+        time to stage.
+        """
+        if not isinstance(directives, list):
+            directives = [directives]
+        self.staged += len(directives)
+
+    def wait(self, state=None, timeout=None):
+        return self.state
+
+
+# ------------------------------------------------------------------------------
+#
+class EmulatedUnitManager(object):
+    """Provides the unit manager interface the execution plugins use and
+    emulates the units on a virtual clock. Emulated time only advances
+    while the plugin waits for units; the real time the plugin spends
+    between calls, and in unit callbacks, is the client-side EnMD overhead
+    and is added to the virtual clock as well.
+
+    A unit's input is staged as soon as it is submitted. The unit then
+    waits for cores of the active pilot in submission order, runs for the
+    launch overhead and its duration, releases its cores and stages its
+    output. Units still running when the pilot walltime ends fail.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, pilot, model, logger):
+        """Creates a new EmulatedUnitManager.
+
+        Arguments:
+        pilot - the EmulatedPilot the units run on
+        model - the EmulationModel of the resource
+        logger - the execution context's logger
+        """
+        self._pilot = pilot
+        self._model = model
+        self._logger = logger
+
+        self._now = 0.0
+        self._events = []
+        self._seq = 0
+        self._units = collections.OrderedDict()
+        self._waiting = collections.deque()
+        self._callbacks = []
+        self._free = pilot.description['cores']
+
+        # metrics
+        self._active_at = None
+        self._ended_at = None
+        self._busy = 0.0
+        self._overhead = 0.0
+        self._mark = time.time()
+        self._depth = 0
+        # (uids, states) of the units wait_units() waits for
+        self._watches = []
+
+        self._at(model.queue_wait, self._pilot_active)
+        if pilot.description.get('runtime'):
+            self._at(model.queue_wait + pilot.description['runtime'] * 60.0, self._pilot_done)
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def now(self):
+        """Returns the virtual time in seconds since the pilot was submitted.
+        """
+        return self._now
+
+    @property
+    def active_at(self):
+        """Returns the virtual time the pilot became active, or None.
+        """
+        return self._active_at
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def metrics(self):
+        """Returns the makespan, utilization and client-side overhead of the
+        emulated run so far.
+
+        Returns:
+        metrics - dictionary with the keys
+          makespan - virtual seconds from pilot submission to the last event
+          queue_wait - virtual seconds until the pilot became active
+          utilization - busy core-seconds per core-second of the active pilot
+          overhead - real seconds spent in EnMD between and in callbacks
+          units, done, failed - number of units in total and per final state
+        """
+        end = self._ended_at if self._ended_at is not None else self._now
+        active = 0.0
+        if self._active_at is not None:
+            active = max(0.0, end - self._active_at) * self._pilot.description['cores']
+
+        states = [u.state for u in self._units.itervalues()]
+        return {
+            "makespan":    end,
+            "queue_wait":  self._active_at,
+            "utilization": (self._busy / active) if active else 0.0,
+            "overhead":    self._overhead,
+            "units":       len(states),
+            "done":        states.count(radical.pilot.DONE),
+            "failed":      states.count(radical.pilot.FAILED)
+        }
+
+    # --------------------------------------------------------------------------
+    #
+    def register_callback(self, callback):
+        """Registers a unit state callback, called as callback(unit, state).
+        """
+        self._callbacks.append(callback)
+
+    # --------------------------------------------------------------------------
+    #
+    def add_pilots(self, pilots):
+        pass
+
+    # --------------------------------------------------------------------------
+    #
+    def list_units(self):
+        return self._units.keys()
+
+    # --------------------------------------------------------------------------
+    #
+    def get_units(self, uids=None):
+        if uids is None:
+            return self._units.values()
+        if not isinstance(uids, list):
+            return self._units[uids]
+        return [self._units[uid] for uid in uids]
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_units(self, descriptions):
+        """Submits one or a list of unit descriptions, like
+        UnitManager.submit_units().
+        """
+        if not isinstance(descriptions, list):
+            return self.submit_units([descriptions])[0]
+
+        self._enter()
+        units = []
+        for cud in descriptions:
+            uid = "unit.{0:06d}".format(len(self._units))
+            unit = EmulatedUnit(uid, cud, "{0}{1}".format(self._pilot.sandbox, uid))
+            self._units[uid] = unit
+            units.append(unit)
+
+            self._set_state(unit, radical.pilot.SCHEDULING)
+            if unit.cores > self._pilot.description['cores']:
+                unit.stderr = "Unit needs {0} cores, the pilot has {1}.".format(
+                    unit.cores, self._pilot.description['cores'])
+                self._set_state(unit, radical.pilot.FAILED)
+                continue
+
+            self._set_state(unit, radical.pilot.STAGING_INPUT)
+            self._at(self._now + self._model.staging_time(cud.input_staging), self._queue, unit)
+
+        self._leave()
+        return units
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_units(self, uids=None, state=None, timeout=None):
+        """Advances the virtual clock until the units are in one of the
+        given states, by default a final state, or until the virtual
+        timeout has passed.
+
+        Returns:
+        states - the states of the units
+        """
+        self._enter()
+
+        if state is None:
+            state = FINAL_STATES
+        elif not isinstance(state, list):
+            state = [state]
+
+        single = uids is not None and not isinstance(uids, list)
+        if single:
+            uids = [uids]
+
+        deadline = None
+        if timeout is not None:
+            deadline = self._now + timeout
+
+        if uids is None:
+            units = self._units.values()
+        else:
+            units = [self._units[uid] for uid in uids]
+
+        # _set_state() removes the units that reach the states
+        pending = set([u.uid for u in units if u.state not in state and u.state not in FINAL_STATES])
+        watch = (pending, state)
+        self._watches.append(watch)
+        try:
+            while pending and self._events:
+                if deadline is not None and self._events[0][0] > deadline:
+                    break
+                self._step()
+            if pending and deadline is not None:
+                self._now = max(self._now, deadline)
+        finally:
+            self._watches.remove(watch)
+
+        states = [u.state for u in units]
+
+        self._leave()
+        if single:
+            return states[0]
+        return states
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_pilot(self):
+        """Advances the virtual clock until the pilot is active or final.
+        """
+        self._enter()
+        while self._pilot.state == radical.pilot.PENDING_ACTIVE and self._events:
+            self._step()
+        self._leave()
+        return self._pilot.state
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_units(self, uids=None):
+        """Cancels waiting and running units.
+        """
+        self._enter()
+        if uids is None:
+            uids = self._units.keys()
+        elif not isinstance(uids, list):
+            uids = [uids]
+
+        for uid in uids:
+            unit = self._units[uid]
+            if unit.state in FINAL_STATES:
+                continue
+            if unit in self._waiting:
+                self._waiting.remove(unit)
+            elif unit.state == radical.pilot.EXECUTING:
+                self._release(unit)
+            self._set_state(unit, radical.pilot.CANCELED)
+
+        self._dispatch()
+        self._leave()
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        """Ends the emulation.
+        """
+        self._enter()
+        self._leave()
+        if self._ended_at is None:
+            self._ended_at = self._now
+
+    # --------------------------------------------------------------------------
+    #
+    def _enter(self):
+        """Adds the real time since the last call into the unit manager to
+        the virtual clock, it was spent by the plugin. Calls made from unit
+        callbacks are accounted for by _set_state().
+        """
+        if self._depth == 0:
+            elapsed = time.time() - self._mark
+            self._now += elapsed
+            self._overhead += elapsed
+        self._depth += 1
+
+    def _leave(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._mark = time.time()
+
+    # --------------------------------------------------------------------------
+    #
+    def _at(self, when, action, unit=None):
+        heapq.heappush(self._events, (when, self._seq, action, unit))
+        self._seq += 1
+
+    # --------------------------------------------------------------------------
+    #
+    def _step(self):
+        when, seq, action, unit = heapq.heappop(self._events)
+        self._now = max(self._now, when)
+        if unit is None:
+            action()
+        elif unit.state not in FINAL_STATES:
+            action(unit)
+
+    # --------------------------------------------------------------------------
+    #
+    def _set_state(self, unit, state):
+        unit.state = state
+        unit.state_history.append(LocalState(state, self._now))
+        if state == radical.pilot.FAILED:
+            unit.log.append(unit.stderr)
+
+        for pending, states in self._watches:
+            if (state in states) or (state in FINAL_STATES):
+                pending.discard(unit.uid)
+
+        if self._callbacks:
+            start = time.time()
+            for cb in self._callbacks:
+                try:
+                    cb(unit, state)
+                except Exception, ex:
+                    self._logger.exception("Unit state callback failed: {0}".format(ex))
+            # the callbacks are plugin code
+            elapsed = time.time() - start
+            self._now += elapsed
+            self._overhead += elapsed
+
+    # --------------------------------------------------------------------------
+    #
+    def _pilot_active(self):
+        self._pilot.state = radical.pilot.ACTIVE
+        self._active_at = self._now
+        self._logger.info("Emulated pilot {0} is active after {1:.1f}s.".format(self._pilot.uid, self._now))
+        self._dispatch()
+
+    # --------------------------------------------------------------------------
+    #
+    def _pilot_done(self):
+        self._pilot.state = radical.pilot.DONE
+        self._ended_at = self._now
+        self._logger.info("Emulated pilot {0} reached its walltime.".format(self._pilot.uid))
+
+        for unit in self._units.values():
+            if unit.state not in FINAL_STATES:
+                if unit.state == radical.pilot.EXECUTING:
+                    self._release(unit)
+                unit.stderr = "Pilot walltime exceeded."
+                self._set_state(unit, radical.pilot.FAILED)
+        self._waiting.clear()
+
+    # --------------------------------------------------------------------------
+    #
+    def _queue(self, unit):
+        self._waiting.append(unit)
+        self._dispatch()
+
+    # --------------------------------------------------------------------------
+    #
+    def _dispatch(self):
+        """Starts the waiting units in submission order while their cores
+        fit into the free cores of the active pilot.
+        """
+        if self._pilot.state != radical.pilot.ACTIVE:
+            return
+
+        while self._waiting and self._waiting[0].cores <= self._free:
+            unit = self._waiting.popleft()
+            self._free -= unit.cores
+            duration = self._model.launch_overhead + self._model.task_duration(unit.description)
+            unit.start_time = self._now
+            self._set_state(unit, radical.pilot.EXECUTING)
+            self._at(self._now + duration, self._finish, unit)
+
+    # --------------------------------------------------------------------------
+    #
+    def _release(self, unit):
+        unit.stop_time = self._now
+        self._busy += unit.cores * (unit.stop_time - unit.start_time)
+        self._free += unit.cores
+
+    # --------------------------------------------------------------------------
+    #
+    def _finish(self, unit):
+        self._release(unit)
+        self._set_state(unit, radical.pilot.STAGING_OUTPUT)
+        self._at(self._now + self._model.staging_time(unit.description.output_staging), self._done, unit)
+        self._dispatch()
+
+    # --------------------------------------------------------------------------
+    #
+    def _done(self, unit):
+        self._set_state(unit, radical.pilot.DONE)
@@ -163,7 +163,12 @@ class Engine(object):
 				pattern_name,
 				context_name)
 			)
-			return plugin
+			# plugins keep the state of a run on themselves, every run gets
+			# a fresh instance so that concurrent runs do not share it. The
+			# plugins are singletons, so bypass the metaclass to get one.
+			run_plugin = plugin.__class__.__new__(plugin.__class__)
+			run_plugin.__init__()
+			return run_plugin
 		else:
 			error = NoExecutionPluginError(
 				pattern_name=pattern_name,
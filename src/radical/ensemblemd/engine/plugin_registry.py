@@ -17,5 +17,14 @@ plugin_registry = [ "radical.ensemblemd.exec_plugins.pipeline.static",
                     "radical.ensemblemd.exec_plugins.replica_exchange.static_pattern_2",
                     "radical.ensemblemd.exec_plugins.replica_exchange.static_pattern_3",
                     "radical.ensemblemd.exec_plugins.allpairs.static",
-                    "radical.ensemblemd.exec_plugins.bag_of_tasks.static"
+                    "radical.ensemblemd.exec_plugins.bag_of_tasks.static",
+                    "radical.ensemblemd.exec_plugins.pipeline.dynamic",
+                    "radical.ensemblemd.exec_plugins.bag_of_tasks.dynamic",
+                    "radical.ensemblemd.exec_plugins.pipeline.local",
+                    "radical.ensemblemd.exec_plugins.simulation_analysis_loop.local",
+                    "radical.ensemblemd.exec_plugins.replica_exchange.local_pattern_1",
+                    "radical.ensemblemd.exec_plugins.replica_exchange.local_pattern_2",
+                    "radical.ensemblemd.exec_plugins.replica_exchange.local_pattern_3",
+                    "radical.ensemblemd.exec_plugins.allpairs.local",
+                    "radical.ensemblemd.exec_plugins.bag_of_tasks.local"
                   ]
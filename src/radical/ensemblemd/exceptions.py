@@ -103,3 +103,18 @@ class NoExecutionPluginError(EnsemblemdError):
                 context_name,
             )         
         super(NoExecutionPluginError, self).__init__ (msg)
+
+# ------------------------------------------------------------------------------
+#
+class WalltimeError(EnsemblemdError):
+    """WalltimeError is thrown if the next tasks of a pattern cannot finish in
+    the remaining walltime of the pilots. The execution contexts stop the
+    run cleanly when they catch it.
+    """
+    def __init__ (self, name, estimate, remaining):
+        msg = "{0} needs an estimated {1:.0f}s, but only {2:.0f}s of walltime remain.".format(
+            name,
+            estimate,
+            remaining
+        )
+        super(WalltimeError, self).__init__ (msg)
@@ -16,6 +16,7 @@ import datetime
 import radical.pilot
 from radical.ensemblemd.exceptions import NotImplementedError
 from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
 
 # ------------------------------------------------------------------------------
 #
@@ -57,11 +58,10 @@ class Plugin(PluginBase):
                 self.get_logger().info("Task {0} state has finished succefully.".format(unit.uid))
 
             if state==radical.pilot.FAILED:
-                # In Case the pilot fails report Error messsage
+                # In Case the pilot fails report Error messsage, the
+                # FailureHandler resubmits the task after wait_units()
                 self.get_logger().error("Task {0} FAILED.".format(unit.uid))
                 self.get_logger().error("Error: {0}".format(unit.stderr))
-                self.get_logger().error("Pattern execution FAILED.")
-                sys.exit(1)
 
         def comparisons (set1,set2):
             ret = list ()
@@ -101,14 +101,15 @@ class Plugin(PluginBase):
         STAGING_AREA = 'staging:///'
         
 
-        self.get_logger().info("Waiting for pilot on {0} to go Active".format(resource._resource_key))
-        self._reporter.info("Job waiting on queue...".format(resource._resource_key))
-        resource._pmgr.wait_pilots(resource._pilot.uid,'Active')
-        self._reporter.ok("\nJob is now running !".format(resource._resource_key))
+        # the first tasks are prepared while the pilot waits in the queue,
+        # their submission waits until it is active (see PreStager)
+        self._reporter.info("Preparing the first tasks while the job waits on queue...")
 
         try:
             
             resource._umgr.register_callback(unit_state_cb)
+            failures = FailureHandler(resource, pattern.failure_policy, self.get_logger(),
+                pattern.straggler_policy)
             CUDesc_list = list()
             self.get_logger().info("Creating the Elements of Set 1")
             
@@ -157,11 +158,10 @@ class Plugin(PluginBase):
                         kernel._cu_def_executable,cudesc.arguments,cudesc.mpi,cudesc.output_staging))
                     CUDesc_list.append(cudesc)
             
-            Units = resource._umgr.submit_units(CUDesc_list)
+            Units = failures.submit_units(CUDesc_list)
             
             self._reporter.info("\nWaiting to create the elements of set 2 ")
-            uids = [cu.uid for cu in Units]
-            resource._umgr.wait_units(uids)
+            Units = failures.wait_units(Units)
             self._reporter.ok('>> done')
             CUDesc_list = list()
             all_cus = []
@@ -272,12 +272,11 @@ class Plugin(PluginBase):
                             kernel._cu_def_executable,cudesc.arguments,cudesc.mpi,cudesc.input_staging,cudesc.output_staging))
                         all_cus.append(cudesc)
             
-            sub_unit=resource._umgr.submit_units(all_cus)
+            sub_unit=failures.submit_units(all_cus)
             
             #self.get_logger().debug(sub_unit)
             self._reporter.info("\nWaiting for analysis step to complete.")
-            uids = [cu.uid for cu in sub_unit]
-            resource._umgr.wait_units(uids)
+            sub_unit = failures.wait_units(sub_unit)
             self._reporter.ok('>> done')
 
             step_end_time_abs = datetime.datetime.now()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+"""A dynamic execution plugin for single tasks. The tasks are bound to the
+resources of a MultiClusterEnvironment by the execution context.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.bag_of_tasks import static
+
+
+# ------------------------------------------------------------------------------
+#
+_PLUGIN_INFO = {
+	"name":         "bag_of_tasks.dynamic.default",
+	"pattern":      "BagofTasks",
+	"context_type": "Dynamic"
+}
+
+_PLUGIN_OPTIONS = []
+
+# ------------------------------------------------------------------------------
+#
+class Plugin(static.Plugin):
+
+	# --------------------------------------------------------------------------
+	#
+	def __init__(self):
+		PluginBase.__init__(self, _PLUGIN_INFO, _PLUGIN_OPTIONS)
@@ -13,11 +13,12 @@ import saga
 import time
 import traceback
 import pickle
-import datetime
 import radical.pilot
 
 from radical.ensemblemd.exceptions import NotImplementedError, EnsemblemdError
 from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+from radical.ensemblemd.exec_plugins.journal import open_journal
 
 
 # ------------------------------------------------------------------------------
@@ -75,16 +76,13 @@ class Plugin(PluginBase):
 	#
 	def execute_pattern(self, pattern, resource):
 
-		pattern_start_time = datetime.datetime.now()
-		
 		#-----------------------------------------------------------------------
 		#
 		def unit_state_cb (unit, state) :
 
+			# failed units are handled by the FailureHandler after wait_units()
 			if state == radical.pilot.FAILED:
 				self.get_logger().error("Task with ID {0} failed: STDERR: {1}, STDOUT: {2} LAST LOG: {3}".format(unit.uid, unit.stderr, unit.stdout, unit.log[-1]))
-				self.get_logger().error("Pattern execution FAILED.")
-				sys.exit(1)
 
 		self._reporter.ok('>>ok')
 		pipeline_instances = pattern.instances
@@ -99,34 +97,38 @@ class Plugin(PluginBase):
 		
 		working_dirs = {}
 
-		self.get_logger().info("Waiting for pilot on {0} to go Active".format(resource._resource_key))
-		self._reporter.info("Job waiting on queue...".format(resource._resource_key))
-		resource._pmgr.wait_pilots(resource._pilot.uid,'Active')
-		self._reporter.ok("\nJob is now running !".format(resource._resource_key))
-
-		profiling = int(os.environ.get('RADICAL_ENMD_PROFILING',0))
+		# the first tasks are prepared while the pilot waits in the queue,
+		# their submission waits until it is active (see PreStager)
+		self._reporter.info("Preparing the first tasks while the job waits on queue...")
 
-		if profiling == 1:
-			from collections import OrderedDict as od
-			pattern._execution_profile = []
-			enmd_overhead_dict = od()
-			cu_dict = od()
+		profiler = resource._profiler
 
 		try:
 
+			profiler.prof(pattern.name, None, 'start')
+
 			resource._umgr.register_callback(unit_state_cb)
+			failures = FailureHandler(resource, pattern.failure_policy, self.get_logger(),
+				pattern.straggler_policy)
+
+			# stages recorded in the journal of a resumed run are skipped
+			journal, records = open_journal(pattern, resource)
+			for record in records:
+				working_dirs[record['stage']] = record['working_dirs']
+
+			if records:
+				self._reporter.info("\nResuming after {0} completed stage(s)".format(len(records)))
 
 			enmd_overhead_list = []
 			rp_overhead_list = []
 			# Iterate over the different stages.
 			for stage in range(1, pipeline_stages+1):
 
-				if profiling == 1:
-					probe_start_time = datetime.datetime.now()
-					enmd_overhead_dict['stage_{0}'.format(stage)] = od()
-					cu_dict['stage_{0}'.format(stage)] = list()
+				if 'stage_{0}'.format(stage) in working_dirs:
+					self.get_logger().info("stage_{0} completed in resumed run.".format(stage))
+					continue
 
-					enmd_overhead_dict['stage_{0}'.format(stage)]['start_time'] = probe_start_time
+				profiler.prof(pattern.name, 'stage_{0}'.format(stage), 'start')
 
 				working_dirs['stage_{0}'.format(stage)] = {}
 				check_instance_files = []
@@ -146,15 +148,10 @@ class Plugin(PluginBase):
 				for instance in range(1, pipeline_instances+1):
 
 					kernel = s_meth(instance)
-					kernel._bind_to_resource(resource._resource_key)
 
 					cud = radical.pilot.ComputeUnitDescription()
 					cud.name = "stage_{0}".format(stage)
 
-					cud.pre_exec       = kernel._cu_def_pre_exec
-					cud.executable     = kernel._cu_def_executable
-					cud.arguments      = kernel.arguments
-					cud.mpi            = kernel.uses_mpi
 					cud.input_staging  = None
 					cud.output_staging = None
 
@@ -320,6 +317,9 @@ class Plugin(PluginBase):
 					if kernel.cores is not None:
 						cud.cores = kernel.cores
 
+					# the execution context picks the resource of the task
+					resource._bind_unit(cud, kernel)
+
 					p_units.append(cud)
 
 				self.get_logger().debug("Created stage_{0} CU: {1}.".format(stage,cud.as_dict()))
@@ -328,22 +328,18 @@ class Plugin(PluginBase):
 				self.get_logger().info("Submitted tasks for stage_{0}.".format(stage))
 				self._reporter.info("\nWaiting for stage_{0} to complete.".format(stage))
 
-				if profiling == 1:
-					enmd_overhead_dict['stage_{0}'.format(stage)]['wait_time'] = datetime.datetime.now()
+				profiler.prof(pattern.name, 'stage_{0}'.format(stage), 'submit')
 
-
-				p_cus = resource._umgr.submit_units(p_units)
+				p_cus = failures.submit_units(p_units)
+				p_cus = failures.wait_units(p_cus)
 				all_stage_cus.extend(p_cus)
-
-				uids = [cu.uid for cu in p_cus]
-				resource._umgr.wait_units(uids)
 				
 
 				self.get_logger().info("stage_{0}/kernel {1}: completed.".format(stage,kernel.name))
 
-				if profiling == 1:
-					enmd_overhead_dict['stage_{0}'.format(stage)]['res_time'] = datetime.datetime.now()
-
+				profiler.prof(pattern.name, 'stage_{0}'.format(stage), 'done')
+				for cu in p_cus:
+					profiler.prof_states(pattern.name, 'stage_{0}'.format(stage), cu)
 
 				# TODO: ensure working_dir <-> instance mapping
 				i = 0
@@ -351,14 +347,16 @@ class Plugin(PluginBase):
 					i += 1
 					working_dirs['stage_{0}'.format(stage)]['instance_{0}'.format(i)] = saga.Url(cu.working_directory).path
 
+				if journal is not None:
+					journal.append({'stage': 'stage_{0}'.format(stage),
+						'working_dirs': working_dirs['stage_{0}'.format(stage)]})
+
 				failed_units = ""
 				for unit in p_cus:
 					if unit.state != radical.pilot.DONE:
 						failed_units += " * stage_{0} failed with an error: {1}\n".format(stage, unit.stderr)
 
-				if profiling == 1:
-					enmd_overhead_dict['stage_{0}'.format(stage)]['stop_time'] = datetime.datetime.now()
-					cu_dict['stage_{0}'.format(stage)] = p_cus
+				profiler.prof(pattern.name, 'stage_{0}'.format(stage), 'stop')
 
 				self._reporter.ok('>> done')
 
@@ -366,75 +364,7 @@ class Plugin(PluginBase):
 			self._reporter.header('Pattern execution successfully finished')
 
 
-			#PROFILING
-			if profiling == 1:
-
-				#Pattern overhead logging
-				title = "stage,probe,timestamp"
-				f1 = open('enmd_pat_overhead.csv','w')
-				f1.write(title + "\n\n")
-
-				pipeline_stages = pattern.stages
-
-				for i in range(1,pipeline_stages+1):
-					stage = 'stage_{0}'.format(i)
-					for key,val in enmd_overhead_dict[stage].items():                        
-						probe = key
-						timestamp = val
-						entry = '{0},{1},{2}\n'.format(stage,probe,timestamp)
-						f1.write(entry)
-
-				f1.close()
-
-				#CU data logging
-				title = "uid, stage, Scheduling, StagingInput, AgentStagingInputPending, AgentStagingInput, AllocatingPending, Allocating, ExecutingPending, Executing, AgentStagingOutputPending, AgentStagingOutput, PendingOutputStaging, StagingOutput, Done"
-				f2 = open("execution_profile_{mysession}.csv".format(mysession=resource._session.uid),'w')
-				f2.write(title + "\n\n")
-
-				for i in range(1,pipeline_stages+1):
-					stage = 'stage_{0}'.format(i)
-					cus = cu_dict[stage]
-
-					for cu in cus:
-						st_data = {}
-						for st in cu.state_history:
-							st_dict = st.as_dict()
-							st_data["{0}".format( st_dict["state"] )] = {}
-							st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-						states = ['Scheduling,' 
-												'StagingInput', 'AgentStagingInputPending', 'AgentStagingInput',
-												'AllocatingPending', 'Allocating', 
-												'ExecutingPending', 'Executing', 
-												'AgentStagingOutputPending', 'AgentStagingOutput', 'PendingOutputStaging', 
-												'StagingOutput', 
-												'Done']
-
-						for state in states:
-							if (state in st_data) is False:
-								st_data[state] = None
-
-						line = "{uid}, {stage}, {Scheduling}, {StagingInput}, {AgentStagingInputPending}, {AgentStagingInput}, {AllocatingPending}, {Allocating}, {ExecutingPending},{Executing}, {AgentStagingOutputPending}, {AgentStagingOutput}, {PendingOutputStaging}, {StagingOutput}, {Done}".format(
-							uid=cu.uid,
-							stage=stage,
-							Scheduling=(st_data['Scheduling']),
-							StagingInput=(st_data['StagingInput']),
-							AgentStagingInputPending=(st_data['AgentStagingInputPending']),
-							AgentStagingInput=(st_data['AgentStagingInput']),
-							AllocatingPending=(st_data['AllocatingPending']),
-							Allocating=(st_data['Allocating']),
-							ExecutingPending=(st_data['ExecutingPending']),
-							Executing=(st_data['Executing']),
-							AgentStagingOutputPending=(st_data['AgentStagingOutputPending']),
-							AgentStagingOutput=(st_data['AgentStagingOutput']),
-							PendingOutputStaging=(st_data['PendingOutputStaging']),
-							StagingOutput=(st_data['StagingOutput']),
-							Done=(st_data['Done']))
-
-						f2.write(line + '\n')
-
-				f2.close()
-					
+			profiler.prof(pattern.name, None, 'stop')
 
 		except KeyboardInterrupt:
 
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+
+"""Resubmission of failed compute units according to a pattern's failure
+policy, and duplication of stragglers according to its straggler policy.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import time
+import weakref
+import threading
+import radical.pilot
+
+from radical.ensemblemd.exceptions import EnsemblemdError, WalltimeError
+from radical.ensemblemd.failure_policy import FailurePolicy
+from radical.ensemblemd.exec_plugins.prestaging import PreStager
+from radical.ensemblemd.profiler import epoch_seconds
+
+# ------------------------------------------------------------------------------
+#
+class FailureHandler(object):
+    """Submits compute units through the unit manager of an execution context
+    and keeps their descriptions, so that failed units can be resubmitted
+    and stragglers duplicated. Failures and duplicates are recorded in the
+    profile of the execution context, with the task as stage. The first
+    submission waits for the pilot (see PreStager). With a walltime policy
+    on the execution context, the runtimes of finished units are recorded
+    and units that cannot finish in the remaining walltime are refused.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, resource, policy, logger, stragglers=None):
+        """Creates a new FailureHandler.
+
+        Arguments:
+        resource - the execution context the units run on
+        policy - a FailurePolicy, None for the default policy
+        logger - the plugin's logger
+        stragglers - a StragglerPolicy, None to never duplicate units
+        """
+        if policy is None:
+            policy = FailurePolicy()
+
+        self._resource = resource
+        self._policy = policy
+        self._stragglers = stragglers
+        self._logger = logger
+        self._lock = threading.RLock()
+        # notified when a resubmission scheduled by retry_unit() is done
+        self._retries = threading.Condition(self._lock)
+        self._scheduled = 0
+
+        # uid -> (description, attempt)
+        self._descriptions = {}
+        # uid -> unit of the units that may still occupy cores
+        self._active = {}
+        self._total = 0
+        self._retried = 0
+        self._given_up = 0
+        self._speculated = 0
+        self.error = None
+
+        # the first units are prepared while the pilot is queued
+        self._prestager = PreStager(resource, logger)
+
+        self._walltime = getattr(resource, 'walltime_policy', None)
+        if self._walltime is not None:
+            _dispatcher(resource).add(self)
+
+        self._profiler = getattr(resource, '_profiler', None)
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def given_up(self):
+        return self._given_up
+
+    @property
+    def retried(self):
+        return self._retried
+
+    @property
+    def speculated(self):
+        return self._speculated
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_units(self, descriptions):
+        """Submits one or a list of unit descriptions, like
+        UnitManager.submit_units(). The first call waits until a pilot is
+        active. Raises a WalltimeError, and sets self.error, if a unit
+        cannot finish in the remaining walltime.
+        """
+        self._prestager.release(descriptions)
+        self._admit(descriptions)
+        units = self._resource._umgr.submit_units(descriptions)
+
+        with self._lock:
+            if isinstance(descriptions, list):
+                for descr, unit in zip(descriptions, units):
+                    self._descriptions[unit.uid] = (descr, 0)
+                    self._track(unit)
+                self._total += len(descriptions)
+            else:
+                self._descriptions[units.uid] = (descriptions, 0)
+                self._track(units)
+                self._total += 1
+
+        return units
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_units(self, units):
+        """Waits for the units and resubmits failed ones until they are done
+        or given up. Raises an EnsemblemdError if the failure policy aborts
+        the run.
+
+        Arguments:
+        units - list of units submitted with submit_units()
+
+        Returns:
+        units - list of the final unit of every task, in the order of the
+        given units
+        """
+        units = list(units)
+        pending = range(len(units))
+
+        while pending:
+            self._wait(units, pending)
+
+            failed = [i for i in pending if units[i].state == radical.pilot.FAILED]
+            if not failed:
+                break
+
+            retry = []
+            for i in failed:
+                attempt = self._record(units[i])
+                if attempt is not None:
+                    retry.append((i, attempt))
+
+            if self.error is not None:
+                raise self.error
+
+            if retry:
+                time.sleep(max([self._policy.delay(a) for i, a in retry]))
+                for i, attempt in retry:
+                    units[i] = self._resubmit(units[i], attempt)
+
+            pending = [i for i, a in retry]
+
+        return units
+
+    # --------------------------------------------------------------------------
+    #
+    def retry_unit(self, unit):
+        """Resubmits a single failed unit, for plugins that react to unit
+        state callbacks. The resubmission is scheduled after the backoff of
+        the failure policy, so that the callback does not block. Returns the
+        number of the retry, or None if the task is given up. If the failure
+        policy aborts the run, self.error is set.
+        """
+        attempt = self._record(unit)
+        if attempt is None:
+            return None
+
+        delay = self._policy.delay(attempt)
+        if delay <= 0:
+            self._resubmit(unit, attempt)
+            return attempt
+
+        with self._lock:
+            self._scheduled += 1
+        timer = threading.Timer(delay, self._resubmit_scheduled, args=(unit, attempt))
+        timer.daemon = True
+        timer.start()
+        return attempt
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_retries(self):
+        """Waits until the resubmissions scheduled by retry_unit() are
+        submitted.
+        """
+        with self._lock:
+            while self._scheduled > 0:
+                self._retries.wait(1.0)
+
+    # --------------------------------------------------------------------------
+    #
+    def _record(self, unit):
+        """Records a failed unit and returns the number of its next retry, or
+        None if the task is given up.
+        """
+        with self._lock:
+            descr, attempt = self._descriptions.get(unit.uid, (None, 0))
+            attempt += 1
+
+            capacity = getattr(self._resource, 'capacity', None)
+            if descr is None or capacity == 0 or not self._policy.retry(attempt):
+                action = 'given up'
+                self._given_up += 1
+                if self._policy.abort(self._given_up, self._total):
+                    self.error = EnsemblemdError(
+                        msg="{0} of {1} tasks failed, aborting pattern execution. Last error: {2}"\
+                            .format(self._given_up, self._total, unit.stderr))
+                attempt = None
+            else:
+                action = 'retry {0}'.format(attempt)
+                self._retried += 1
+
+            self._logger.error("Task {0} ({1}) failed, {2}: {3}".format(unit.uid, unit.name, action, unit.stderr))
+            self._prof(unit, action)
+
+        return attempt
+
+    # --------------------------------------------------------------------------
+    #
+    def _admit(self, descriptions):
+        """Raises a WalltimeError if the runtime estimate of a unit exceeds
+        the remaining walltime, before any of the units is submitted.
+        """
+        if self._walltime is None:
+            return
+
+        remaining = self._resource.remaining_walltime
+        if remaining is None:
+            return
+
+        if not isinstance(descriptions, list):
+            descriptions = [descriptions]
+
+        for descr in descriptions:
+            estimate = self._resource._runtimes.estimate(descr)
+            if not self._walltime.admits(estimate, remaining):
+                self.error = WalltimeError(name="Task {0}".format(descr.name),
+                                           estimate=estimate, remaining=remaining)
+                self._logger.warning(str(self.error))
+                raise self.error
+
+    # --------------------------------------------------------------------------
+    #
+    def _unit_state_cb(self, unit, state):
+        """Records the runtime of the finished units of this handler.
+        """
+        if state != radical.pilot.DONE:
+            return
+
+        with self._lock:
+            descr = self._descriptions.get(unit.uid, (None, 0))[0]
+        if descr is None:
+            return
+
+        runtime = _runtime(unit)
+        if runtime is not None:
+            self._resource._runtimes.record(descr, runtime)
+
+    # --------------------------------------------------------------------------
+    #
+    def _resubmit(self, unit, attempt):
+        """Submits the cached description of a failed unit.
+        """
+        with self._lock:
+            descr = self._descriptions.pop(unit.uid)[0]
+            new_unit = self._resource._umgr.submit_units(descr)
+            self._descriptions[new_unit.uid] = (descr, attempt)
+            self._track(new_unit)
+
+        return new_unit
+
+    # --------------------------------------------------------------------------
+    #
+    def _resubmit_scheduled(self, unit, attempt):
+        """Resubmits a unit once the backoff of retry_unit() has passed.
+        """
+        try:
+            self._resubmit(unit, attempt)
+        except Exception, ex:
+            self._logger.exception("Resubmission of task {0} ({1}) failed: {2}".format(unit.uid, unit.name, ex))
+            self.error = EnsemblemdError(msg="Resubmission of task {0} failed: {1}".format(unit.name, ex))
+        finally:
+            with self._lock:
+                self._scheduled -= 1
+                self._retries.notify_all()
+
+    # --------------------------------------------------------------------------
+    #
+    def _track(self, unit):
+        """Remembers a unit for counting idle cores, if stragglers are
+        duplicated.
+        """
+        if self._stragglers is not None:
+            self._active[unit.uid] = unit
+
+    # --------------------------------------------------------------------------
+    #
+    def _wait(self, units, pending):
+        """Waits until the given units are final. With a straggler policy,
+        stragglers are duplicated while waiting, and the unit of a task is
+        replaced by whichever copy finishes first.
+        """
+        if self._stragglers is None:
+            self._resource._umgr.wait_units([units[i].uid for i in pending])
+            return
+
+        # index -> duplicate of the unit, uid -> time it was seen executing
+        twins = {}
+        started = {}
+        runtimes = []
+        total = len(pending)
+        active = list(pending)
+
+        while active:
+            now = time.time()
+            running = []
+            for i in active:
+                copies = [units[i]] + ([twins[i]] if i in twins else [])
+                for unit in copies:
+                    if unit.state == radical.pilot.EXECUTING and unit.uid not in started:
+                        started[unit.uid] = now
+
+                done = [u for u in copies if u.state == radical.pilot.DONE]
+                final = [u for u in copies if u.state in [radical.pilot.DONE,
+                    radical.pilot.FAILED, radical.pilot.CANCELED]]
+
+                if done:
+                    winner = done[0]
+                elif len(final) == len(copies):
+                    # a task fails only if all of its copies failed
+                    failed = [u for u in copies if u.state == radical.pilot.FAILED]
+                    winner = (failed + copies)[0]
+                else:
+                    running.append(i)
+                    continue
+
+                if winner.uid in started:
+                    runtimes.append(now - started[winner.uid])
+                for unit in copies:
+                    if unit is not winner:
+                        self._cancel(unit, winner)
+                units[i] = winner
+                twins.pop(i, None)
+
+            if not running:
+                break
+
+            self._speculate(units, running, twins, started, runtimes, total, now)
+
+            uids = [units[i].uid for i in running] + [twins[i].uid for i in running if i in twins]
+            self._resource._umgr.wait_units(uids, timeout=self._stragglers.poll_interval)
+            active = running
+
+    # --------------------------------------------------------------------------
+    #
+    def _speculate(self, units, running, twins, started, runtimes, total, now):
+        """Launches duplicates of the running units that exceed the straggler
+        threshold of their stage, as long as there are idle cores.
+        """
+        threshold = self._stragglers.threshold(runtimes, total)
+        if threshold is None:
+            return
+
+        idle = self._idle_cores()
+        for i in running:
+            unit = units[i]
+            if i in twins or unit.uid not in started or now - started[unit.uid] <= threshold:
+                continue
+
+            with self._lock:
+                descr, attempt = self._descriptions.get(unit.uid, (None, 0))
+                if descr is None or (descr.cores or 1) > idle:
+                    continue
+
+                twin = self._resource._umgr.submit_units(descr)
+                self._descriptions[twin.uid] = (descr, attempt)
+                self._track(twin)
+                self._speculated += 1
+
+            twins[i] = twin
+            idle -= descr.cores or 1
+            self._logger.info("Task {0} ({1}) exceeds {2:.1f}s, launched duplicate {3}".format(
+                unit.uid, unit.name, threshold, twin.uid))
+            self._prof(unit, 'duplicated as {0}'.format(twin.uid))
+
+    # --------------------------------------------------------------------------
+    #
+    def _cancel(self, unit, winner):
+        """Cancels the copy of a task that lost against the given winner.
+        """
+        if unit.state not in [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]:
+            self._resource._umgr.cancel_units(unit.uid)
+            self._prof(unit, 'canceled, {0} finished first'.format(winner.uid))
+        with self._lock:
+            self._descriptions.pop(unit.uid, None)
+            self._active.pop(unit.uid, None)
+
+    # --------------------------------------------------------------------------
+    #
+    def _idle_cores(self):
+        """Returns the number of cores not used by the units of this handler.
+        """
+        capacity = getattr(self._resource, 'capacity', None)
+        if capacity is None:
+            capacity = self._resource._cores
+
+        with self._lock:
+            for uid, unit in self._active.items():
+                if unit.state in [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]:
+                    del self._active[uid]
+            used = 0
+            for uid in self._active:
+                descr = self._descriptions.get(uid, (None, 0))[0]
+                used += (descr.cores or 1) if descr is not None else 1
+
+        return capacity - used
+
+    # --------------------------------------------------------------------------
+    #
+    def _prof(self, unit, action):
+        """Records a failed, duplicated or canceled unit in the profile.
+        """
+        if self._profiler is not None:
+            self._profiler.prof(None, unit.name, action, instance=unit.uid)
+
+
+# ------------------------------------------------------------------------------
+#
+class _UnitStateDispatcher(object):
+    """Forwards the unit state callbacks of a unit manager to the
+    FailureHandlers that use it. Only the dispatcher is registered with the
+    unit manager; handlers are weakly referenced and drop out once the
+    plugin run that created them is over.
+    """
+
+    def __init__(self, umgr):
+        self.umgr = umgr
+        self._lock = threading.Lock()
+        self._handlers = weakref.WeakSet()
+        umgr.register_callback(self._unit_state_cb)
+
+    def add(self, handler):
+        with self._lock:
+            self._handlers.add(handler)
+
+    def remove(self, handler):
+        with self._lock:
+            self._handlers.discard(handler)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._handlers)
+
+    def _unit_state_cb(self, unit, state):
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler._unit_state_cb(unit, state)
+
+_dispatcher_lock = threading.Lock()
+
+# ------------------------------------------------------------------------------
+#
+def _dispatcher(resource):
+    """Returns the dispatcher of the unit manager of an execution context,
+    registering it on first use. Copies of the context made by run_async()
+    have a unit manager of their own and get their own dispatcher.
+    """
+    with _dispatcher_lock:
+        dispatcher = getattr(resource, '_unit_state_dispatcher', None)
+        if (dispatcher is None) or (dispatcher.umgr is not resource._umgr):
+            dispatcher = _UnitStateDispatcher(resource._umgr)
+            resource._unit_state_dispatcher = dispatcher
+    return dispatcher
+
+# ------------------------------------------------------------------------------
+#
+def _runtime(unit):
+    """Returns the seconds a unit spent executing, from its state history,
+    or None.
+    """
+    history = getattr(unit, 'state_history', None) or []
+    for entry, following in zip(history, history[1:]):
+        if entry.state == radical.pilot.EXECUTING:
+            return epoch_seconds(following.timestamp) - epoch_seconds(entry.timestamp)
+    return None
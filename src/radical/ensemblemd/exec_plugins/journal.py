@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""Run journal of the stages a pattern has completed.
+
+The journal is append-only and holds one JSON record per line, so recording
+a stage costs one small write regardless of the length of the run, and a
+journal is replayed by reading it once. Every append is flushed and synced
+before the next stage starts. A record that was cut short by a crash is the
+last line of the file; it is ignored on replay and cut off before a resumed
+run appends to the journal. Lines that cannot be decoded are skipped.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import json
+import threading
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+# ------------------------------------------------------------------------------
+#
+class Journal(object):
+    """Appends records of completed stages to a journal file.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path, truncate=False):
+        """Creates a new Journal.
+
+        Arguments:
+        path - journal file
+        truncate - start a new journal instead of appending to an existing one
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        if truncate and os.path.exists(path):
+            os.remove(path)
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def path(self):
+        return self._path
+
+    # --------------------------------------------------------------------------
+    #
+    def append(self, record):
+        """Appends a record (a dictionary) to the journal.
+        """
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self._lock:
+            f = open(self._path, 'a')
+            try:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+
+# ------------------------------------------------------------------------------
+#
+def replay_journal(path):
+    """Returns the records of a journal in the order they were appended.
+
+    Arguments:
+    path - journal file
+
+    Returns:
+    records - list of dictionaries
+    """
+    if not os.path.exists(path):
+        raise EnsemblemdError(msg="Journal {0} does not exist.".format(path))
+
+    records = []
+    f = open(path)
+    try:
+        for line in f:
+            # a record without a newline was interrupted while being written
+            if not line.endswith('\n'):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    finally:
+        f.close()
+
+    return records
+
+# ------------------------------------------------------------------------------
+#
+def open_journal(pattern, resource):
+    """Returns the journal of a pattern run and the records to resume from.
+
+    When the execution context resumes a run, its journal is replayed and
+    appended to. Otherwise a new journal is started at the pattern's
+    checkpoint_file, or no journal is kept if that is None.
+
+    Returns:
+    journal - Journal or None
+    records - list of records of the resumed run
+    """
+    resume = getattr(resource, '_resume', None)
+    if resume is not None:
+        records = replay_journal(resume)
+        _drop_torn_record(resume)
+        return Journal(resume), records
+
+    path = getattr(pattern, 'checkpoint_file', None)
+    if path is None:
+        return None, []
+
+    return Journal(path, truncate=True), []
+
+# ------------------------------------------------------------------------------
+#
+def _drop_torn_record(path):
+    """Cuts a journal after its last complete line, so that the next record
+    is not appended to a record that was interrupted while being written.
+    """
+    f = open(path, 'r+b')
+    try:
+        data = f.read()
+        if data and not data.endswith('\n'):
+            f.truncate(data.rfind('\n') + 1)
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        f.close()
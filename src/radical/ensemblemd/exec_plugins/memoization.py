@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+"""Skipping of tasks whose outputs are in the pattern's task cache.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import shutil
+import urlparse
+import radical.pilot
+
+# Directory in the pilot staging area that cached outputs are staged to
+CACHE_STAGING_DIR = "task_cache/{0}"
+
+# ------------------------------------------------------------------------------
+#
+class TaskMemo(object):
+    """Looks up the compute units of a pattern run in a TaskCache. On a hit,
+    the cached outputs are staged into the pilot staging area and to the
+    targets of the unit's output directives, and the unit is not submitted.
+    On a miss, the unit additionally transfers its declared outputs into the
+    cache, which are committed once the unit is done.
+
+    Inputs read from the pilot sandbox, the outputs of earlier tasks, are
+    keyed on the cache key of the task that produced them, as their paths
+    differ in every session. Tasks that read the outputs of a task that is
+    not cached are not looked up.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, cache, resource, logger):
+        """Creates a new TaskMemo.
+
+        Arguments:
+        cache - the pattern's TaskCache, None disables memoization
+        resource - the execution context the units run on
+        logger - the plugin's logger
+        """
+        self._cache = cache
+        self._resource = resource
+        self._logger = logger
+
+        # unit name -> cache key of units that fill the cache
+        self._pending = {}
+        # keys already staged to the pilot in this run
+        self._staged = set()
+        # working directory path -> cache key of the cached tasks of this run
+        self._producers = {}
+
+    # --------------------------------------------------------------------------
+    #
+    def prepare(self, cud, kernel):
+        """Looks up a unit description in the cache.
+
+        Arguments:
+        cud - radical.pilot.ComputeUnitDescription of the task
+        kernel - the bound kernel the unit was created from
+
+        Returns:
+        working_directory - URL of the directory holding the cached outputs
+        on a hit, None if the unit has to be submitted
+        """
+        if self._cache is None or not kernel.cache_output_data:
+            return None
+
+        outputs = kernel.cache_output_data
+        description = self._describe(cud, kernel, outputs)
+        if description is None:
+            self._logger.info("Task {0} reads outputs of a task that is not cached, not using the task cache.".format(cud.name))
+            return None
+        key = self._cache.key(description, self._input_files(cud))
+
+        entry = self._cache.lookup(key)
+        if entry is not None:
+            self._logger.info("Task {0} found in task cache ({1}).".format(cud.name, key))
+            working_directory = self._materialize(cud, key, entry, outputs)
+            self._producers[_path(working_directory)] = key
+            return working_directory
+
+        pending = self._cache.pending_path(key)
+        transfers = []
+        for f in outputs:
+            directory = os.path.dirname(os.path.join(pending, f))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            transfers.append({'source': f,
+                              'target': 'file://{0}'.format(os.path.join(pending, f)),
+                              'action': radical.pilot.TRANSFER})
+        cud.output_staging = (cud.output_staging or []) + transfers
+        self._pending[cud.name] = key
+
+        return None
+
+    # --------------------------------------------------------------------------
+    #
+    def complete(self, units):
+        """Commits the outputs of finished units to the cache.
+        """
+        if self._cache is None:
+            return
+
+        for unit in units:
+            key = self._pending.pop(unit.name, None)
+            if key is None:
+                continue
+            if unit.state == radical.pilot.DONE:
+                self._cache.commit(key)
+                self._producers[_path(unit.working_directory)] = key
+            else:
+                self._cache.discard(key)
+
+    # --------------------------------------------------------------------------
+    #
+    def _describe(self, cud, kernel, outputs):
+        """Returns everything but the input file contents the outputs of a
+        unit depend on, or None if it reads the outputs of a task that is
+        not cached.
+        """
+        inputs = []
+        for d in cud.input_staging or []:
+            if self._local_path(d) is not None:
+                continue
+
+            path = self._sandbox_path(d)
+            if path is None:
+                # remote and staging area inputs are the same in every session
+                inputs.append(d)
+                continue
+
+            for directory, key in self._producers.items():
+                if path.startswith(directory + '/'):
+                    inputs.append({'producer': key,
+                                   'source': path[len(directory) + 1:],
+                                   'target': d['target'],
+                                   'action': d.get('action')})
+                    break
+            else:
+                return None
+
+        return {'resource':    self._resource._resource_key,
+                'executable':  cud.executable,
+                'arguments':   cud.arguments,
+                'pre_exec':    cud.pre_exec,
+                'environment': kernel.environment,
+                'cores':       cud.cores,
+                'mpi':         cud.mpi,
+                'inputs':      inputs,
+                'outputs':     outputs}
+
+    # --------------------------------------------------------------------------
+    #
+    def _input_files(self, cud):
+        """Returns (target, local path) of the inputs a unit transfers from
+        the client, including shared data in the staging area.
+        """
+        files = []
+        for d in cud.input_staging or []:
+            path = self._local_path(d)
+            if path is not None:
+                files.append((d['target'], path))
+        return files
+
+    # --------------------------------------------------------------------------
+    #
+    def _local_path(self, directive):
+        """Returns the local file an input directive transfers, or None.
+        """
+        if not isinstance(directive, dict):
+            return None
+
+        source = directive['source']
+        if source.startswith('staging:///'):
+            for f in self._resource._shared_data or []:
+                if os.path.basename(f) == source[len('staging:///'):]:
+                    return f
+            return None
+
+        if directive.get('action', radical.pilot.TRANSFER) != radical.pilot.TRANSFER:
+            return None
+
+        if source.startswith('file://'):
+            source = source[len('file://'):]
+        if os.path.isfile(source):
+            return source
+        return None
+
+    # --------------------------------------------------------------------------
+    #
+    def _sandbox_path(self, directive):
+        """Returns the path of the file an input directive reads from a
+        pilot sandbox, or None.
+        """
+        if not isinstance(directive, dict) or directive['source'].startswith('staging://'):
+            return None
+
+        path = _path(directive['source'])
+        for pilot in self._resource._pilots:
+            sandbox = _path(str(pilot.sandbox))
+            if sandbox and path.startswith(sandbox + '/'):
+                return path
+        return None
+
+    # --------------------------------------------------------------------------
+    #
+    def _materialize(self, cud, key, entry, outputs):
+        """Stages cached outputs to the staging area of every pilot and to
+        the targets of the unit's output directives.
+        """
+        final = [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]
+        pilots = [p for p in self._resource._pilots if p.state not in final]
+        staging_dir = CACHE_STAGING_DIR.format(key)
+
+        if key not in self._staged:
+            for pilot in pilots:
+                pilot.stage_in([{'source': 'file://{0}'.format(os.path.join(entry, f)),
+                                 'target': 'staging:///{0}/{1}'.format(staging_dir, f),
+                                 'action': radical.pilot.TRANSFER} for f in outputs])
+            self._staged.add(key)
+
+        for d in cud.output_staging or []:
+            if isinstance(d, dict):
+                source, target = d['source'], d['target']
+                action = d.get('action', radical.pilot.TRANSFER)
+            else:
+                source, target = [s.strip() for s in (d.split('>') + [os.path.basename(d)])[:2]]
+                action = radical.pilot.TRANSFER
+
+            cached = os.path.join(entry, source)
+            if not os.path.exists(cached):
+                self._logger.warning("Output {0} of task {1} is not cached, declare it in cache_output_data.".format(source, cud.name))
+                continue
+
+            if action == radical.pilot.TRANSFER:
+                if target.startswith('file://'):
+                    target = target[len('file://'):]
+                shutil.copy(cached, target)
+            elif target.startswith('staging://'):
+                for pilot in pilots:
+                    pilot.stage_in({'source': 'file://{0}'.format(cached),
+                                    'target': target,
+                                    'action': radical.pilot.TRANSFER})
+            else:
+                self._logger.warning("Cannot stage cached output {0} of task {1} to {2}.".format(source, cud.name, target))
+
+        return '{0}/staging_area/{1}'.format(str(self._resource._pilot.sandbox).rstrip('/'), staging_dir)
+
+# ------------------------------------------------------------------------------
+#
+def _path(url):
+    """Returns the path of a URL or path, without trailing slash.
+    """
+    return urlparse.urlparse(str(url)).path.rstrip('/')
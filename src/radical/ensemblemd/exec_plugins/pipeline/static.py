@@ -18,6 +18,9 @@ import radical.pilot
 
 from radical.ensemblemd.exceptions import NotImplementedError, EnsemblemdError
 from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+from radical.ensemblemd.exec_plugins.journal import open_journal
+from radical.ensemblemd.exec_plugins.memoization import TaskMemo
 
 
 # ------------------------------------------------------------------------------
@@ -258,8 +261,69 @@ class Plugin(PluginBase):
 		# Get details of the Bag of Pipes
 		num_tasks = pattern.tasks
 		num_stages = pattern.stages
+
+		# failed tasks are resubmitted according to the failure policy, the
+		# remaining stages of a pipe whose task is given up are skipped, as
+		# are the stages recorded in the journal of a resumed run
+		failures = FailureHandler(resource, pattern.failure_policy, self.get_logger())
+		skipped_tasks = [0]
+
+		# tasks found in the task cache are not submitted
+		memo = TaskMemo(pattern.task_cache, resource, self.get_logger())
+
+		journal, records = open_journal(pattern, resource)
+		recorded = {}
+		for record in records:
+			recorded[(record['stage'], record['task'])] = record['working_dir']
+
+		# every pipe continues after its last consecutive recorded stage
+		done_stages = {}
+		for task in range(1, num_tasks+1):
+			stage = 0
+			while (stage+1, task) in recorded:
+				stage += 1
+				if 'stage_{0}'.format(stage) not in self.working_dirs:
+					self.working_dirs['stage_{0}'.format(stage)] = {}
+				self.working_dirs['stage_{0}'.format(stage)]['task_{0}'.format(task)] = recorded[(stage, task)]
+			done_stages[task] = stage
+			skipped_tasks[0] += stage
+
+		if records:
+			self._reporter.info("\nResuming after {0} completed task(s)".format(skipped_tasks[0]))
 		#-----------------------------------------------------------------------
 		
+		#-----------------------------------------------------------------------
+		# Book a finished task and launch the next stage of its pipe
+		def stage_done(cur_stage, cur_task, working_directory):
+
+			self.get_logger().info('Task {0} of stage {1} has finished'.format(cur_task,cur_stage))
+
+			#-----------------------------------------------------------------------
+			# Increment tasks list accordingly
+			if self.tot_fin_tasks[0] == 0:
+				self.tot_fin_tasks[0] = 1
+			else:
+				self.tot_fin_tasks[cur_stage-1]+=1
+				# Check if this is the last task of the stage
+				if self.tot_fin_tasks[cur_stage-1] == num_tasks:
+					self._reporter.info('\nAll tasks in stage {0} have finished'.format(cur_stage))
+					self._reporter.ok('>> done')
+					self.get_logger().info('All tasks in stage {0} has finished'.format(cur_stage))
+			#-----------------------------------------------------------------------
+			# Log unit working directories for placeholders
+			if 'stage_{0}'.format(cur_stage) not in self.working_dirs:
+				self.working_dirs['stage_{0}'.format(cur_stage)] = {}
+
+			self.working_dirs['stage_{0}'.format(cur_stage)]['task_{0}'.format(cur_task)] = working_directory
+
+			if journal is not None:
+				journal.append({'stage': cur_stage, 'task': cur_task, 'working_dir': working_directory})
+			#-----------------------------------------------------------------------
+			if cur_stage < num_stages:
+				launch_stage(cur_stage+1, cur_task)
+
+		#-----------------------------------------------------------------------
+
 		#-----------------------------------------------------------------------
 		# Use callback to trigger next stage
 		def unit_state_cb (unit, state):
@@ -268,34 +332,18 @@ class Plugin(PluginBase):
 				try:
 					cur_stage = int(unit.name.split('-')[1])
 					cur_task = int(unit.name.split('-')[3])
-			
-					self.get_logger().info('Task {0} of stage {1} has finished'.format(cur_task,cur_stage))
 
-					#-----------------------------------------------------------------------
-					# Increment tasks list accordingly
-					if self.tot_fin_tasks[0] == 0:
-						self.tot_fin_tasks[0] = 1
-					else:
-						self.tot_fin_tasks[cur_stage-1]+=1
-						# Check if this is the last task of the stage
-						if self.tot_fin_tasks[cur_stage-1] == num_tasks:
-							self._reporter.info('\nAll tasks in stage {0} have finished'.format(cur_stage))
-							self._reporter.ok('>> done')
-							self.get_logger().info('All tasks in stage {0} has finished'.format(cur_stage))
-					#-----------------------------------------------------------------------
-					# Log unit working directories for placeholders
-					if 'stage_{0}'.format(cur_stage) not in self.working_dirs:
-						self.working_dirs['stage_{0}'.format(cur_stage)] = {}
-
-					self.working_dirs['stage_{0}'.format(cur_stage)]['task_{0}'.format(cur_task)] = unit.working_directory
-					#-----------------------------------------------------------------------
-					cud = create_next_stage_cud(unit)
-					if cud is not None:
-						launch_next_stage(cud)
+					memo.complete([unit])
+					stage_done(cur_stage, cur_task, unit.working_directory)
 
 				except:
 					raise Exception("Trigger failed. Next stage not invoked")
 
+			elif state == radical.pilot.FAILED:
+				cur_stage = int(unit.name.split('-')[1])
+				if failures.retry_unit(unit) is None:
+					skipped_tasks[0] += num_stages - cur_stage + 1
+
 		#-----------------------------------------------------------------------
 
 		self.get_logger().info("Executing {0} pipes of {1} stages on {2} allocated core(s) on '{3}'".format(num_tasks, num_stages,
@@ -305,10 +353,9 @@ class Plugin(PluginBase):
 			resource._cores, resource._resource_key))
 		#-----------------------------------------------------------------------
 		# Wait for Pilot to go Active
-		self.get_logger().info("Waiting for pilot on {0} to go Active".format(resource._resource_key))
-		self._reporter.info("Job waiting on queue...".format(resource._resource_key))
-		resource._pmgr.wait_pilots(resource._pilot.uid,u'Active')
-		self._reporter.ok("\nJob is now running !\n".format(resource._resource_key))
+		# the first tasks are prepared while the pilot waits in the queue,
+		# their submission waits until it is active (see PreStager)
+		self._reporter.info("Preparing the first tasks while the job waits on queue...")
 		#-----------------------------------------------------------------------
 
 
@@ -323,82 +370,100 @@ class Plugin(PluginBase):
 
 		task_method = getattr(pattern, 'stage_1')
 		task_units_desc = []
+		cached_tasks = []
 		for task_instance in range(1, num_tasks+1):
 
+			if done_stages[task_instance] > 0:
+				continue
+
 			kernel = task_method(task_instance)
-			kernel._bind_to_resource(resource._resource_key)
 
 			self.get_logger().debug('Creating task {0} of stage 1'.format(task_instance))
 
 			cud = radical.pilot.ComputeUnitDescription()
 			cud.name = "stage-1-task-{0}".format(task_instance)
 
-			cud.pre_exec        = kernel._cu_def_pre_exec
-			cud.executable      = kernel._cu_def_executable
-			cud.arguments       = kernel.arguments
-			cud.mpi             = kernel.uses_mpi
 			cud.input_staging   = get_input_data(kernel,1,task_instance)
 			cud.output_staging  = get_output_data(kernel,1,task_instance)
 
+			# the execution context picks the resource of the task
+			resource._bind_unit(cud, kernel)
+
+			working_directory = memo.prepare(cud, kernel)
+			if working_directory is not None:
+				cached_tasks.append((task_instance, working_directory))
+				continue
+
 			task_units_desc.append(cud)
 
-		task_units = resource._umgr.submit_units(task_units_desc)
+		if task_units_desc:
+			task_units = failures.submit_units(task_units_desc)
 		self.get_logger().info('Submitted all tasks of stage 1')
 		self._reporter.info('Submitted all tasks of stage 1')
 		self._reporter.ok('>> ok')
 		#-----------------------------------------------------------------------
 
 		#-----------------------------------------------------------------------
-		# Create next CU at the end of each CU
-		def create_next_stage_cud(unit):
-						
-			cur_stage = int(unit.name.split('-')[1])+1
-			cur_task = int(unit.name.split('-')[3])
+		# Create the CU of a stage of a task
+		def create_stage_cud(cur_stage, cur_task):
 
-			if cur_stage <= num_stages:
+			while len(self.tot_fin_tasks) < cur_stage:
+				self.tot_fin_tasks.append(0)
+				self._reporter.info('\nStarting submission of tasks in stage {0}'.format(len(self.tot_fin_tasks)))
+				self._reporter.ok('>> ok')
+				
+			self.get_logger().debug('Creating task {0} of stage {1}'.format(cur_task,cur_stage))
 
-				if len(self.tot_fin_tasks) < cur_stage:
-					self.tot_fin_tasks.append(0)
-					self._reporter.info('\nStarting submission of tasks in stage {0}'.format(cur_stage))
-					self._reporter.ok('>> ok')
-					
-				self.get_logger().debug('Creating task {0} of stage {1}'.format(cur_task,cur_stage))
+			task_method = getattr(pattern, 'stage_{0}'.format(cur_stage))
 
-				task_method = getattr(pattern, 'stage_{0}'.format(cur_stage))
+			kernel = task_method(cur_task)
 
-				kernel = task_method(cur_task)
-				kernel._bind_to_resource(resource._resource_key)
+			cud = radical.pilot.ComputeUnitDescription()
+			cud.name = "stage-{0}-task-{1}".format(cur_stage,cur_task)
 
-				cud = radical.pilot.ComputeUnitDescription()
-				cud.name = "stage-{0}-task-{1}".format(cur_stage,cur_task)
+			cud.input_staging   = get_input_data(kernel,cur_stage,cur_task)
+			cud.output_staging  = get_output_data(kernel,cur_stage,cur_task)
 
-				cud.pre_exec        = kernel._cu_def_pre_exec
-				cud.executable      = kernel._cu_def_executable
-				cud.arguments       = kernel.arguments
-				cud.mpi             = kernel.uses_mpi
-				cud.input_staging   = get_input_data(kernel,cur_stage,cur_task)
-				cud.output_staging  = get_output_data(kernel,cur_stage,cur_task)
+			# the execution context picks the resource of the task
+			resource._bind_unit(cud, kernel)
 
-				return cud
-
-			else:
-				return None
+			return cud, kernel
 
 		#-----------------------------------------------------------------------
 
 		#-----------------------------------------------------------------------
-		# Launch the CU of the next stage
-		def launch_next_stage(cud):
+		# Launch a stage of a pipe, a cached task finishes right away
+		def launch_stage(cur_stage, cur_task):
+
+			cud, kernel = create_stage_cud(cur_stage, cur_task)
+
+			working_directory = memo.prepare(cud, kernel)
+			if working_directory is not None:
+				stage_done(cur_stage, cur_task, working_directory)
+				return
 
-			cur_stage = int(cud.name.split('-')[1])
-			cur_task = int(cud.name.split('-')[3])
 			self.get_logger().info('Submitting task {0} of stage {1}'.format(cur_task,cur_stage))
-			resource._umgr.submit_units(cud)    
+			failures.submit_units(cud)
+		#-----------------------------------------------------------------------
+
+		#-----------------------------------------------------------------------
+		# Continue the pipes of a resumed run after their last recorded stage
+		for task in range(1, num_tasks+1):
+			if 0 < done_stages[task] < num_stages:
+				launch_stage(done_stages[task]+1, task)
+
+		# Book the stage 1 tasks found in the task cache
+		for task, working_directory in cached_tasks:
+			stage_done(1, task, working_directory)
 		#-----------------------------------------------------------------------
 
 		#-----------------------------------------------------------------------
 		# Wait for all tasks to finish
-		while(sum(self.tot_fin_tasks)!=(num_stages*num_tasks)):
+		while(sum(self.tot_fin_tasks)+skipped_tasks[0]!=(num_stages*num_tasks)):
+			if failures.error is not None:
+				raise failures.error
 			resource._umgr.wait_units()    
+			# failed tasks are resubmitted after their backoff
+			failures.wait_retries()
 
 		#-----------------------------------------------------------------------
\ No newline at end of file
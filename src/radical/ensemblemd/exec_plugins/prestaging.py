@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""Preparation of the first stage of a pattern while the pilot is queued.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import time
+import radical.pilot
+
+from radical.ensemblemd.local_unit_manager import normalize_directive
+
+FINAL_STATES = [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]
+
+# Directory of the pilot staging area that uploads are pre-staged to
+PRESTAGE_DIR = "prestaged"
+
+# ------------------------------------------------------------------------------
+#
+class PreStager(object):
+    """Lets a plugin build the descriptions of its first units while the
+    pilot still waits in the batch queue. Before the first units are
+    submitted, their uploads are transferred to the staging area of the
+    pilots, which exists as soon as the pilots are submitted, and the
+    units copy them from there instead. Then the pilot is waited for and
+    the units are released as soon as it is active.
+
+    The preparation time that passed while the pilot was queued is added
+    to the hidden_time of the execution context.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, resource, logger):
+        """Creates a new PreStager, preparation starts now.
+
+        Arguments:
+        resource - the execution context
+        logger - the plugin's logger
+        """
+        self._resource = resource
+        self._logger = logger
+        self._start = time.time()
+        self._released = False
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def released(self):
+        return self._released
+
+    # --------------------------------------------------------------------------
+    #
+    def release(self, descriptions):
+        """Pre-stages the uploads of the first units if the pilot is still
+        queued and waits until a pilot is active.
+
+        Arguments:
+        descriptions - unit description or list of unit descriptions
+        """
+        if self._released:
+            return
+        self._released = True
+
+        if not isinstance(descriptions, list):
+            descriptions = [descriptions]
+
+        pilots = [p for p in self._resource._pilots if p.state not in FINAL_STATES]
+        if [p for p in pilots if p.state == radical.pilot.ACTIVE]:
+            self._logger.info("Pilot is active, nothing to pre-stage.")
+            return
+
+        staged = self._prestage(descriptions, pilots)
+
+        # only preparation done before the pilot became active is hidden
+        prepared = time.time() - self._start
+        queued = not [p for p in pilots if p.state == radical.pilot.ACTIVE]
+        hidden = prepared if queued else 0.0
+
+        start = time.time()
+        self._logger.info("Waiting for pilot on {0} to go Active".format(self._resource._resource_key))
+        self._resource._wait_active()
+        waited = time.time() - start
+
+        self._resource._hidden_time += hidden
+        self._logger.info("Prepared {0} unit(s) and pre-staged {1} file(s) in {2:.1f}s, {3:.1f}s of it hidden in the queue wait, then waited {4:.1f}s for the pilot.".format(
+            len(descriptions), staged, prepared, hidden, waited))
+
+    # --------------------------------------------------------------------------
+    #
+    def _prestage(self, descriptions, pilots):
+        """Transfers the local input files of the units to the staging area
+        of the pilots and lets the units copy them from there.
+
+        Returns:
+        count - number of files transferred
+        """
+        # absolute source path -> staging area URL
+        staged = {}
+        directives = []
+
+        for cud in descriptions:
+            if not cud.input_staging:
+                continue
+
+            input_staging = []
+            for d in cud.input_staging:
+                d = normalize_directive(d)
+                source = d['source']
+                if source.startswith('file://'):
+                    source = source[len('file://'):]
+
+                if d['action'] != radical.pilot.TRANSFER or '://' in source or not os.path.isfile(source):
+                    input_staging.append(d)
+                    continue
+
+                source = os.path.abspath(source)
+                if source not in staged:
+                    staged[source] = 'staging:///{0}/{1}/{2}'.format(
+                        PRESTAGE_DIR, len(staged), os.path.basename(source))
+                    directives.append({'source': 'file://{0}'.format(source),
+                                       'target': staged[source],
+                                       'action': radical.pilot.TRANSFER})
+
+                # copied, not linked, so that units may modify their inputs
+                input_staging.append({'source': staged[source], 'target': d['target'],
+                                      'action': radical.pilot.COPY})
+
+            cud.input_staging = input_staging
+
+        if directives:
+            for pilot in pilots:
+                pilot.stage_in(directives)
+
+        return len(directives)
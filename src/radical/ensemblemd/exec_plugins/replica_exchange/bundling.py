@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""Bundling of NAMD replicas into multi-copy compute units.
+
+NAMD's multi-copy mode (+replicas N) runs N replicas as one MPI job, so a
+cycle needs one launch, one sandbox and one staging round per bundle instead
+of one per replica. All replicas of a bundle run in the same working
+directory; a small driver config selects the config file of each replica
+with NAMD's myReplica command.
+"""
+
+__author__    = "Antons Treikalis <antons.treikalis@rutgers.edu>"
+__copyright__ = "Copyright 2014, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import radical.pilot
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+# ------------------------------------------------------------------------------
+#
+def _unique(items):
+    """Returns items without duplicates, keeping the order.
+    """
+    result = []
+    for item in items:
+        if item not in result:
+            result.append(item)
+    return result
+
+# ------------------------------------------------------------------------------
+#
+def bundle_namd_units(cus, bundle_size, cycle):
+    """Merges the MD compute unit descriptions of NAMD replicas into
+    multi-copy units of at most bundle_size replicas.
+
+    Every replica unit must run NAMD with its config file as the only
+    argument and the replicas of a bundle must use the same number of cores.
+    Pre-exec commands, staging directives and post-exec commands of the
+    replicas are merged, shared directives are kept once.
+
+    Arguments:
+    cus - list of radical.pilot.ComputeUnitDescription objects, one per
+    replica
+    bundle_size - maximum number of replicas per bundle
+    cycle - current cycle, used to name the driver config and the logs
+
+    Returns:
+    bundles - list of radical.pilot.ComputeUnitDescription objects
+    """
+    bundles = []
+    for b, first in enumerate(range(0, len(cus), bundle_size)):
+        units = cus[first:first + bundle_size]
+
+        configs = []
+        for cu in units:
+            if len(cu.arguments or []) != 1:
+                raise EnsemblemdError(
+                    msg="Bundled NAMD units must have the config file as only argument, got {0}."\
+                        .format(cu.arguments))
+            configs.append(cu.arguments[0])
+
+        if len(set(cu.cores for cu in units)) != 1:
+            raise EnsemblemdError(
+                msg="Bundled NAMD replicas must use the same number of cores.")
+
+        driver = "bundle_{0}_{1}.namd".format(cycle, b)
+        names = [cu.name for cu in units if cu.name]
+
+        bundle                = radical.pilot.ComputeUnitDescription()
+        bundle.name           = "md ;{0} ;bundle {1}: {2}".format(cycle, b, ", ".join(names))
+        bundle.executable     = units[0].executable
+        bundle.arguments      = ["+replicas", str(len(units)), driver,
+                                 "+stdout", "bundle_{0}_{1}.%d.log".format(cycle, b)]
+        bundle.mpi            = True
+        bundle.cores          = units[0].cores * len(units)
+
+        pre_exec = []
+        for cu in units:
+            pre_exec.extend(cu.pre_exec or [])
+        # NAMD configs are Tcl, every replica sources its own config
+        pre_exec.append("echo 'source [lindex {{{0}}} [myReplica]]' > {1}"\
+                        .format(" ".join(configs), driver))
+        bundle.pre_exec       = _unique(pre_exec)
+
+        post_exec = []
+        for cu in units:
+            post_exec.extend(cu.post_exec or [])
+        bundle.post_exec      = post_exec
+
+        input_staging = []
+        output_staging = []
+        for cu in units:
+            input_staging.extend(cu.input_staging or [])
+            output_staging.extend(cu.output_staging or [])
+        bundle.input_staging  = _unique(input_staging)
+        bundle.output_staging = _unique(output_staging)
+
+        bundles.append(bundle)
+
+    return bundles
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""Cycle-level checkpoints for the replica exchange execution plugins.
+
+After each exchange step the plugins write the state needed to continue the
+simulation with the next cycle: replica objects, the swap history, the state
+of the exchange random number generator and a manifest of the files every
+replica keeps in the pilot's staging area.
+"""
+
+__author__    = "Antons Treikalis <antons.treikalis@rutgers.edu>"
+__copyright__ = "Copyright 2014, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import cPickle as pickle
+import radical.pilot
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+CHECKPOINT_VERSION = 1
+
+# ------------------------------------------------------------------------------
+#
+def write_checkpoint(path, cycle, pattern, replicas, swap_history,
+                     manifest=None, sandbox=None):
+    """Writes a checkpoint atomically: the data goes into a temporary file
+    next to path, which then replaces path with a rename. A run that dies
+    while writing leaves the previous checkpoint intact.
+
+    Arguments:
+    path - checkpoint file
+    cycle - last completed cycle
+    pattern - ReplicaExchange pattern
+    replicas - list of Replica objects
+    swap_history - list of (cycle, [(id_i, id_j), ...]) tuples
+    manifest - dict mapping replica ids to their files in the staging area
+    sandbox - pilot sandbox URL the staging area belongs to
+    """
+    state = {
+        "version":       CHECKPOINT_VERSION,
+        "pattern":       pattern.name,
+        "cycle":         cycle,
+        "replicas":      replicas,
+        "swap_history":  swap_history,
+        "manifest":      manifest or {},
+        "sandbox":       sandbox,
+        "rng_state":     pattern.rng.get_state(),
+        "exchange_step": pattern._exchange_step
+    }
+
+    tmp_path = "{0}.tmp".format(path)
+    f = open(tmp_path, "wb")
+    try:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    except:
+        # e.g. TypeError for replicas with unpicklable attributes
+        f.close()
+        os.remove(tmp_path)
+        raise
+    f.close()
+    os.rename(tmp_path, path)
+
+# ------------------------------------------------------------------------------
+#
+def read_checkpoint(path, pattern):
+    """Reads a checkpoint and restores the replicas and the exchange state of
+    the pattern.
+
+    Arguments:
+    path - checkpoint file
+    pattern - ReplicaExchange pattern to restore
+
+    Returns:
+    state - dictionary as written by write_checkpoint()
+    """
+    try:
+        f = open(path, "rb")
+        try:
+            state = pickle.load(f)
+        finally:
+            f.close()
+    except (IOError, EOFError, pickle.UnpicklingError), ex:
+        raise EnsemblemdError(
+            msg="Unable to read checkpoint {0}: {1}".format(path, str(ex)))
+
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise EnsemblemdError(
+            msg="Checkpoint {0} has unsupported version {1}.".format(
+                path, state.get("version")))
+
+    if state["pattern"] != pattern.name:
+        raise EnsemblemdError(
+            msg="Checkpoint {0} was written by pattern {1}, not {2}.".format(
+                path, state["pattern"], pattern.name))
+
+    pattern.add_replicas(state["replicas"])
+    pattern.rng.set_state(state["rng_state"])
+    pattern._exchange_step = state["exchange_step"]
+
+    return state
+
+# ------------------------------------------------------------------------------
+#
+def restage_directives(state, sandbox):
+    """Returns stage-in directives which copy the staging area files listed in
+    the checkpoint manifest into the staging area of a new pilot. Nothing has
+    to be copied if the run continues on the pilot that wrote the checkpoint.
+
+    Arguments:
+    state - dictionary returned by read_checkpoint()
+    sandbox - sandbox URL of the current pilot
+    """
+    old_sandbox = state["sandbox"]
+    if (old_sandbox is None) or (str(old_sandbox) == str(sandbox)):
+        return []
+
+    directives = []
+    for files in state["manifest"].values():
+        for f in files:
+            directives.append({
+                "source": "{0}/staging_area/{1}".format(
+                    str(old_sandbox).rstrip("/"), f),
+                "target": "staging:///{0}".format(f),
+                "action": radical.pilot.TRANSFER
+            })
+    return directives
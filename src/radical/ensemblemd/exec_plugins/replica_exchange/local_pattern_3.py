@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+"""A local execution plugin for RE pattern 3. The tasks run as processes on
+the host of a LocalEnvironment.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.replica_exchange import static_pattern_3
+
+
+# ------------------------------------------------------------------------------
+#
+_PLUGIN_INFO = {
+    "name":         "replica_exchange.local_pattern_3",
+    "pattern":      "ReplicaExchange",
+    "context_type": "Local"
+}
+
+_PLUGIN_OPTIONS = []
+
+# ------------------------------------------------------------------------------
+#
+class Plugin(static_pattern_3.Plugin):
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+        PluginBase.__init__(self, _PLUGIN_INFO, _PLUGIN_OPTIONS)
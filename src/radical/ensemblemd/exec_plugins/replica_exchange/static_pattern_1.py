@@ -14,10 +14,14 @@ import os
 import sys
 import traceback
 import random
-import datetime
+import cPickle as pickle
 import radical.pilot
 from radical.ensemblemd.exceptions import NotImplementedError, EnsemblemdError
 from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+from radical.ensemblemd.exec_plugins.replica_exchange.bundling import bundle_namd_units
+from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import read_checkpoint
+from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import write_checkpoint
 
 # ------------------------------------------------------------------------------
 #
@@ -43,7 +47,10 @@ class Plugin(PluginBase):
     def verify_pattern(self, pattern, resource):
         """
         """
-        pass
+        # the replica state is kept in the staging area of one pilot
+        if len(resource._pilots) > 1:
+            raise EnsemblemdError(
+                msg="Replica exchange needs a single pilot, allocate the resource with pilots=1.")
 
     # --------------------------------------------------------------------------
     #
@@ -52,10 +59,9 @@ class Plugin(PluginBase):
 
         def unit_state_cb (unit, state) :
 
+            # failed units are handled by the FailureHandler after wait_units()
             if state == radical.pilot.FAILED:
-                self.get_logger().error("ComputeUnit error: STDERR: {0}, STDOUT: {0}".format(unit.stderr, unit.stdout))
-                self.get_logger().error("Pattern execution FAILED.")
-                sys.exit(1)
+                self.get_logger().error("ComputeUnit error: STDERR: {0}, STDOUT: {1}".format(unit.stderr, unit.stdout))
 
         try:
 
@@ -69,66 +75,51 @@ class Plugin(PluginBase):
                 raise
 
 
-            do_profile = os.getenv('RADICAL_ENMD_PROFILING', '0')
-            #-------------------------------------------------------------------
-            if do_profile == '1':
-                t4 = datetime.datetime.utcnow()
-                outfile = pattern.workdir_local + "/enmd-core-overhead.csv"
-                try:
-                    f = open(outfile, 'a')
-
-                    row = "ENMD-core-t-inside cluster.run() call: {0}".format(t4)
-                    f.write("{row}\n".format(row=row))
-
-                    f.close()
-                except IOError:
-                    print 'Warning: unable to access file %s' % outfile
-                    raise
-            #-------------------------------------------------------------------
+            profiler = resource._profiler
+            profiler.prof(pattern.name, None, 'start')
             
 
-            if do_profile == '1':
-                cu_performance_data = {}
-                step_performance_data = {}
+            # input file template, rendered in the pre_exec of the MD units
+            if pattern.input_template is not None:
+                sd_template = {'source': 'file://%s' % os.path.abspath(pattern.input_template),
+                               'target': 'staging:///%s' % os.path.basename(pattern.input_template),
+                               'action': radical.pilot.TRANSFER
+                }
+                resource._pilot.stage_in(sd_template)
 
-            # Pilot must be active
-            self._reporter.info("Job waiting on queue...".format(resource._resource_key))
-            resource._pmgr.wait_pilots(resource._pilot.uid,'Active')
-            self._reporter.ok("\nJob is now running !".format(resource._resource_key))
+            # the first tasks are prepared while the pilot waits in the queue,
+            # their submission waits until it is active (see PreStager)
+            self._reporter.info("Preparing the first tasks while the job waits on queue...")
 
             resource._umgr.register_callback(unit_state_cb)
-
-            if do_profile == '1':
-                pattern_start_time = datetime.datetime.utcnow()
+            failures = FailureHandler(resource, pattern.failure_policy, self.get_logger(),
+                pattern.straggler_policy)
 
             replicas = pattern.get_replicas()
 
-            for c in range(1,cycles):
+            start_cycle = 1
+            swap_history = []
+            resume = getattr(resource, '_resume', None)
+            if resume is not None:
+                ckpt = read_checkpoint(resume, pattern)
+                replicas = pattern.get_replicas()
+                start_cycle = ckpt["cycle"] + 1
+                swap_history = ckpt["swap_history"]
+                self.get_logger().info("Resuming from checkpoint {0} with cycle {1}".format(resume, start_cycle))
+                self._reporter.info("\nResuming with cycle {0}".format(start_cycle))
 
-                if do_profile == '1':
-                    step_start_time_abs = datetime.datetime.utcnow()
+            for c in range(start_cycle, cycles):
 
-                    cu_performance_data['cycle_{0}'.format(c)] = {}
-                    cu_performance_data['cycle_{0}'.format(c)]['md_step'] = {}
-
-                    step_performance_data['cycle_{0}'.format(c)] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_start_time_abs']         = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_start_time_abs']         = step_start_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_start_time_abs'] = step_start_time_abs
+                profiler.prof(pattern.name, 'md_step', 'start', iteration=c)
 
                 #---------------------------------------------------------------
                 # start of MD step preparation
                 #---------------------------------------------------------------
                 cus = []
                 md_units = []
-                for r in replicas:
+                for r, r_kernel in pattern.prepare_replicas(replicas):
 
-                    self.get_logger().info("Building input files for replica %d" % r.id)
-                    pattern.build_input_file(r)
-                    self.get_logger().info("Preparing replica %d for MD run" % r.id)
-                    r_kernel = pattern.prepare_replica_for_md(r)
+                    self.get_logger().info("Prepared replica %d for MD run" % r.id)
                     r_kernel._bind_to_resource(resource._resource_key)
 
                     cu                = radical.pilot.ComputeUnitDescription()
@@ -139,33 +130,31 @@ class Plugin(PluginBase):
                     cu.cores          = r_kernel.cores
                     cu.input_staging  = r_kernel._cu_def_input_data
                     cu.output_staging = r_kernel._cu_def_output_data
-                    cus.append(cu)
+                    # with a preparation pool, units are submitted as soon as their
+                    # inputs are ready instead of after the whole loop
+                    if pattern.preparation_workers and not pattern.bundle_size:
+                        md_units.append(failures.submit_units(cu))
+                    else:
+                        cus.append(cu)
+
+                # NAMD multi-copy units running bundle_size replicas each
+                if pattern.bundle_size:
+                    cus = bundle_namd_units(cus, pattern.bundle_size, c)
 
                 #---------------------------------------------------------------
                 # end of MD step preparation
                 #---------------------------------------------------------------
-                if do_profile == '1':
-                    enmd_ov_step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_end_time_abs'] = enmd_ov_step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_duration'] = (enmd_ov_step_end_time_abs - step_start_time_abs).total_seconds() 
+                profiler.prof(pattern.name, 'md_step', 'submit', iteration=c)
          
                 self.get_logger().info("Performing MD step for replicas")
                 self._reporter.info("\nCycle {0}: Waiting for MD step to complete".format(c))
-                md_units = resource._umgr.submit_units(cus)
-                uids = [cu.uid for cu in md_units]
-                resource._umgr.wait_units(uids)
+                if cus:
+                    md_units += failures.submit_units(cus)
+                md_units = failures.wait_units(md_units)
 
-                if do_profile == '1':
-                    step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_end_time_abs'] =  step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['duration'] = (step_end_time_abs - step_start_time_abs).total_seconds() 
-
-                    for cu in md_units:    
-                        cu_performance_data['cycle_{0}'.format(c)]['md_step']["cu.uid_{0}".format(cu.uid)] = cu          
+                profiler.prof(pattern.name, 'md_step', 'stop', iteration=c)
+                for cu in md_units:
+                    profiler.prof_states(pattern.name, 'md_step', cu, iteration=c)
 
                 failed_units = ""
                 for unit in md_units:
@@ -173,13 +162,7 @@ class Plugin(PluginBase):
                         failed_units += " * MD step: Unit {0} failed with an error: {1}\n".format(unit.uid, unit.stderr)
 
                 #---------------------------------------------------------------
-                if do_profile == '1':
-                    step_start_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_start_time_abs'] = step_start_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_start_time_abs'] = step_start_time_abs
+                profiler.prof(pattern.name, 'ex_step', 'start', iteration=c)
 
                 self._reporter.ok('>> done')
                 #---------------------------------------------------------------
@@ -192,24 +175,20 @@ class Plugin(PluginBase):
                 swap_matrix = pattern.get_swap_matrix(replicas)
 
                 # this is actual exchange
-                for r_i in replicas:
-                    r_j = pattern.exchange(r_i, replicas, swap_matrix)
-                    if (r_j != r_i):
-                        pattern.perform_swap(r_i, r_j)
+                pairs = pattern.exchange_replicas(replicas, swap_matrix)
+                swap_history.append((c, [(r_i.id, r_j.id) for r_i, r_j in pairs]))
+
+                if pattern.checkpoint_file is not None:
+                    try:
+                        write_checkpoint(pattern.checkpoint_file, c, pattern, replicas,
+                                         swap_history)
+                    except (IOError, OSError, TypeError, pickle.PicklingError), ex:
+                        self.get_logger().warning("Unable to write checkpoint {0}: {1}".format(pattern.checkpoint_file, str(ex)))
 
                 #---------------------------------------------------------------
                 # end of Exchange step (local)
                 #---------------------------------------------------------------
-                if do_profile == '1':
-                    step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_end_time_abs'] = step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_end_time_abs'] = step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['duration'] = ( step_end_time_abs - step_start_time_abs ).total_seconds()
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_duration'] = ( step_end_time_abs - step_start_time_abs ).total_seconds()
+                profiler.prof(pattern.name, 'ex_step', 'stop', iteration=c)
 
                 self._reporter.ok('>> done')
                 self.get_logger().info("Replica Exchange simulation finished successfully!")
@@ -222,76 +201,7 @@ class Plugin(PluginBase):
             self._reporter.header('Pattern execution successfully finished')
 
 
-            # PROFILING
-            if do_profile =='1':
-            
-                outfile = "execution_profile_{mysession}.csv".format(mysession=resource._session.uid)
-                with open(outfile, 'a') as f:
-
-                    head = "Cycle; Step; Start; Stop; Duration"
-                    f.write("{row}\n".format(row=head))
-
-                    for cycle in step_performance_data:
-                        for step in step_performance_data[cycle].keys():
-                            dur = step_performance_data[cycle][step]['duration']
-                            start = step_performance_data[cycle][step]['step_start_time_abs']
-                            end = step_performance_data[cycle][step]['step_end_time_abs']
-                            row = "{Cycle}; {Step}; {Start}; {End}; {Duration}".format(
-                                Duration=dur,
-                                Cycle=cycle,
-                                Step=step,
-                                Start=start,
-                                End=end)
-
-                            f.write("{r}\n".format(r=row))
-                            #-------------------------------------------------------
-                            # enmd overhead
-                            dur = step_performance_data[cycle][step]['enmd_ov_duration']
-                            start = step_performance_data[cycle][step]['enmd_ov_step_start_time_abs']
-                            end = step_performance_data[cycle][step]['enmd_ov_step_end_time_abs']
-                            row = "{Cycle}; {Step}; {Start}; {End}; {Duration}".format(
-                                Duration=dur,
-                                Cycle=cycle,
-                                Step=step + "_enmd_overhead",
-                                Start=start,
-                                End=end)
-
-                            f.write("{r}\n".format(r=row))
-
-                    #---------------------------------------------------------------
-                    head = "CU_ID; Scheduling; StagingInput; Allocating; Executing; StagingOutput; Done; Cycle; Step;"
-                    f.write("{row}\n".format(row=head))
-            
-                    for cycle in cu_performance_data:
-                        for step in cu_performance_data[cycle].keys():
-                            for cid in cu_performance_data[cycle][step].keys():
-                                cu = cu_performance_data[cycle][step][cid]
-                                st_data = {}
-                                for st in cu.state_history:
-                                    st_dict = st.as_dict()
-                                    st_data["{0}".format( st_dict["state"] )] = {}
-                                    st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-                                #print st_data
-                                #start = step_performance_data[cycle][step]['step_start_time_abs']
-                                if 'StagingOutput' not in st_data:
-                                    st_data['StagingOutput'] = st_data['Executing']
-
-                                if 'Done' not in st_data:
-                                    st_data['Done'] = st_data['Executing']
-
-                                row = "{uid}; {Scheduling}; {StagingInput}; {Allocating}; {Executing}; {StagingOutput}; {Done}; {Cycle}; {Step}".format(
-                                    uid=cu.uid,
-                                    Scheduling=(st_data['Scheduling']),
-                                    StagingInput=(st_data['StagingInput']),
-                                    Allocating=(st_data['Allocating']),
-                                    Executing=(st_data['Executing']),
-                                    StagingOutput=(st_data['StagingOutput']),
-                                    Done=(st_data['Done']),
-                                    Cycle=cycle,
-                                    Step=step)
-                        
-                                f.write("{r}\n".format(r=row))
+            profiler.prof(pattern.name, None, 'stop')
 
         except KeyboardInterrupt:
             traceback.print_exc()
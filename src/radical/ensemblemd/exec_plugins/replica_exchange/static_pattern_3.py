@@ -14,11 +14,16 @@ import os
 import sys
 import time
 import random
-import datetime
 import traceback
+import cPickle as pickle
 import radical.pilot
 from radical.ensemblemd.exceptions import NotImplementedError, EnsemblemdError
 from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+from radical.ensemblemd.exec_plugins.replica_exchange.bundling import bundle_namd_units
+from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import read_checkpoint
+from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import write_checkpoint
+from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import restage_directives
 
 # ------------------------------------------------------------------------------
 #
@@ -44,7 +49,10 @@ class Plugin(PluginBase):
     # --------------------------------------------------------------------------
     #
     def verify_pattern(self, pattern, resource):
-        pass
+        # the replica state is kept in the staging area of one pilot
+        if len(resource._pilots) > 1:
+            raise EnsemblemdError(
+                msg="Replica exchange needs a single pilot, allocate the resource with pilots=1.")
 
     # --------------------------------------------------------------------------
     #
@@ -57,27 +65,9 @@ class Plugin(PluginBase):
                     must be defined for pattern ReplicaExchange!")
                 raise
 
-            #-------------------------------------------------------------------
-            t4 = datetime.datetime.utcnow()
-            outfile = pattern.workdir_local + "/enmd-core-overhead.csv"
-            try:
-                f = open(outfile, 'a')
-
-                row = "ENMD-core-t-inside cluster.run() call: {0}".format(t4)
-                f.write("{row}\n".format(row=row))
-
-                f.close()
-            except IOError:
-                print 'Warning: unable to access file %s' % outfile
-                raise
-            #-------------------------------------------------------------------
+            profiler = resource._profiler
+            profiler.prof(pattern.name, None, 'start')
 
-            do_profile = os.getenv('RADICAL_ENMD_PROFILING', '0')
-
-            if do_profile == '1':
-                cu_performance_data = {}
-                step_performance_data = {}
- 
             # shared data
             pattern.prepare_shared_data()
 
@@ -100,39 +90,54 @@ class Plugin(PluginBase):
                 }
                 sd_shared_list.append(sd_shared)
 
-            # Pilot must be active
-            resource._pmgr.wait_pilots(resource._pilot.uid,'Active')       
-     
-            if do_profile == '1':
-                pattern_start_time = datetime.datetime.utcnow()
+            # input file template, rendered in the pre_exec of the MD units
+            if pattern.input_template is not None:
+                sd_template = {'source': 'file://%s' % os.path.abspath(pattern.input_template),
+                               'target': 'staging:///%s' % os.path.basename(pattern.input_template),
+                               'action': radical.pilot.TRANSFER
+                }
+                resource._pilot.stage_in(sd_template)
 
+            # the first tasks are prepared while the pilot waits in the queue,
+            # their submission waits until it is active (see PreStager)
+            self._reporter.info("Preparing the first tasks while the job waits on queue...")
+            failures = FailureHandler(resource, pattern.failure_policy, self.get_logger(),
+                pattern.straggler_policy)
+     
             replicas = pattern.get_replicas()
 
+            start_cycle = 1
+            swap_history = []
+            manifest = {}
+            resume = getattr(resource, '_resume', None)
+            if resume is not None:
+                ckpt = read_checkpoint(resume, pattern)
+                replicas = pattern.get_replicas()
+                start_cycle = ckpt["cycle"] + 1
+                swap_history = ckpt["swap_history"]
+                manifest = ckpt["manifest"]
+                self.get_logger().info("Resuming from checkpoint {0} with cycle {1}".format(resume, start_cycle))
+                self._reporter.info("\nResuming with cycle {0}".format(start_cycle))
+
+                # restart files of the replicas are in the staging area of
+                # the pilot that wrote the checkpoint
+                restage = restage_directives(ckpt, resource._pilot.sandbox)
+                if restage:
+                    resource._pilot.stage_in(restage)
+
             #-------------------------------------------------------------------
             # GL = 0: submit global calculator before
             # GL = 1: submit global calculator after
             GL = 1
 
-            for c in range(1, cycles):
-                if do_profile == '1':
-                    step_start_time_abs = datetime.datetime.utcnow()
-
-                    cu_performance_data['cycle_{0}'.format(c)] = {}
-                    cu_performance_data['cycle_{0}'.format(c)]['md_step'] = {}
-
-                    step_performance_data['cycle_{0}'.format(c)] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_start_time_abs']         = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_start_time_abs']         = step_start_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_start_time_abs'] = step_start_time_abs
+            for c in range(start_cycle, cycles):
+                profiler.prof(pattern.name, 'md_step', 'start', iteration=c)
 
                 md_units = []
                 cus = []
-                for r in replicas:
+                for r, r_kernel in pattern.prepare_replicas(replicas, build_input=False):
 
-                    self.get_logger().info("Cycle %d: Preparing replica %d for MD-step" % ((c), r.id) )
-                    r_kernel = pattern.prepare_replica_for_md(r)
+                    self.get_logger().info("Cycle %d: Prepared replica %d for MD-step" % ((c), r.id) )
 
                     if ((r_kernel._kernel.get_name()) == "md.amber"):
                         r_kernel._bind_to_resource(resource._resource_key, pattern.name)
@@ -144,6 +149,7 @@ class Plugin(PluginBase):
                     #-----------------------------------------------------------
                     copy_out = []
                     items_out = r_kernel._kernel._copy_output_data
+                    manifest[r.id] = list(items_out or [])
                     if items_out:                    
                         for item in items_out:
                             i_out = {
@@ -191,34 +197,31 @@ class Plugin(PluginBase):
                         out_list = out_list + copy_out
                     cu.output_staging = out_list
                     #-----------------------------------------------------------
-                    cus.append(cu)
+                    # with a preparation pool, units are submitted as soon as their
+                    # inputs are ready instead of after the whole loop
+                    if pattern.preparation_workers and not pattern.bundle_size:
+                        md_units.append(failures.submit_units(cu))
+                    else:
+                        cus.append(cu)
+
+                # NAMD multi-copy units running bundle_size replicas each
+                if pattern.bundle_size:
+                    cus = bundle_namd_units(cus, pattern.bundle_size, c)
                
-                if do_profile == '1':
-                    enmd_ov_step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_step_end_time_abs'] = enmd_ov_step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['enmd_ov_duration'] = (enmd_ov_step_end_time_abs - step_start_time_abs).total_seconds() 
+                profiler.prof(pattern.name, 'md_step', 'submit', iteration=c)
 
                 # bulk submission
-                sub_replicas = resource._umgr.submit_units(cus)  
-                for r in sub_replicas:
-                    md_units.append(r)                 
+                if cus:
+                    md_units += failures.submit_units(cus)
 
                 self.get_logger().info("Cycle %d: Performing MD-step for replicas" % (c) )
 
-                resource._umgr.wait_units()
+                md_units = failures.wait_units(md_units)
                 #uids = [cu.uid for cu in cus]
 
-                if do_profile == '1':
-                    step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['step_end_time_abs'] =  step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['md_step']['duration'] = (step_end_time_abs - step_start_time_abs).total_seconds() 
-
-                    for cu in sub_replicas:    
-                        cu_performance_data['cycle_{0}'.format(c)]['md_step']["cu.uid_{0}".format(cu.uid)] = cu 
+                profiler.prof(pattern.name, 'md_step', 'stop', iteration=c)
+                for cu in md_units:
+                    profiler.prof_states(pattern.name, 'md_step', cu, iteration=c)
  
                 #---------------------------------------------------------------
                 failed_units = ""
@@ -226,21 +229,11 @@ class Plugin(PluginBase):
                     if unit.state != radical.pilot.DONE:
                         failed_units += " * MD step: Unit {0} failed with an error: {1}\n".format(unit.uid, unit.stderr)
 
-                if len(failed_units) > 10:
-                    sys.exit()
-
                 #---------------------------------------------------------------
                 # exchange 
                 #---------------------------------------------------------------
 
-                if do_profile == '1':
-                    step_start_time_abs = datetime.datetime.utcnow()
-                    cu_performance_data['cycle_{0}'.format(c)]['ex_step'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_start_time_abs'] = step_start_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_start_time_abs'] = step_start_time_abs
+                profiler.prof(pattern.name, 'ex_step', 'start', iteration=c)
                 
                 ex_units = []
 
@@ -299,27 +292,16 @@ class Plugin(PluginBase):
                 cu.mpi            = gl_ex_kernel.uses_mpi
                 cu.cores          = gl_ex_kernel.cores
 
-                if do_profile == '1':
-                    enmd_ov_step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_step_end_time_abs'] = enmd_ov_step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['enmd_ov_duration'] = (enmd_ov_step_end_time_abs - step_start_time_abs).total_seconds()  
+                profiler.prof(pattern.name, 'ex_step', 'submit', iteration=c)
 
-                sub_replica = resource._umgr.submit_units(cu)
-                resource._umgr.wait_units(sub_replica.uid)
+                sub_replica = failures.submit_units(cu)
+                sub_replica = failures.wait_units([sub_replica])[0]
 
                 ex_units.append(sub_replica)
                     
-                if do_profile == '1':
-                    step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['step_end_time_abs'] = step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['ex_step']['duration'] = (step_end_time_abs - step_start_time_abs).total_seconds()  
-
-                    for cu in ex_units:    
-                        cu_performance_data['cycle_{0}'.format(c)]['ex_step']["cu.uid_{0}".format(cu.uid)] = cu 
+                profiler.prof(pattern.name, 'ex_step', 'stop', iteration=c)
+                for cu in ex_units:
+                    profiler.prof_states(pattern.name, 'ex_step', cu, iteration=c)
                     
                 failed_units = ""
                 for unit in ex_units:
@@ -330,100 +312,26 @@ class Plugin(PluginBase):
                 # post processing
                 #---------------------------------------------------------------
                  
-                if do_profile == '1':
-                    step_start_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['step_start_time_abs'] = step_start_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['enmd_ov_step_start_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['enmd_ov_step_start_time_abs'] = step_start_time_abs
+                profiler.prof(pattern.name, 'pp_step', 'start', iteration=c)
                 
                 #---------------------------------------------------------------
                 pattern.do_exchange(c, replicas)
+
+                if pattern.checkpoint_file is not None:
+                    try:
+                        write_checkpoint(pattern.checkpoint_file, c, pattern, replicas,
+                                         swap_history, manifest, str(resource._pilot.sandbox))
+                    except (IOError, OSError, TypeError, pickle.PicklingError), ex:
+                        self.get_logger().warning("Unable to write checkpoint {0}: {1}".format(pattern.checkpoint_file, str(ex)))
                 
-                if do_profile == '1':
-                    step_end_time_abs = datetime.datetime.utcnow()
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['step_end_time_abs'] = step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['enmd_ov_step_end_time_abs'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['enmd_ov_step_end_time_abs'] = step_end_time_abs
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['duration'] = ( step_end_time_abs - step_start_time_abs ).total_seconds()
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['enmd_ov_duration'] = {}
-                    step_performance_data['cycle_{0}'.format(c)]['pp_step']['enmd_ov_duration'] = ( step_end_time_abs - step_start_time_abs ).total_seconds()
+                profiler.prof(pattern.name, 'pp_step', 'stop', iteration=c)
                 
                 #---------------------------------------------------------------    
     
             #-------------------------------------------------------------------
             # End of simulation loop
             #-------------------------------------------------------------------
-            outfile = "execution_profile_{mysession}.csv".format(mysession=resource._session.uid)
-            with open(outfile, 'w+') as f:
-
-                head = "Cycle; Step; Start; Stop; Duration"
-                f.write("{row}\n".format(row=head))
-
-                for cycle in step_performance_data:
-                    for step in step_performance_data[cycle].keys():
-                        dur = step_performance_data[cycle][step]['duration']
-                        start = step_performance_data[cycle][step]['step_start_time_abs']
-                        end = step_performance_data[cycle][step]['step_end_time_abs']
-                        row = "{Cycle}; {Step}; {Start}; {End}; {Duration}".format(
-                            Duration=dur,
-                            Cycle=cycle,
-                            Step=step,
-                            Start=start,
-                            End=end)
-
-                        f.write("{r}\n".format(r=row))
-                        #-------------------------------------------------------
-                        # enmd overhead
-                        dur = step_performance_data[cycle][step]['enmd_ov_duration']
-                        start = step_performance_data[cycle][step]['enmd_ov_step_start_time_abs']
-                        end = step_performance_data[cycle][step]['enmd_ov_step_end_time_abs']
-                        row = "{Cycle}; {Step}; {Start}; {End}; {Duration}".format(
-                            Duration=dur,
-                            Cycle=cycle,
-                            Step=step + "_enmd_overhead",
-                            Start=start,
-                            End=end)
-
-                        f.write("{r}\n".format(r=row))
-
-                #---------------------------------------------------------------
-                head = "CU_ID; Scheduling; StagingInput; Allocating; Executing; StagingOutput; Done; Cycle; Step;"
-                f.write("{row}\n".format(row=head))
-            
-                for cycle in cu_performance_data:
-                    for step in cu_performance_data[cycle].keys():
-                        for cid in cu_performance_data[cycle][step].keys():
-                            cu = cu_performance_data[cycle][step][cid]
-                            st_data = {}
-                            for st in cu.state_history:
-                                st_dict = st.as_dict()
-                                st_data["{0}".format( st_dict["state"] )] = {}
-                                st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-                            #print st_data
-                            #start = step_performance_data[cycle][step]['step_start_time_abs']
-                            if 'StagingOutput' not in st_data:
-                                st_data['StagingOutput'] = st_data['Executing']
-
-                            if 'Done' not in st_data:
-                                st_data['Done'] = st_data['Executing']
-
-                            row = "{uid}; {Scheduling}; {StagingInput}; {Allocating}; {Executing}; {StagingOutput}; {Done}; {Cycle}; {Step}".format(
-                                uid=cu.uid,
-                                Scheduling=(st_data['Scheduling']),
-                                StagingInput=(st_data['StagingInput']),
-                                Allocating=(st_data['Allocating']),
-                                Executing=(st_data['Executing']),
-                                StagingOutput=(st_data['StagingOutput']),
-                                Done=(st_data['Done']),
-                                Cycle=cycle,
-                                Step=step)
-                        
-                            f.write("{r}\n".format(r=row))
+            profiler.prof(pattern.name, None, 'stop')
 
         except KeyboardInterrupt:
             traceback.print_exc()
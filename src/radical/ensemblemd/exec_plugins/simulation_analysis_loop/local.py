@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+"""A local execution plugin for the 'simulation-analysis' pattern. The tasks run as processes on
+the host of a LocalEnvironment.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.simulation_analysis_loop import static
+
+
+# ------------------------------------------------------------------------------
+#
+_PLUGIN_INFO = {
+	"name":         "simulation_analysis_loop.local.default",
+	"pattern":      "SimulationAnalysisLoop",
+	"context_type": "Local"
+}
+
+_PLUGIN_OPTIONS = []
+
+# ------------------------------------------------------------------------------
+#
+class Plugin(static.Plugin):
+
+	# --------------------------------------------------------------------------
+	#
+	def __init__(self):
+		PluginBase.__init__(self, _PLUGIN_INFO, _PLUGIN_OPTIONS)
+		self.working_dirs = {}
@@ -12,10 +12,12 @@ import sys
 import traceback
 import time
 import saga
-import datetime
 import radical.pilot
-from radical.ensemblemd.exceptions import NotImplementedError, EnsemblemdError
+from radical.ensemblemd.exceptions import NotImplementedError, EnsemblemdError, WalltimeError
 from radical.ensemblemd.exec_plugins.plugin_base import PluginBase
+from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+from radical.ensemblemd.exec_plugins.journal import open_journal
+from radical.ensemblemd.exec_plugins.memoization import TaskMemo
 
 
 # ------------------------------------------------------------------------------
@@ -28,6 +30,9 @@ _PLUGIN_INFO = {
 
 _PLUGIN_OPTIONS = []
 
+# Subdirectory of a bundled simulation unit for a given instance
+BUNDLE_INSTANCE_DIR = "instance_{0}"
+
 # ------------------------------------------------------------------------------
 #
 def resolve_placeholder_vars(working_dirs, path, instance=None, iteration=None, type=None):
@@ -115,8 +120,6 @@ class Plugin(PluginBase):
 	#
 	def execute_pattern(self, pattern, resource):
 
-		pattern_start_time = datetime.datetime.now()
-
 		def get_input_data(kernel,instance=None,iteration=None,ktype=None):
 
 			# INPUT DATA:
@@ -312,10 +315,9 @@ class Plugin(PluginBase):
 		#
 		def unit_state_cb (unit, state) :
 
+			# failed units are handled by the FailureHandler after wait_units()
 			if state == radical.pilot.FAILED:
-				self.get_logger().error("ComputeUnit error: STDERR: {0}, STDOUT: {0}".format(unit.stderr, unit.stdout))
-				self.get_logger().error("Pattern execution FAILED.")
-				sys.exit(1)
+				self.get_logger().error("ComputeUnit error: STDERR: {0}, STDOUT: {1}".format(unit.stderr, unit.stdout))
 
 		#-----------------------------------------------------------------------
 		#
@@ -328,6 +330,80 @@ class Plugin(PluginBase):
 
 			return command_list
 
+		#-----------------------------------------------------------------------
+		#
+		def create_simulation_cu(sim_step, iteration, s_instance):
+
+			cud = radical.pilot.ComputeUnitDescription()
+			cud.name = "sim ;{iteration} ;{instance}".format(iteration=iteration, instance=s_instance)
+
+			cud.pre_exec       = sim_step._cu_def_pre_exec
+			cud.executable     = sim_step._cu_def_executable
+			cud.arguments      = sim_step.arguments
+			cud.mpi            = sim_step.uses_mpi
+			cud.input_staging  = get_input_data(kernel=sim_step,instance=s_instance, iteration=iteration,ktype='simulation')
+			cud.output_staging = get_output_data(kernel=sim_step,instance=s_instance, iteration=iteration,ktype='simulation')
+
+			if sim_step.cores is not None:
+				cud.cores = sim_step.cores
+
+			if sim_step.exists_remote is not None:
+				cud.post_exec = create_filecheck_command(sim_step.exists_remote)
+
+			return cud
+
+		#-----------------------------------------------------------------------
+		#
+		def get_bundle_key(sim_step):
+
+			return (sim_step.name, str(sim_step._cu_def_executable), str(sim_step.arguments),
+					str(sim_step._cu_def_pre_exec), sim_step.cores, sim_step.uses_mpi)
+
+		#-----------------------------------------------------------------------
+		#
+		def create_bundle_cu(group, iteration):
+
+			# every instance gets its own subdirectory of the unit's sandbox
+			directories = [BUNDLE_INSTANCE_DIR.format(instance) for instance, sim_step in group]
+			sim_step = group[0][1]
+
+			input_staging = []
+			output_staging = []
+			post_exec = []
+			for (instance, step), directory in zip(group, directories):
+				for d in get_input_data(kernel=step, instance=instance, iteration=iteration, ktype='simulation'):
+					if isinstance(d, dict):
+						d = dict(d)
+						d['target'] = '{0}/{1}'.format(directory, d['target'])
+					input_staging.append(d)
+				for d in get_output_data(kernel=step, instance=instance, iteration=iteration, ktype='simulation'):
+					d = dict(d)
+					d['source'] = '{0}/{1}'.format(directory, d['source'])
+					output_staging.append(d)
+				if step.exists_remote is not None:
+					post_exec += create_filecheck_command(['{0}/{1}'.format(directory, f) for f in step.exists_remote])
+
+			cud = radical.pilot.ComputeUnitDescription()
+			cud.name = "sim ;{iteration} ;{instances}".format(iteration=iteration,
+				instances=",".join([str(instance) for instance, step in group]))
+
+			cores = (sim_step.cores or 1) * len(group)
+
+			# the unit itself is not launched with MPI: the driver of the
+			# kernel starts the one MPI job of all instances on these cores
+			cud.pre_exec       = ['mkdir -p {0}'.format(' '.join(directories))] + sim_step._cu_def_pre_exec
+			cud.executable     = sim_step._cu_def_executable
+			cud.arguments      = sim_step._kernel._bundle_arguments(directories, cores)
+			cud.mpi            = False
+			cud.cores          = cores
+			cud.input_staging  = input_staging
+			cud.output_staging = output_staging
+
+			if post_exec:
+				cud.post_exec = post_exec
+
+			return cud
+
 		self._reporter.ok('>>ok')
 		self.get_logger().info("Executing simulation-analysis loop with {0} iterations on {1} allocated core(s) on '{2}'".format(pattern.iterations, resource._cores, resource._resource_key))
 
@@ -337,24 +413,38 @@ class Plugin(PluginBase):
 
 		#print resource._pilot.description['cores']
 
-		self.get_logger().info("Waiting for pilot on {0} to go Active".format(resource._resource_key))
-		self._reporter.info("Job waiting on queue...".format(resource._resource_key))
-		resource._pmgr.wait_pilots(resource._pilot.uid,'Active')
-		self._reporter.ok("\nJob is now running !".format(resource._resource_key))
+		# the first tasks are prepared while the pilot waits in the queue,
+		# their submission waits until it is active (see PreStager)
+		self._reporter.info("Preparing the first tasks while the job waits on queue...")
 
-		profiling = int(os.environ.get('RADICAL_ENMD_PROFILING',0))
-
-		if profiling == 1:
-			from collections import OrderedDict as od
-			pattern._execution_profile = []
-			enmd_overhead_dict = od()
-			cu_dict = od()
+		profiler = resource._profiler
 
 		try:
 
-			start_now = datetime.datetime.now()
+			profiler.prof(pattern.name, None, 'start')
 
 			resource._umgr.register_callback(unit_state_cb)
+			failures = FailureHandler(resource, pattern.failure_policy, self.get_logger(),
+				pattern.straggler_policy)
+			memo = TaskMemo(pattern.task_cache, resource, self.get_logger())
+
+			# stages recorded in the journal of a resumed run are skipped, the
+			# recorded working directories of their tasks are used instead
+			journal, records = open_journal(pattern, resource)
+			completed = set()
+			for record in records:
+				completed.add(record['stage'])
+				if 'iteration' in record:
+					self.working_dirs[record['iteration']] = record['working_dirs']
+				else:
+					self.working_dirs.update(record['working_dirs'])
+				if 'simulation_instances' in record:
+					pattern._simulation_instances = record['simulation_instances']
+
+			if records:
+				self._reporter.info("\nResuming after {0} completed stage(s)".format(len(records)))
+
+			sim_cores = None
 
 			########################################################################
 			# execute pre_loop
@@ -363,14 +453,14 @@ class Plugin(PluginBase):
 			################################################################
 			# EXECUTE PRE-LOOP
 
-			if profiling == 1:
-				probe_preloop_start = datetime.datetime.now()
-				enmd_overhead_dict['preloop'] = od()
-				enmd_overhead_dict['preloop']['start_time'] = probe_preloop_start
+			profiler.prof(pattern.name, 'pre_loop', 'start')
 				
 			pre_loop = pattern.pre_loop()
 
-			if pre_loop is not None:
+			if 'pre_loop' in completed:
+				self.get_logger().info("Pre_loop completed in resumed run.")
+
+			elif pre_loop is not None:
 				pre_loop._bind_to_resource(resource._resource_key)
 
 				cud = radical.pilot.ComputeUnitDescription()
@@ -389,32 +479,36 @@ class Plugin(PluginBase):
 
 				self.get_logger().debug("Created pre_loop CU: {0}.".format(cud.as_dict()))
 
-				self.get_logger().info("Submitted ComputeUnit(s) for pre_loop step.")
-				self._reporter.info("\nWaiting for pre_loop step to complete.")
-				if profiling == 1:
-					probe_preloop_wait = datetime.datetime.now()
-					enmd_overhead_dict['preloop']['wait_time'] = probe_preloop_wait
+				# a cached pre_loop is not executed again
+				unit = None
+				working_directory = memo.prepare(cud, pre_loop)
+				if working_directory is None:
+					self.get_logger().info("Submitted ComputeUnit(s) for pre_loop step.")
+					self._reporter.info("\nWaiting for pre_loop step to complete.")
+					profiler.prof(pattern.name, 'pre_loop', 'submit')
+
+					unit = failures.submit_units(cud)
+					unit = failures.wait_units([unit])[0]
+					memo.complete([unit])
+					all_cus.append(unit)
 
-				unit = resource._umgr.submit_units(cud)
-				all_cus.append(unit)
-				resource._umgr.wait_units(unit.uid)
+					profiler.prof(pattern.name, 'pre_loop', 'done')
+					profiler.prof_states(pattern.name, 'pre_loop', unit)
 
-				if profiling == 1:
-					probe_preloop_res = datetime.datetime.now()
-					enmd_overhead_dict['preloop']['res_time'] = probe_preloop_res
+					self.get_logger().info("Pre_loop completed.")
 
-				self.get_logger().info("Pre_loop completed.")
+					if unit.state != radical.pilot.DONE:
+						raise EnsemblemdError("Pre-loop CU failed with error: {0}".format(unit.stdout))
 
-				if unit.state != radical.pilot.DONE:
-					raise EnsemblemdError("Pre-loop CU failed with error: {0}".format(unit.stdout))
+					working_directory = unit.working_directory
 
-				self.working_dirs["pre_loop"] = saga.Url(unit.working_directory).path
+				self.working_dirs["pre_loop"] = saga.Url(working_directory).path
+
+				if journal is not None:
+					journal.append({'stage': 'pre_loop', 'working_dirs': {'pre_loop': self.working_dirs["pre_loop"]}})
 
 				# Process CU information and append it to the dictionary
-				if profiling == 1:
-					probe_preloop_done = datetime.datetime.now()
-					enmd_overhead_dict['preloop']['stop_time'] = probe_preloop_done
-					cu_dict['pre_loop'] = unit
+				profiler.prof(pattern.name, 'pre_loop', 'stop')
 
 
 				self._reporter.ok('>> done')
@@ -425,125 +519,152 @@ class Plugin(PluginBase):
 			########################################################################
 			# execute simulation analysis loop
 			#
-			for iteration in range(1, pattern.iterations+1):
-
-				self.working_dirs['iteration_{0}'.format(iteration)] = {}
-
-				################################################################
-				# EXECUTE SIMULATION STEPS
-
-				if profiling == 1:
-					enmd_overhead_dict['iter_{0}'.format(iteration)] = od()
-					cu_dict['iter_{0}'.format(iteration)] = od()
+			# walltime used by the iterations of this run
+			walltime_policy = getattr(resource, 'walltime_policy', None)
+			iteration_walltimes = []
 
-				if isinstance(pattern.simulation_stage(iteration=iteration, instance=1),list):
-					num_sim_kerns = len(pattern.simulation_stage(iteration=iteration, instance=1))
-				else:
-					num_sim_kerns = 1
-				#print num_sim_kerns
+			for iteration in range(1, pattern.iterations+1):
 
-				all_sim_cus = []
-				if profiling == 1:
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']= od()
-					cu_dict['iter_{0}'.format(iteration)]['sim']= list()
+				sim_stage = 'iteration_{0}/simulation'.format(iteration)
+				ana_stage = 'iteration_{0}/analysis'.format(iteration)
 
-				for kern_step in range(0,num_sim_kerns):
+				# the analysis is recorded last, the iteration is complete
+				if ana_stage in completed:
+					self.get_logger().info("Iteration {0} completed in resumed run.".format(iteration))
+					continue
 
-					if profiling == 1:
-						probe_sim_start = datetime.datetime.now()
+				# the run ends after the last iteration that fits into the
+				# walltime, the journal lets a new allocation continue it
+				remaining = resource.remaining_walltime
+				if walltime_policy is not None and iteration_walltimes:
+					if not walltime_policy.admits(max(iteration_walltimes), remaining):
+						raise WalltimeError(name="Iteration {0}".format(iteration),
+							estimate=max(iteration_walltimes), remaining=remaining)
 
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['kernel_{0}'.format(kern_step)]= od()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['kernel_{0}'.format(kern_step)]['start_time'] = probe_sim_start
+				if sim_stage not in completed:
+					self.working_dirs['iteration_{0}'.format(iteration)] = {}
 
-					s_units = []
-					for s_instance in range(1, pattern._simulation_instances+1):
+				################################################################
+				# EXECUTE SIMULATION STEPS
 
-						if isinstance(pattern.simulation_stage(iteration=iteration, instance=s_instance),list):
-							sim_step = pattern.simulation_stage(iteration=iteration, instance=s_instance)[kern_step]
+				if sim_stage in completed:
+					self.get_logger().info("Simulations in iteration {0} completed in resumed run.".format(iteration))
+				else:
+					if isinstance(pattern.simulation_stage(iteration=iteration, instance=1),list):
+						num_sim_kerns = len(pattern.simulation_stage(iteration=iteration, instance=1))
+					else:
+						num_sim_kerns = 1
+					#print num_sim_kerns
+
+					all_sim_cus = []
+					for kern_step in range(0,num_sim_kerns):
+
+						profiler.prof(pattern.name, 'simulation', 'start', iteration=iteration, instance='kernel_{0}'.format(kern_step))
+
+						s_units = []
+						s_unit_instances = []
+						cached_dirs = {}
+						bundle_keys = []
+						bundles = {}
+						for s_instance in range(1, pattern._simulation_instances+1):
+
+							if isinstance(pattern.simulation_stage(iteration=iteration, instance=s_instance),list):
+								sim_step = pattern.simulation_stage(iteration=iteration, instance=s_instance)[kern_step]
+							else:
+								sim_step = pattern.simulation_stage(iteration=iteration, instance=s_instance)
+
+							sim_step._bind_to_resource(resource._resource_key)
+							sim_cores = sim_step.cores
+
+							# Instances with the same kernel configuration are bundled
+							# and submitted after all instances have been created
+							if pattern.bundle_simulations and (sim_step.get_instance_type != 'single') and \
+							   (sim_step._kernel._bundle_arguments(['.'], 1) is not None):
+								key = get_bundle_key(sim_step)
+								if key not in bundles:
+									bundle_keys.append(key)
+									bundles[key] = []
+								bundles[key].append((s_instance, sim_step))
+								continue
+
+							cud = create_simulation_cu(sim_step, iteration, s_instance)
+							working_directory = memo.prepare(cud, sim_step)
+							if working_directory is not None:
+								cached_dirs[s_instance] = saga.Url(working_directory).path
+							else:
+								s_units.append(cud)
+								s_unit_instances.append(([s_instance], False))
+
+							if sim_step.get_instance_type == 'single':
+								break
+
+						if pattern.bundle_simulations is True:
+							bundle_size = pattern._simulation_instances
 						else:
-							sim_step = pattern.simulation_stage(iteration=iteration, instance=s_instance)
-
-						sim_step._bind_to_resource(resource._resource_key)
-
-						# Resolve all placeholders
-						#if sim_step.link_input_data is not None:
-						#    for i in range(len(sim_step.link_input_data)):
-						#        sim_step.link_input_data[i] = resolve_placeholder_vars(working_dirs, s_instance, iteration, pattern._simulation_instances, pattern._analysis_instances, "simulation", sim_step.link_input_data[i])
-
-
-						cud = radical.pilot.ComputeUnitDescription()
-						cud.name = "sim ;{iteration} ;{instance}".format(iteration=iteration, instance=s_instance)
-
-						cud.pre_exec       = sim_step._cu_def_pre_exec
-						cud.executable     = sim_step._cu_def_executable
-						cud.arguments      = sim_step.arguments
-						cud.mpi            = sim_step.uses_mpi
-						cud.input_staging  = get_input_data(kernel=sim_step,instance=s_instance, iteration=iteration,ktype='simulation')
-						cud.output_staging = get_output_data(kernel=sim_step,instance=s_instance, iteration=iteration,ktype='simulation')
-					 
-						if sim_step.cores is not None:
-							cud.cores = sim_step.cores
-
-						if sim_step.exists_remote is not None:
-							cud.post_exec = create_filecheck_command(sim_step.exists_remote)
-
-						s_units.append(cud)
-
-						if sim_step.get_instance_type == 'single':
-							break
+							bundle_size = int(pattern.bundle_simulations)
+
+						for key in bundle_keys:
+							for b in range(0, len(bundles[key]), bundle_size):
+								group = bundles[key][b:b+bundle_size]
+								if len(group) == 1:
+									cud = create_simulation_cu(group[0][1], iteration, group[0][0])
+									s_unit_instances.append(([group[0][0]], False))
+								else:
+									cud = create_bundle_cu(group, iteration)
+									s_unit_instances.append(([instance for instance, k in group], True))
+								s_units.append(cud)
 						
-					self.get_logger().debug("Created simulation CU: {0}.".format(cud.as_dict()))
+						self.get_logger().debug("Created simulation CU: {0}.".format(cud.as_dict()))
 					
 
-					self.get_logger().info("Submitted tasks for simulation iteration {0}.".format(iteration))
-					self.get_logger().info("Waiting for {3} simulations in iteration {0}/ kernel {1}: {2} to complete.".format(iteration,kern_step+1,sim_step.name,pattern._simulation_instances))
+						self.get_logger().info("Submitted tasks for simulation iteration {0}.".format(iteration))
+						self.get_logger().info("Waiting for {3} simulations in iteration {0}/ kernel {1}: {2} to complete.".format(iteration,kern_step+1,sim_step.name,pattern._simulation_instances))
 
 
-					self._reporter.info("\nIteration {0}: Waiting for {2} simulation tasks: {1} to complete".format(iteration,sim_step.name, pattern._simulation_instances))
-					if profiling == 1:
-						probe_sim_wait = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['kernel_{0}'.format(kern_step)]['wait_time'] = probe_sim_wait
+						self._reporter.info("\nIteration {0}: Waiting for {2} simulation tasks: {1} to complete".format(iteration,sim_step.name, pattern._simulation_instances))
+						profiler.prof(pattern.name, 'simulation', 'submit', iteration=iteration, instance='kernel_{0}'.format(kern_step))
 
-					s_cus = resource._umgr.submit_units(s_units)
-					all_cus.extend(s_cus)
-					all_sim_cus.extend(s_cus)
+						s_cus = []
+						if s_units:
+							s_cus = failures.submit_units(s_units)
+							s_cus = failures.wait_units(s_cus)
+							memo.complete(s_cus)
+						all_cus.extend(s_cus)
+						all_sim_cus.extend(s_cus)
 
-					uids = [cu.uid for cu in s_cus]
-					resource._umgr.wait_units(uids)
+						profiler.prof(pattern.name, 'simulation', 'done', iteration=iteration, instance='kernel_{0}'.format(kern_step))
+						for cu in s_cus:
+							profiler.prof_states(pattern.name, 'simulation', cu, iteration=iteration)
 
-					if profiling == 1:
-						probe_sim_res = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['kernel_{0}'.format(kern_step)]['res_time'] = probe_sim_res
 
+						self.get_logger().info("Simulations in iteration {0}/ kernel {1}: {2} completed.".format(iteration,kern_step+1,sim_step.name))
 
-					self.get_logger().info("Simulations in iteration {0}/ kernel {1}: {2} completed.".format(iteration,kern_step+1,sim_step.name))
+						failed_units = ""
+						for unit in s_cus:
+							if unit.state != radical.pilot.DONE:
+								failed_units += " * Simulation task {0} failed with an error: {1}\n".format(unit.uid, unit.stderr)
 
-					failed_units = ""
-					for unit in s_cus:
-						if unit.state != radical.pilot.DONE:
-							failed_units += " * Simulation task {0} failed with an error: {1}\n".format(unit.uid, unit.stderr)
+						profiler.prof(pattern.name, 'simulation', 'stop', iteration=iteration, instance='kernel_{0}'.format(kern_step))
 
-					if profiling == 1:
-						probe_sim_done = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['kernel_{0}'.format(kern_step)]['stop_time'] = probe_sim_done
+						self._reporter.ok('>> done')
 
-					self._reporter.ok('>> done')
-
-				if profiling == 1:
-					probe_post_sim_start = datetime.datetime.now()
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['post'] = od()
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['post']['start_time'] = probe_post_sim_start
+					profiler.prof(pattern.name, 'simulation', 'post_start', iteration=iteration)
 
-				# TODO: ensure working_dir <-> instance mapping
-				i = 0
-				for cu in s_cus:
-					i += 1
-					self.working_dirs['iteration_{0}'.format(iteration)]['simulation_{0}'.format(i)] = saga.Url(cu.working_directory).path
+					# bundled instances run in subdirectories of their unit
+					for cu, (instances, bundled) in zip(s_cus, s_unit_instances):
+						for instance in instances:
+							path = saga.Url(cu.working_directory).path
+							if bundled:
+								path = '{0}/{1}'.format(path, BUNDLE_INSTANCE_DIR.format(instance))
+							self.working_dirs['iteration_{0}'.format(iteration)]['simulation_{0}'.format(instance)] = path
+					for instance, path in cached_dirs.items():
+						self.working_dirs['iteration_{0}'.format(iteration)]['simulation_{0}'.format(instance)] = path
 				
-				if profiling == 1:
-					probe_post_sim_end = datetime.datetime.now()
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['sim']['post']['stop_time'] = probe_post_sim_end
-					cu_dict['iter_{0}'.format(iteration)]['sim'] = all_sim_cus
+					profiler.prof(pattern.name, 'simulation', 'post_stop', iteration=iteration)
+
+					if journal is not None:
+						journal.append({'stage': sim_stage, 'iteration': 'iteration_{0}'.format(iteration),
+							'working_dirs': self.working_dirs['iteration_{0}'.format(iteration)]})
 
 				################################################################
 				# EXECUTE ANALYSIS STEPS
@@ -555,18 +676,13 @@ class Plugin(PluginBase):
 				#print num_ana_kerns
 
 				all_ana_cus = []
-				if profiling == 1:
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['ana'] = od()
-					cu_dict['iter_{0}'.format(iteration)]['ana']= list()
-
 				for kern_step in range(0,num_ana_kerns):
 
-					if profiling == 1:
-						probe_ana_start = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['kernel_{0}'.format(kern_step)]= od()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['kernel_{0}'.format(kern_step)]['start_time'] = probe_ana_start
+					profiler.prof(pattern.name, 'analysis', 'start', iteration=iteration, instance='kernel_{0}'.format(kern_step))
 
 					a_units = []
+					a_unit_instances = []
+					cached_dirs = {}
 					for a_instance in range(1, pattern._analysis_instances+1):
 
 						if isinstance(pattern.analysis_stage(iteration=iteration, instance=a_instance),list):
@@ -598,7 +714,15 @@ class Plugin(PluginBase):
 						if ana_step.exists_remote is not None:
 							cud.post_exec = create_filecheck_command(ana_step.exists_remote)
 
-						a_units.append(cud)
+						# the output of an adaptive analysis is needed, it is always executed
+						working_directory = None
+						if pattern.adaptive_simulation == False:
+							working_directory = memo.prepare(cud, ana_step)
+						if working_directory is not None:
+							cached_dirs[a_instance] = saga.Url(working_directory).path
+						else:
+							a_units.append(cud)
+							a_unit_instances.append(a_instance)
 
 						if ana_step.get_instance_type == 'single':
 							break
@@ -609,21 +733,20 @@ class Plugin(PluginBase):
 					self.get_logger().info("Waiting for {3} analysis tasks in iteration {0}/kernel {1}: {2} to complete.".format(iteration,kern_step+1,ana_step.name, pattern._analysis_instances))
 
 					self._reporter.info("\nIteration {0}: Waiting for analysis tasks: {1} to complete".format(iteration,ana_step.name))
-					if profiling == 1:
-						probe_ana_wait = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['kernel_{0}'.format(kern_step)]['wait_time'] = probe_ana_wait
+					profiler.prof(pattern.name, 'analysis', 'submit', iteration=iteration, instance='kernel_{0}'.format(kern_step))
 
 
-					a_cus = resource._umgr.submit_units(a_units)
+					a_cus = []
+					if a_units:
+						a_cus = failures.submit_units(a_units)
+						a_cus = failures.wait_units(a_cus)
+						memo.complete(a_cus)
 					all_cus.extend(a_cus)
 					all_ana_cus.extend(a_cus)
 
-					uids = [cu.uid for cu in a_cus]
-					resource._umgr.wait_units(uids)
-
-					if profiling == 1:
-						probe_ana_res = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['kernel_{0}'.format(kern_step)]['res_time'] = probe_ana_res
+					profiler.prof(pattern.name, 'analysis', 'done', iteration=iteration, instance='kernel_{0}'.format(kern_step))
+					for cu in a_cus:
+						profiler.prof_states(pattern.name, 'analysis', cu, iteration=iteration)
 						
 					self.get_logger().info("Analysis in iteration {0}/kernel {1}: {2} completed.".format(iteration,kern_step+1,ana_step.name))
 
@@ -632,204 +755,40 @@ class Plugin(PluginBase):
 						if unit.state != radical.pilot.DONE:
 							failed_units += " * Analysis task {0} failed with an error: {1}\n".format(unit.uid, unit.stderr)
 
-					if profiling == 1:
-						probe_ana_done = datetime.datetime.now()
-						enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['kernel_{0}'.format(kern_step)]['stop_time'] = probe_ana_done
+					profiler.prof(pattern.name, 'analysis', 'stop', iteration=iteration, instance='kernel_{0}'.format(kern_step))
 
 					self._reporter.ok('>> done')
 
-				if profiling == 1:
-					probe_post_ana_start = datetime.datetime.now()
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['post'] = od()
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['post']['start_time'] = probe_post_ana_start
+				profiler.prof(pattern.name, 'analysis', 'post_start', iteration=iteration)
 
 				if (pattern.adaptive_simulation == False):
 					pass
 				else:
 					pattern._simulation_instances = pattern.get_new_simulation_instances(a_cus[0].stdout)
 
-				i = 0
-				for cu in a_cus:
-					i += 1
-					self.working_dirs['iteration_{0}'.format(iteration)]['analysis_{0}'.format(i)] = saga.Url(cu.working_directory).path
+					# let the execution context follow the new core demand
+					if getattr(resource, '_resize_policy', None) is not None:
+						resource.resize(pattern._simulation_instances * (sim_cores or 1))
+
+				for cu, instance in zip(a_cus, a_unit_instances):
+					self.working_dirs['iteration_{0}'.format(iteration)]['analysis_{0}'.format(instance)] = saga.Url(cu.working_directory).path
+				for instance, path in cached_dirs.items():
+					self.working_dirs['iteration_{0}'.format(iteration)]['analysis_{0}'.format(instance)] = path
 
-				if profiling == 1:
-					probe_post_ana_end = datetime.datetime.now()
-					enmd_overhead_dict['iter_{0}'.format(iteration)]['ana']['post']['stop_time'] = probe_post_ana_end
-					cu_dict['iter_{0}'.format(iteration)]['ana'] = all_ana_cus
+				if journal is not None:
+					journal.append({'stage': ana_stage, 'iteration': 'iteration_{0}'.format(iteration),
+						'working_dirs': self.working_dirs['iteration_{0}'.format(iteration)],
+						'simulation_instances': pattern._simulation_instances})
+
+				if remaining is not None:
+					iteration_walltimes.append(remaining - resource.remaining_walltime)
+
+				profiler.prof(pattern.name, 'analysis', 'post_stop', iteration=iteration)
 
 			self._reporter.header('Pattern execution successfully finished')
 
 
-			# ONLY PROFILING SECTION BELOW
-			if profiling == 1:
-
-				#Pattern overhead logging
-				title = "iteration,step,kernel,probe,timestamp"
-				f1 = open('enmd_pat_overhead.csv','w')
-				f1.write(title + "\n\n")
-				iter = 'None'
-				step = 'pre_loop'
-				kern = 'None'
-				for key,val in enmd_overhead_dict['preloop'].items():
-					probe = key
-					timestamp = val
-					entry = '{0},{1},{2},{3},{4}\n'.format(iter,step,kern,probe,timestamp)
-					f1.write(entry)
-
-				iters = pattern.iterations
-
-				for i in range(1,iters+1):
-					iter = 'iter_{0}'.format(i)
-					for key1,val1 in enmd_overhead_dict[iter].items():
-						step = key1
-						for key2,val2 in val1.items():
-							kern = key2
-							for key3,val3 in val2.items():
-								probe = key3
-								timestamp = val3
-								entry = '{0},{1},{2},{3},{4}\n'.format(iter.split('_')[1],step,kern,probe,timestamp)
-								f1.write(entry)
-
-				f1.close()
-
-				#CU data logging
-				title = "uid, iter, step, Scheduling, StagingInput, AgentStagingInputPending, AgentStagingInput, AllocatingPending, Allocating, ExecutingPending, Executing, AgentStagingOutputPending, AgentStagingOutput, PendingOutputStaging, StagingOutput, Done"
-				f2 = open("execution_profile_{mysession}.csv".format(mysession=resource._session.uid),'w')
-				f2.write(title + "\n\n")
-				iter = 'None'
-				step = 'pre_loop'
-
-				if step in cu_dict:
-					cu = cu_dict['pre_loop']
-
-					st_data = {}
-					for st in cu.state_history:
-						st_dict = st.as_dict()
-						st_data["{0}".format( st_dict["state"] )] = {}
-						st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-					states = ['Scheduling,' 
-								'StagingInput', 'AgentStagingInputPending', 'AgentStagingInput',
-								'AllocatingPending', 'Allocating', 
-								'ExecutingPending', 'Executing', 
-								'AgentStagingOutputPending', 'AgentStagingOutput', 'PendingOutputStaging', 
-								'StagingOutput', 
-								'Done']
-												
-					for state in states:
-						if (state in st_data) is False:
-							st_data[state] = None
-
-					line = "{uid}, {iter}, {step}, {Scheduling}, {StagingInput}, {AgentStagingInputPending}, {AgentStagingInput}, {AllocatingPending}, {Allocating}, {ExecutingPending},{Executing}, {AgentStagingOutputPending}, {AgentStagingOutput}, {PendingOutputStaging}, {StagingOutput}, {Done}".format(
-							uid=cu.uid,
-							iter=0,
-							step='pre_loop',
-							Scheduling=(st_data['Scheduling']),
-									StagingInput=(st_data['StagingInput']),
-									AgentStagingInputPending=(st_data['AgentStagingInputPending']),
-									AgentStagingInput=(st_data['AgentStagingInput']),
-									AllocatingPending=(st_data['AllocatingPending']),
-									Allocating=(st_data['Allocating']),
-									ExecutingPending=(st_data['ExecutingPending']),
-									Executing=(st_data['Executing']),
-									AgentStagingOutputPending=(st_data['AgentStagingOutputPending']),
-									AgentStagingOutput=(st_data['AgentStagingOutput']),
-									PendingOutputStaging=(st_data['PendingOutputStaging']),
-									StagingOutput=(st_data['StagingOutput']),
-									Done=(st_data['Done']))
-					f2.write(line + '\n')
-				else:
-					print 'No pre_loop step in the pattern'
-
-				for i in range(1,iters+1):
-					iter = 'iter_{0}'.format(i)
-					for key,val in cu_dict[iter].items():
-						step = key
-						cus = val
-
-						if step == 'sim':
-							for cu in cus:
-								st_data = {}
-								for st in cu.state_history:
-									st_dict = st.as_dict()
-									st_data["{0}".format( st_dict["state"] )] = {}
-									st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-								states = ['Scheduling,' 
-												'StagingInput', 'AgentStagingInputPending', 'AgentStagingInput',
-												'AllocatingPending', 'Allocating', 
-												'ExecutingPending', 'Executing', 
-												'AgentStagingOutputPending', 'AgentStagingOutput', 'PendingOutputStaging', 
-												'StagingOutput', 
-												'Done']
-
-								for state in states:
-									if (state in st_data) is False:
-										st_data[state] = None
-
-								line = "{uid}, {iter}, {step}, {Scheduling}, {StagingInput}, {AgentStagingInputPending}, {AgentStagingInput}, {AllocatingPending}, {Allocating}, {ExecutingPending},{Executing}, {AgentStagingOutputPending}, {AgentStagingOutput}, {PendingOutputStaging}, {StagingOutput}, {Done}".format(
-									uid=cu.uid,
-									iter=iter.split('_')[1],
-									step=step,
-									Scheduling=(st_data['Scheduling']),
-									StagingInput=(st_data['StagingInput']),
-									AgentStagingInputPending=(st_data['AgentStagingInputPending']),
-									AgentStagingInput=(st_data['AgentStagingInput']),
-									AllocatingPending=(st_data['AllocatingPending']),
-									Allocating=(st_data['Allocating']),
-									ExecutingPending=(st_data['ExecutingPending']),
-									Executing=(st_data['Executing']),
-									AgentStagingOutputPending=(st_data['AgentStagingOutputPending']),
-									AgentStagingOutput=(st_data['AgentStagingOutput']),
-									PendingOutputStaging=(st_data['PendingOutputStaging']),
-									StagingOutput=(st_data['StagingOutput']),
-									Done=(st_data['Done']))
-
-								f2.write(line + '\n')
-
-						elif step == 'ana':
-							for cu in cus:
-								st_data = {}
-								for st in cu.state_history:
-									st_dict = st.as_dict()
-									st_data["{0}".format( st_dict["state"] )] = {}
-									st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-
-								states = ['Scheduling,' 
-												'StagingInput', 'AgentStagingInputPending', 'AgentStagingInput',
-												'AllocatingPending', 'Allocating', 
-												'ExecutingPending', 'Executing', 
-												'AgentStagingOutputPending', 'AgentStagingOutput', 'PendingOutputStaging', 
-												'StagingOutput', 
-												'Done']
-
-								for state in states:
-									if (state in st_data) is False:
-										st_data[state] = None
-
-								line = "{uid}, {iter}, {step}, {Scheduling}, {StagingInput}, {AgentStagingInputPending}, {AgentStagingInput}, {AllocatingPending}, {Allocating}, {ExecutingPending},{Executing}, {AgentStagingOutputPending}, {AgentStagingOutput}, {PendingOutputStaging}, {StagingOutput}, {Done}".format(
-									uid=cu.uid,
-									iter=iter.split('_')[1],
-									step=step,
-									Scheduling=(st_data['Scheduling']),
-									StagingInput=(st_data['StagingInput']),
-									AgentStagingInputPending=(st_data['AgentStagingInputPending']),
-									AgentStagingInput=(st_data['AgentStagingInput']),
-									AllocatingPending=(st_data['AllocatingPending']),
-									Allocating=(st_data['Allocating']),
-									ExecutingPending=(st_data['ExecutingPending']),
-									Executing=(st_data['Executing']),
-									AgentStagingOutputPending=(st_data['AgentStagingOutputPending']),
-									AgentStagingOutput=(st_data['AgentStagingOutput']),
-									PendingOutputStaging=(st_data['PendingOutputStaging']),
-									StagingOutput=(st_data['StagingOutput']),
-									Done=(st_data['Done']))
-
-								f2.write(line + '\n')
-
-				f2.close()
+			profiler.prof(pattern.name, None, 'stop')
 
 		except KeyboardInterrupt:
 
@@ -7,9 +7,20 @@ __author__    = "Ole Weider <ole.weidner@rutgers.edu>"
 __copyright__ = "Copyright 2014, http://radical.rutgers.edu"
 __license__   = "MIT"
 
+import copy
+import time
+
 from radical.ensemblemd.engine import Engine
+from radical.ensemblemd.exceptions import TypeError
+from radical.ensemblemd.exceptions import EnsemblemdError
 from radical.ensemblemd.exceptions import NotImplementedError
 from radical.ensemblemd.execution_pattern import ExecutionPattern
+from radical.ensemblemd.fair_share_policy import FairSharePolicy
+from radical.ensemblemd.local_unit_manager import LocalSession
+from radical.ensemblemd.profiler import Profiler
+from radical.ensemblemd.run_handle import RunHandle
+from radical.ensemblemd.shared_unit_manager import SharedUnitManager
+from radical.ensemblemd.walltime_policy import WalltimePolicy, RuntimeEstimates, active_since
 
 #-------------------------------------------------------------------------------
 #
@@ -21,6 +32,8 @@ class ExecutionContext(object):
 
          * :class:`radical.ensemblemd.SingleClusterEnvironment`
          * :class:`radical.ensemblemd.MultiClusterEnvironment`
+         * :class:`radical.ensemblemd.LocalEnvironment`
+         * :class:`radical.ensemblemd.EmulatedEnvironment`
     """
 
     #---------------------------------------------------------------------------
@@ -30,6 +43,36 @@ class ExecutionContext(object):
         """
         self._engine = Engine()
 
+        # the unit manager shared by run_async() runs, created by the first
+        self._runs = None
+        self.fair_share_policy = FairSharePolicy()
+
+        # task admission within the walltime, see remaining_walltime
+        self.walltime_policy = WalltimePolicy()
+        self._runtimes = RuntimeEstimates()
+        # unit state callback shared by the FailureHandlers of all runs
+        self._unit_state_dispatcher = None
+
+        # profile of the context and the plugins, see RADICAL_ENMD_PROFILING
+        self._profiler = Profiler()
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def remaining_walltime(self):
+        """Returns the seconds of walltime left, counted from the time the
+        first pilot became active, or None for contexts without walltime.
+        """
+        walltime = getattr(self, '_walltime', None)
+        if walltime is None:
+            return None
+
+        elapsed = 0.0
+        active = active_since(getattr(self, '_pilots', None))
+        if active is not None:
+            elapsed = time.time() - active
+        return walltime * 60.0 - elapsed
+
     #---------------------------------------------------------------------------
     #
     def get_name(self):
@@ -50,9 +93,102 @@ class ExecutionContext(object):
 
     #---------------------------------------------------------------------------
     #
-    def run(self, pattern, force_plugin=None):
+    def run(self, pattern, force_plugin=None, resume=None):
         """Creates a new ExecutionContext instance.
         """
         raise NotImplementedError(
           method_name="execute",
           class_name=type(self))
+
+    #---------------------------------------------------------------------------
+    #
+    def run_async(self, pattern, force_plugin=None, resume=None, weight=1.0):
+        """Starts a pattern on the allocated resources and returns at once.
+        Several patterns may run at the same time, the cores are divided
+        among them by the context's fair_share_policy in proportion to their
+        weight. The allocation is not resized while runs are in progress.
+
+        Example::
+
+            handles = [cluster.run_async(loop) for loop in loops]
+            for handle in handles:
+                handle.wait()
+
+        Arguments:
+        pattern - the pattern to run
+        force_plugin, resume - see run()
+        weight - the fair-share weight of the run
+
+        Returns:
+        handle - the RunHandle of the run
+        """
+        if getattr(self, '_allocate_called', False) is False:
+            raise EnsemblemdError(
+                msg="Resource(s) not allocated. Call allocate() first."
+            )
+
+        if not isinstance(pattern, ExecutionPattern):
+            raise TypeError(
+              expected_type=ExecutionPattern,
+              actual_type=type(pattern))
+
+        if weight <= 0:
+            raise EnsemblemdError(
+                msg="Fair-share weight must be positive, got {0}.".format(weight))
+
+        if self._runs is None:
+            self._runs = SharedUnitManager(self._umgr, self, self.fair_share_policy, self.get_logger())
+        run = self._runs.add(weight)
+
+        # the run gets its own unit manager, session uid (for its profiles)
+        # and error record, everything else is shared with this context
+        context = copy.copy(self)
+        context._runs = None
+        context._umgr = run
+        context._session = LocalSession("{0}.{1}".format(self._session.uid, run.uid))
+        context._resize_policy = None
+        context._exctype = context._excvalue = context._traceback = None
+
+        return RunHandle(context, pattern, run, force_plugin=force_plugin, resume=resume)
+
+    #---------------------------------------------------------------------------
+    #
+    def _write_profile(self):
+        """Writes the profile of the context and the patterns that ran on
+        it to enmd_profile_<session>.csv, if profiling is enabled.
+        """
+        if not self._profiler.enabled or self._session is None:
+            return
+
+        path = "enmd_profile_{0}.csv".format(self._session.uid)
+        self._profiler.write(path)
+        self.get_logger().info("Wrote {0} profile events to {1}.".format(
+            self._profiler.recorded - self._profiler.dropped, path))
+        if self._profiler.dropped:
+            self.get_logger().warning("{0} older profile events were overwritten, increase the profiler capacity.".format(
+                self._profiler.dropped))
+
+    #---------------------------------------------------------------------------
+    #
+    def _report_stop(self, pattern, error):
+        """Reports a run that was stopped by the walltime policy.
+        """
+        checkpoint = getattr(pattern, 'checkpoint_file', None)
+        if checkpoint is not None:
+            resume = "The completed stages are recorded in {0}, continue with run(pattern, resume=True).".format(checkpoint)
+        else:
+            resume = "Set the pattern's checkpoint_file to continue such runs later."
+
+        self.get_logger().warning("Stopped pattern execution: {0} {1}".format(error, resume))
+        self._reporter.warn("\nStopped pattern execution: {0}\n{1}".format(error, resume))
+
+    #---------------------------------------------------------------------------
+    #
+    def _check_sync_run(self):
+        """Raises if a blocking run() would share the unit manager with
+        run_async() runs in progress.
+        """
+        if self._runs is not None and self._runs.active:
+            raise EnsemblemdError(
+                msg="run() cannot be called while run_async() runs are in progress, wait for their handles first."
+            )
@@ -23,6 +23,14 @@ class ExecutionPattern(object):
          * ...`
     """
 
+    # radical.ensemblemd.FailurePolicy for the tasks of the pattern. The
+    # default (None) aborts the execution on the first failed task.
+    failure_policy = None
+
+    # radical.ensemblemd.StragglerPolicy for the tasks of the pattern. The
+    # default (None) never duplicates slow tasks.
+    straggler_policy = None
+
     #---------------------------------------------------------------------------
     #
     def __init__(self):
@@ -31,6 +39,21 @@ class ExecutionPattern(object):
         self._workload = None
         self._engine = Engine()
 
+    #---------------------------------------------------------------------------
+    #
+    def __getstate__(self):
+        """Returns the state pickled with the pattern, e.g. when it is sent
+        to a process pool. The engine holds loggers and loaded plugins and is
+        left out.
+        """
+        state = self.__dict__.copy()
+        state.pop('_engine', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._engine = Engine()
+
     #---------------------------------------------------------------------------
     #
     @property
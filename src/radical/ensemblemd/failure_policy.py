@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""Failure policy for the tasks of an execution pattern.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+#-------------------------------------------------------------------------------
+#
+class FailurePolicy(object):
+    """A failure policy decides how an execution plugin reacts to failed
+       tasks. A failed task is resubmitted up to `max_retries` times, waiting
+       `backoff` seconds before the first retry and `backoff_factor` times
+       longer before every further one (at most `max_backoff` seconds). A task
+       that still fails is given up. The run is aborted with an
+       EnsemblemdError as soon as the given up tasks exceed
+       `max_failure_fraction` of all tasks submitted so far.
+
+       The default policy does not retry and aborts on the first failure.
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, max_retries=0, backoff=0, backoff_factor=2.0,
+                 max_backoff=None, max_failure_fraction=0.0):
+        """Creates a new FailurePolicy instance.
+
+        Arguments:
+        max_retries - number of times a failed task is resubmitted
+        backoff - seconds to wait before the first retry
+        backoff_factor - multiplier of the wait time for every further retry
+        max_backoff - upper limit of the wait time in seconds
+        max_failure_fraction - fraction of given up tasks that aborts the run
+        """
+        if max_retries < 0 or backoff < 0:
+            raise EnsemblemdError(
+                msg="Retries and backoff of a failure policy must not be negative.")
+
+        if not 0.0 <= max_failure_fraction <= 1.0:
+            raise EnsemblemdError(
+                msg="Failure fraction must be between 0 and 1, got {0}.".format(max_failure_fraction))
+
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_failure_fraction = max_failure_fraction
+
+    #---------------------------------------------------------------------------
+    #
+    def retry(self, attempt):
+        """Returns True if the given retry of a task (1 for the first one)
+        is allowed.
+        """
+        return attempt <= self.max_retries
+
+    #---------------------------------------------------------------------------
+    #
+    def delay(self, attempt):
+        """Returns the seconds to wait before the given retry of a task.
+        """
+        delay = self.backoff * (self.backoff_factor ** (attempt - 1))
+        if self.max_backoff is not None:
+            delay = min(delay, self.max_backoff)
+        return delay
+
+    #---------------------------------------------------------------------------
+    #
+    def abort(self, failed, total):
+        """Returns True if failed given up tasks out of total submitted tasks
+        abort the run.
+        """
+        return failed > self.max_failure_fraction * total
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""Fair-share policy for patterns that run concurrently on one allocation.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+#-------------------------------------------------------------------------------
+#
+class FairSharePolicy(object):
+    """A fair-share policy divides the cores of an execution context among
+       the patterns started with run_async() on it.
+
+       Each run is entitled to a share of the capacity proportional to its
+       weight. If `work_conserving` is True, the share a run cannot use
+       because it has fewer tasks ready is divided among the other runs
+       (max-min fairness), otherwise the shares are fixed. The tasks of a
+       run beyond its share are held on the client until cores of the run
+       are released.
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, work_conserving=True):
+        """Creates a new FairSharePolicy instance.
+
+        Arguments:
+        work_conserving - give the cores a run does not demand to the others
+        """
+        self.work_conserving = work_conserving
+
+    #---------------------------------------------------------------------------
+    #
+    def shares(self, capacity, demands, weights):
+        """Returns the number of cores each run may use.
+
+        Arguments:
+        capacity - cores of all active or pending pilots
+        demands - dictionary run uid -> cores of the running and held tasks
+        weights - dictionary run uid -> weight of the run
+
+        Returns:
+        shares - dictionary run uid -> cores, possibly fractional
+        """
+        for uid, weight in weights.items():
+            if weight <= 0:
+                raise EnsemblemdError(
+                    msg="Fair-share weight of {0} must be positive, got {1}.".format(uid, weight))
+
+        shares = dict([(uid, 0.0) for uid in demands])
+
+        if not self.work_conserving:
+            total = float(sum(weights.values()))
+            for uid in shares:
+                shares[uid] = capacity * weights[uid] / total
+            return shares
+
+        # water-filling: runs that demand less than their share get their
+        # demand, the rest is divided again among the others
+        active = [uid for uid in demands if demands[uid] > 0]
+        left = float(capacity)
+        while active and left > 0:
+            per_weight = left / sum([weights[uid] for uid in active])
+            satisfied = [uid for uid in active if demands[uid] <= per_weight * weights[uid]]
+            if not satisfied:
+                for uid in active:
+                    shares[uid] = per_weight * weights[uid]
+                break
+            for uid in satisfied:
+                shares[uid] = float(demands[uid])
+                left -= demands[uid]
+                active.remove(uid)
+
+        return shares
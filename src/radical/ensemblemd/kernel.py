@@ -28,6 +28,7 @@ class Kernel(object):
         self._engine = Engine()
         self._kernel = self._engine.get_kernel_plugin(name)
         self._kernel._exists_remote = None
+        self._kernel._cache_output_data = None
 
         if args is not None:
             self.set_args(args)
@@ -91,6 +92,7 @@ class Kernel(object):
     @pre_exec.setter
     def pre_exec(self, commands):
         self._kernel._pre_exec = commands
+        self._kernel._user_pre_exec = commands
 
     #---------------------------------------------------------------------------
     #
@@ -441,6 +443,37 @@ class Kernel(object):
             files_list = [files_list]
 
         self._kernel._exists_remote = files_list
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def cache_output_data(self):
+        """Declares the kernel deterministic and lists the output files (in
+           the kernel's execution directory) that are kept in the pattern's
+           task cache. Later runs with the same executable, arguments,
+           environment and input file contents reuse the cached files
+           instead of executing the kernel again.
+
+           Example::
+
+                k = Kernel(name="md.tleap")
+                k.cache_output_data = ["penta.crd", "penta.top"]
+        """
+        return self._kernel._cache_output_data
+
+    @cache_output_data.setter
+    def cache_output_data(self, files_list):
+
+        if type(files_list) != list:
+            files_list = [files_list]
+
+        for f in files_list:
+            if type(f) != str:
+                raise TypeError(
+                    expected_type=str,
+                    actual_type=type(f))
+
+        self._kernel._cache_output_data = files_list
     
 
     #---------------------------------------------------------------------------
@@ -36,6 +36,9 @@ class KernelBase(object):
         self._raw_args = []
 
         self._pre_exec               = None
+        # pre_exec set by the user, kernels that bind their own pre_exec
+        # add it to that
+        self._user_pre_exec          = None
         self._post_exec              = None
         self._environment            = {}
 
@@ -169,3 +172,14 @@ class KernelBase(object):
         raise NotImplementedError(
           method_name="_get_kernel_description",
           class_name=type(self))
+
+    # --------------------------------------------------------------------------
+    #
+    def _bundle_arguments(self, directories, cores):
+        """(PRIVATE) Returns the arguments which run instances of the bound
+           kernel, one in each of the given directories, as a single job on
+           the given number of cores. The job is not launched with MPI, the
+           executable starts the MPI processes itself. Kernels which can not
+           run bundled return None.
+        """
+        return None
@@ -7,6 +7,7 @@ __author__    = "Vivek <vivek.balasubramanian@rutgers.edu>"
 __copyright__ = "Copyright 2014, http://radical.rutgers.edu"
 __license__   = "MIT"
 
+import os
 from copy import deepcopy
 
 from radical.ensemblemd.exceptions import ArgumentError
@@ -105,3 +106,13 @@ class Kernel(KernelBase):
         self._environment = cfg["environment"]
         self._uses_mpi    = cfg["uses_mpi"]
         self._pre_exec    = cfg["pre_exec"]
+
+    # --------------------------------------------------------------------------
+    #
+    def _bundle_arguments(self, directories, cores):
+        """(PRIVATE) Implements parent class method. The instances run as one
+           mdrun -multidir job, which needs an MPI build of gromacs (gmx_mpi)
+           on the resource; run.py is taken from the first directory.
+        """
+        arguments = [os.path.join(directories[0], self._arguments[0])]
+        return arguments + self._arguments[1:] + ['--np', str(cores), '--multidir'] + list(directories)
@@ -90,5 +90,8 @@ class Kernel(KernelBase):
         self._arguments   = self.get_raw_args()
         self._environment = cfg["environment"]
         self._uses_mpi    = cfg["uses_mpi"]
-        self._pre_exec    = cfg["pre_exec"] 
+
+        # keep commands set by the user, e.g. to render the input file. They
+        # are kept apart, so that binding again does not repeat cfg's.
+        self._pre_exec = cfg["pre_exec"] + (self._user_pre_exec or [])
 
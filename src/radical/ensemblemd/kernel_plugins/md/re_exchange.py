@@ -48,6 +48,11 @@ _KERNEL_INFO = {
                         "mandatory": False,
                         "description": "temp"
                         },
+                    "--swap_data=":
+                        {
+                        "mandatory": False,
+                        "description": "name of the per-cycle swap data file in the staging area"
+                        },
                     },
     "machine_configs": 
     {
@@ -119,6 +124,8 @@ class Kernel(KernelBase):
                           self.get_arg("--replica_cycle="),
                           self.get_arg("--replicas="),
                           self.get_arg("--replica_basename=")]
+            if self.get_arg("--swap_data=") is not None:
+                arguments.append(self.get_arg("--swap_data="))
             self._executable  = cfg["executable"]
             self._arguments   = arguments
             self._environment = cfg["environment"]
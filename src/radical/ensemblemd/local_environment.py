@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+"""An execution context that runs the tasks as processes on the local host.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import sys
+import shutil
+import datetime
+import traceback
+import multiprocessing
+import radical.pilot
+import radical.utils as ru
+
+from radical.ensemblemd import version
+from radical.ensemblemd.engine import Engine
+from radical.ensemblemd.exceptions import EnsemblemdError, TypeError
+from radical.ensemblemd.execution_pattern import ExecutionPattern
+from radical.ensemblemd.execution_context import ExecutionContext
+from radical.ensemblemd.local_unit_manager import LocalSession, LocalPilot, LocalUnitManager
+
+CONTEXT_NAME = "Local"
+
+
+#-------------------------------------------------------------------------------
+#
+class LocalEnvironment(ExecutionContext):
+    """A local environment runs the tasks of a pattern as processes on the
+       host the application runs on, without RADICAL-Pilot sessions, pilot
+       agents or a MongoDB database. It is meant for development, testing
+       and single-node runs, and can replace a SingleClusterEnvironment in
+       an application: the execution plugins and placeholders ($SHARED,
+       $PRE_LOOP, $PREV_SIMULATION_INSTANCE_Y, ...) work the same way.
+
+       Tasks run in subdirectories of a sandbox directory, by default a
+       directory named after the session in the current directory. Input
+       files and shared data are linked into the task directories instead
+       of being copied. Kernels are bound to the `resource` entry of their
+       machine_configs, local.localhost by default.
+
+       Example::
+
+            cluster = LocalEnvironment(cores=4)
+            cluster.allocate()
+            cluster.run(pattern)
+            cluster.deallocate()
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self,
+                 cores=None,
+                 sandbox=None,
+                 cleanup=False,
+                 resource="local.localhost"):
+        """Creates a new ExecutionContext instance.
+
+        Arguments:
+        cores - number of cores tasks may use at once, all cores of the
+        host by default
+        sandbox - directory the tasks run in
+        cleanup - remove the sandbox in deallocate()
+        resource - machine configuration the kernels are bound to
+        """
+        if cores is None:
+            cores = multiprocessing.cpu_count()
+
+        if cores < 1:
+            raise EnsemblemdError(msg="LocalEnvironment needs at least one core, got {0}.".format(cores))
+
+        self._allocate_called = False
+        self._umgr = None
+        self._session = None
+        self._pilot = None
+        self._pilots = []
+        self._pmgr = None
+        self._exctype = None
+        self._excvalue = None
+        self._traceback = None
+
+        self._resource_key = resource
+        self._cores = cores
+        self._sandbox = sandbox
+        self._cleanup = cleanup
+
+        # the local host cannot grow
+        self._resize_policy = None
+
+        #shared data
+        self._shared_data = None
+
+        # checkpoint to resume from in run()
+        self._resume = None
+
+        # seconds of plugin preparation done while the pilot was queued
+        self._hidden_time = 0.0
+
+        self._logger  = ru.get_logger('radical.entk.LocalEnvironment')
+        self._reporter = ru.LogReporter(name='radical.entk.LocalEnvironment')
+
+        super(LocalEnvironment, self).__init__()
+
+    # --------------------------------------------------------------------------
+    #
+    def get_logger(self):
+        return self._logger
+
+    #---------------------------------------------------------------------------
+    #
+    def get_name(self):
+        """Returns the name of the execution context.
+        """
+        return CONTEXT_NAME
+
+    @property
+    def name(self):
+        """Returns the name of the execution context.
+        """
+        return CONTEXT_NAME
+
+    @property
+    def shared_data(self):
+        return self._shared_data
+
+    @shared_data.setter
+    def shared_data(self,data):
+        self._shared_data = data
+
+    @property
+    def hidden_time(self):
+        """Returns 0, the local host does not queue.
+        """
+        return self._hidden_time
+
+    @property
+    def capacity(self):
+        """Returns the number of cores tasks may use.
+        """
+        return self._cores
+
+    #---------------------------------------------------------------------------
+    #
+    def allocate(self, wait=False):
+        """Creates the sandbox and stages the shared data to it. The local
+        host is available at once, wait is accepted for compatibility.
+        """
+        self._allocate_called = True
+
+        self._reporter.title('EnsembleMD (%s)' % version)
+        self._reporter.info('Starting Allocation on the local host')
+
+        uid = "enmd.local.{0}.{1}".format(
+            datetime.datetime.now().strftime("%Y%m%d.%H%M%S"), os.getpid())
+        self._session = LocalSession(uid)
+
+        if self._sandbox is None:
+            self._sandbox = os.path.join(os.getcwd(), uid)
+        self._sandbox = os.path.abspath(self._sandbox)
+
+        try:
+            self._pilot = LocalPilot("pilot.0000", self._resource_key, self._cores, self._sandbox)
+            self._pilots = [self._pilot]
+            self._umgr = LocalUnitManager(self._pilot, self.get_logger())
+            self.get_logger().info("Running {0} core(s) in {1}".format(self._cores, self._sandbox))
+
+            if self._shared_data is not None:
+                self.get_logger().info("Linking shared data to {0}".format(self._pilot.staging_area))
+                shared_list = []
+                for f in self._shared_data:
+                    if f.startswith('.'):
+                        f = os.getcwd() + f.split('.')[1] + '.' + f.split('.')[2]
+                    shared_list.append({
+                        'source': 'file://%s'%f,
+                        'target': 'staging:///%s' %os.path.basename(f),
+                        'action': radical.pilot.LINK
+                    })
+                self._pilot.stage_in(shared_list)
+
+            self._reporter.ok('>> ok')
+
+        except Exception, ex:
+            self.get_logger().exception("Fatal error during resource allocation: {0}.".format(str(ex)))
+            self._reporter.error('Allocation failed: {0}'.format(str(ex)))
+            raise
+
+    #---------------------------------------------------------------------------
+    #
+    def _wait_active(self):
+        """Returns the local pilot, which is always active.
+        """
+        return self._pilot
+
+    #---------------------------------------------------------------------------
+    #
+    def _bind_unit(self, cud, kernel):
+        """Binds the kernel of a unit to the local machine configuration and
+        sets the resource specific parts of the unit description.
+        """
+        kernel._bind_to_resource(self._resource_key)
+
+        cud.pre_exec   = kernel._cu_def_pre_exec
+        cud.executable = kernel._cu_def_executable
+        cud.arguments  = kernel.arguments
+        cud.mpi        = kernel.uses_mpi
+
+        return self._resource_key
+
+    #---------------------------------------------------------------------------
+    #
+    def deallocate(self):
+        """Cancels the remaining tasks and removes the sandbox if cleanup
+        was requested.
+        """
+        self._reporter.info('\nStarting Deallocation..\n')
+
+        if self._exctype != None:
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error: {0}.".format(str(self._excvalue)))
+            traceback.print_tb(self._traceback)
+
+        if self._umgr is not None:
+            self._umgr.close()
+
+        if self._cleanup and self._sandbox and os.path.isdir(self._sandbox):
+            shutil.rmtree(self._sandbox)
+
+        self._reporter.ok('>>done \n')
+
+        self._write_profile()
+
+    #---------------------------------------------------------------------------
+    #
+    def run(self, pattern, force_plugin=None, resume=None):
+        """Executes a pattern on the local host, like
+        SingleClusterEnvironment.run(). Names of static plugins given as
+        force_plugin select the matching local plugin.
+        """
+        if self._allocate_called is False:
+            raise EnsemblemdError(
+                msg="Resource(s) not allocated. Call allocate() first.")
+
+        self._check_sync_run()
+
+        if not isinstance(pattern, ExecutionPattern):
+            raise TypeError(
+              expected_type=ExecutionPattern,
+              actual_type=type(pattern))
+
+        if resume is True:
+            resume = getattr(pattern, 'checkpoint_file', None)
+        self._resume = resume
+
+        if force_plugin is not None:
+            force_plugin = force_plugin.replace('.static', '.local')
+
+        self._engine = Engine()
+        plugin = self._engine.get_execution_plugin_for_pattern(
+            pattern_name=pattern.name,
+            context_name=self.name,
+            plugin_name=force_plugin)
+
+        self._reporter.info('\nVerifying pattern')
+        plugin.verify_pattern(pattern, self)
+        self._reporter.ok('>>ok')
+        try:
+            self._reporter.info('\nStarting pattern execution')
+            plugin.execute_pattern(pattern, self)
+        except KeyboardInterrupt:
+            self._exctype,self._excvalue,self._traceback = sys.exc_info()
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+        except Exception, ex:
+            self._exctype,self._excvalue,self._traceback = sys.exc_info()
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error during execution: {0}.".format(str(self._excvalue)))
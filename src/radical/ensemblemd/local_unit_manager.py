@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+
+"""Execution of compute units as processes on the local host.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import time
+import shutil
+import signal
+import urlparse
+import threading
+import subprocess
+import radical.pilot
+
+FINAL_STATES = [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]
+
+# Name of the directory of a sandbox that staging:// URLs point to
+STAGING_AREA = "staging_area"
+
+# ------------------------------------------------------------------------------
+#
+def normalize_directive(directive):
+    """Returns a staging directive as a dictionary. Strings are
+    "source > target" or "source" transfers, like in RADICAL-Pilot.
+    """
+    if isinstance(directive, dict):
+        d = dict(directive)
+    elif '>' in directive:
+        source, target = directive.split('>', 1)
+        d = {'source': source.strip(), 'target': target.strip()}
+    else:
+        d = {'source': directive.strip()}
+
+    if not d.get('target'):
+        d['target'] = os.path.basename(urlparse.urlparse(d['source']).path.rstrip('/'))
+    d.setdefault('action', radical.pilot.TRANSFER)
+    return d
+
+
+# ------------------------------------------------------------------------------
+#
+def _stage(directive, source_dir, target_dir, staging_dir, link):
+    """Executes one staging directive on the local file system.
+
+    Arguments:
+    directive - staging directive as dictionary
+    source_dir - directory relative sources are resolved against
+    target_dir - directory relative targets are resolved against
+    staging_dir - directory staging:// URLs are resolved against
+    link - if True, transfers are done with symbolic links
+    """
+    def resolve(path, base):
+        if path.startswith('staging://'):
+            return os.path.join(staging_dir, urlparse.urlparse(path).path.lstrip('/'))
+        if '://' in path:
+            return urlparse.urlparse(path).path
+        return os.path.join(base, path)
+
+    source = resolve(directive['source'], source_dir)
+    target = resolve(directive['target'], target_dir)
+
+    if os.path.isdir(target) and not os.path.islink(target):
+        target = os.path.join(target, os.path.basename(source.rstrip('/')))
+
+    parent = os.path.dirname(target)
+    if parent and not os.path.isdir(parent):
+        os.makedirs(parent)
+
+    if os.path.islink(target) or os.path.isfile(target):
+        os.remove(target)
+
+    action = directive['action']
+    if action == radical.pilot.LINK or (action == radical.pilot.TRANSFER and link):
+        os.symlink(os.path.abspath(source), target)
+    elif os.path.isdir(source):
+        shutil.copytree(source, target, symlinks=True)
+    else:
+        shutil.copy(source, target)
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalState(object):
+    """An entry of the state history of a unit.
+    """
+
+    def __init__(self, state, timestamp):
+        self.state = state
+        self.timestamp = timestamp
+
+    def as_dict(self):
+        return {"state": self.state, "timestamp": self.timestamp}
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalSession(object):
+    """Stands in for the RADICAL-Pilot session of a local execution
+    context or of a run_async() run, the plugins only use its uid.
+    """
+
+    def __init__(self, uid):
+        self.uid = uid
+
+    def close(self, cleanup=False):
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalPilot(object):
+    """The local host, with the interface of a ComputePilot the execution
+    plugins use.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, uid, resource, cores, sandbox):
+        self.uid = uid
+        self.state = radical.pilot.ACTIVE
+        self.description = {'resource': resource, 'cores': cores}
+        self.sandbox = sandbox
+        self.staging_area = os.path.join(sandbox, STAGING_AREA)
+
+        if not os.path.isdir(self.staging_area):
+            os.makedirs(self.staging_area)
+
+    # --------------------------------------------------------------------------
+    #
+    def stage_in(self, directives):
+        """Stages files to the staging area, like ComputePilot.stage_in().
+        Relative sources are taken from the current directory.
+        """
+        if not isinstance(directives, list):
+            directives = [directives]
+
+        for d in directives:
+            _stage(normalize_directive(d), os.getcwd(), self.sandbox, self.staging_area, link=True)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait(self, state=None, timeout=None):
+        return self.state
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalUnit(object):
+    """A compute unit that runs as a process on the local host.
+    """
+
+    def __init__(self, uid, description, working_directory):
+        self.uid = uid
+        self.description = description
+        self.name = description.name
+        self.working_directory = working_directory
+        self.state = radical.pilot.NEW
+        self.state_history = []
+        self.stdout = None
+        self.stderr = None
+        self.exit_code = None
+        self.log = []
+        self.start_time = None
+        self.stop_time = None
+
+        # the state whose callbacks have returned, wait_units() uses it
+        self._reported = None
+        self._process = None
+        self._canceled = False
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalUnitManager(object):
+    """Provides the unit manager interface the execution plugins use, and
+    runs the units as processes on the local host. At most as many units
+    run at once as their cores fit into the cores of the pilot, the others
+    wait in submission order.
+
+    Every unit runs in its own directory of the pilot sandbox. Input files
+    are transferred and linked with symbolic links, so tasks must not
+    modify their uploaded input files in place; COPY directives and
+    downloaded outputs are real copies.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, pilot, logger):
+        """Creates a new LocalUnitManager.
+
+        Arguments:
+        pilot - the LocalPilot the units run on
+        logger - the execution context's logger
+        """
+        self._pilot = pilot
+        self._logger = logger
+        self._cond = threading.Condition(threading.RLock())
+
+        self._units = {}
+        self._queue = []
+        self._callbacks = []
+        self._used = 0
+        self._count = 0
+        self._closed = False
+
+    # --------------------------------------------------------------------------
+    #
+    def register_callback(self, callback):
+        """Registers a unit state callback, called as callback(unit, state).
+        """
+        self._callbacks.append(callback)
+
+    # --------------------------------------------------------------------------
+    #
+    def add_pilots(self, pilots):
+        pass
+
+    # --------------------------------------------------------------------------
+    #
+    def list_units(self):
+        with self._cond:
+            return self._units.keys()
+
+    # --------------------------------------------------------------------------
+    #
+    def get_units(self, uids=None):
+        with self._cond:
+            if uids is None:
+                return self._units.values()
+            if not isinstance(uids, list):
+                return self._units[uids]
+            return [self._units[uid] for uid in uids]
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_units(self, descriptions):
+        """Submits one or a list of unit descriptions, like
+        UnitManager.submit_units().
+        """
+        if not isinstance(descriptions, list):
+            return self.submit_units([descriptions])[0]
+
+        units = []
+        with self._cond:
+            for cud in descriptions:
+                uid = "unit.{0:06d}".format(self._count)
+                self._count += 1
+                unit = LocalUnit(uid, cud, os.path.join(self._pilot.sandbox, uid))
+                self._units[uid] = unit
+                units.append(unit)
+
+        for unit in units:
+            self._set_state(unit, radical.pilot.SCHEDULING)
+
+            if (unit.description.cores or 1) > self._pilot.description['cores']:
+                unit.stderr = "Unit needs {0} cores, the local host has {1}.".format(
+                    unit.description.cores, self._pilot.description['cores'])
+                unit.log.append(unit.stderr)
+                self._set_state(unit, radical.pilot.FAILED)
+                continue
+
+            with self._cond:
+                self._queue.append(unit)
+
+        self._schedule()
+        return units
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_units(self, uids=None, state=None, timeout=None):
+        """Waits until the units are in one of the given states, by default
+        a final state, like UnitManager.wait_units().
+
+        Returns:
+        states - the states of the units
+        """
+        if state is None:
+            state = FINAL_STATES
+        elif not isinstance(state, list):
+            state = [state]
+
+        single = uids is not None and not isinstance(uids, list)
+        if single:
+            uids = [uids]
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        with self._cond:
+            if uids is None:
+                uids = self._units.keys()
+            units = [self._units[uid] for uid in uids]
+
+            while True:
+                # units that ended otherwise do not reach the state anymore
+                if all([(u._reported in state) or (u._reported in FINAL_STATES) for u in units]):
+                    break
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    # without a timeout, Condition.wait() is not interruptible
+                    self._cond.wait(1.0)
+
+            states = [u.state for u in units]
+
+        if single:
+            return states[0]
+        return states
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_units(self, uids=None):
+        """Cancels waiting and running units.
+        """
+        if uids is None:
+            uids = self._units.keys()
+        elif not isinstance(uids, list):
+            uids = [uids]
+
+        for uid in uids:
+            with self._cond:
+                unit = self._units[uid]
+                if unit.state in FINAL_STATES:
+                    continue
+                unit._canceled = True
+                queued = unit in self._queue
+                if queued:
+                    self._queue.remove(unit)
+                elif unit._process is not None and unit._process.poll() is None:
+                    try:
+                        os.killpg(unit._process.pid, signal.SIGTERM)
+                    except OSError:
+                        pass
+
+            # running units are set CANCELED by their thread
+            if queued:
+                self._set_state(unit, radical.pilot.CANCELED)
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        """Cancels all units that are not final.
+        """
+        with self._cond:
+            self._closed = True
+        self.cancel_units()
+
+    # --------------------------------------------------------------------------
+    #
+    def _set_state(self, unit, state):
+        """Advances the state of a unit and calls the callbacks. The lock is
+        not held while the callbacks run, they may submit or wait for units.
+        """
+        with self._cond:
+            unit.state = state
+            unit.state_history.append(LocalState(state, time.time()))
+
+        for cb in self._callbacks:
+            try:
+                cb(unit, state)
+            except Exception, ex:
+                self._logger.exception("Unit state callback failed: {0}".format(ex))
+
+        with self._cond:
+            unit._reported = state
+            self._cond.notify_all()
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule(self):
+        """Starts the waiting units in submission order while their cores
+        fit into the free cores of the pilot.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            started = []
+            while self._queue:
+                cores = self._queue[0].description.cores or 1
+                if self._used + cores > self._pilot.description['cores']:
+                    break
+                unit = self._queue.pop(0)
+                self._used += cores
+                started.append(unit)
+
+        for unit in started:
+            thread = threading.Thread(target=self._run, args=(unit,))
+            thread.daemon = True
+            thread.start()
+
+    # --------------------------------------------------------------------------
+    #
+    def _run(self, unit):
+        """Stages, executes and stages out one unit.
+        """
+        cud = unit.description
+        try:
+            self._set_state(unit, radical.pilot.STAGING_INPUT)
+            os.makedirs(unit.working_directory)
+            for d in cud.input_staging or []:
+                _stage(normalize_directive(d), os.getcwd(), unit.working_directory,
+                       self._pilot.staging_area, link=True)
+
+            with self._cond:
+                if unit._canceled:
+                    raise _Canceled()
+                unit._process = self._launch(unit)
+
+            self._set_state(unit, radical.pilot.EXECUTING)
+            unit.start_time = time.time()
+            unit.exit_code = unit._process.wait()
+            unit.stop_time = time.time()
+
+            unit.stdout = self._read(unit, "STDOUT")
+            unit.stderr = self._read(unit, "STDERR")
+
+            if unit._canceled:
+                raise _Canceled()
+
+            if unit.exit_code != 0:
+                unit.log.append("Unit exited with code {0}.".format(unit.exit_code))
+                state = radical.pilot.FAILED
+            else:
+                self._set_state(unit, radical.pilot.STAGING_OUTPUT)
+                for d in cud.output_staging or []:
+                    d = normalize_directive(d)
+                    # downloaded files must outlive the sandbox
+                    _stage(d, unit.working_directory,
+                           os.getcwd() if d['action'] == radical.pilot.TRANSFER else self._pilot.sandbox,
+                           self._pilot.staging_area, link=False)
+                state = radical.pilot.DONE
+
+        except _Canceled:
+            state = radical.pilot.CANCELED
+
+        except Exception, ex:
+            self._logger.exception("Unit {0} failed: {1}".format(unit.uid, ex))
+            unit.log.append(str(ex))
+            if not unit.stderr:
+                unit.stderr = str(ex)
+            state = radical.pilot.FAILED
+
+        with self._cond:
+            self._used -= cud.cores or 1
+
+        self._set_state(unit, state)
+        self._schedule()
+
+    # --------------------------------------------------------------------------
+    #
+    def _launch(self, unit):
+        """Writes the launch script of a unit and starts it in its own
+        process group, so that canceling it also stops its children.
+        """
+        cud = unit.description
+        command = cud.executable
+        if cud.mpi and (cud.cores or 1) > 1:
+            command = "mpirun -np {0} {1}".format(cud.cores, command)
+
+        script = os.path.join(unit.working_directory, "unit.sh")
+        with open(script, 'w') as f:
+            f.write("#!/bin/bash\n\n")
+            for key, val in (getattr(cud, 'environment', None) or {}).items():
+                f.write("export {0}={1}\n".format(key, val))
+            for cmd in cud.pre_exec or []:
+                f.write("{0}\n".format(cmd))
+            f.write("{0} {1}\n".format(command, " ".join([str(a) for a in cud.arguments or []])))
+            f.write("RETVAL=$?\n")
+            for cmd in cud.post_exec or []:
+                f.write("{0}\n".format(cmd))
+            f.write("exit $RETVAL\n")
+
+        stdout = open(os.path.join(unit.working_directory, "STDOUT"), 'w')
+        stderr = open(os.path.join(unit.working_directory, "STDERR"), 'w')
+        try:
+            return subprocess.Popen(["/bin/bash", script],
+                                    cwd=unit.working_directory,
+                                    stdout=stdout, stderr=stderr,
+                                    preexec_fn=os.setsid)
+        finally:
+            stdout.close()
+            stderr.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def _read(self, unit, name):
+        path = os.path.join(unit.working_directory, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+
+# ------------------------------------------------------------------------------
+#
+class _Canceled(Exception):
+    pass
@@ -1,37 +1,374 @@
 #!/usr/bin/env python
 
-"""TODO: Docstring.
+"""A dynamic execution context that spans several resources.
 """
 
 __author__    = "Ole Weider <ole.weidner@rutgers.edu>"
 __copyright__ = "Copyright 2014, http://radical.rutgers.edu"
 __license__   = "MIT"
 
+import os
+import sys
+import time
+import traceback
+import radical.pilot
+import radical.utils as ru
+
+from collections import OrderedDict
+
+from radical.ensemblemd import version
 from radical.ensemblemd.engine import Engine
-from radical.ensemblemd.exceptions import TypeError
+from radical.ensemblemd.exceptions import EnsemblemdError, TypeError, WalltimeError
 from radical.ensemblemd.execution_pattern import ExecutionPattern
 from radical.ensemblemd.execution_context import ExecutionContext
+from radical.ensemblemd.unit_dispatcher import UnitDispatcher
 
 CONTEXT_NAME = "Dynamic"
 
+# Seconds between checks of the pilot states while waiting for a pilot
+PILOT_POLL_INTERVAL = 5
+
 
 #-------------------------------------------------------------------------------
 #
 class MultiClusterEnvironment(ExecutionContext):
-    """A multi-cluster environment provides a dynamically managed set of 
-       computational resources. 
+    """A multi-cluster environment provides a dynamically managed set of
+       computational resources. One pilot is allocated on every resource
+       and the tasks of a pattern are bound to the resources while the
+       pattern runs: a task goes to the resource holding the working
+       directories it links or copies from, otherwise to the resource that
+       is expected to finish it first, given its free cores and the task
+       runtimes measured there. Kernels are bound per task, so every
+       resource needs an entry in the machine_configs of the kernels used.
+
+       Example::
+
+            cluster = MultiClusterEnvironment(
+                resources=[
+                    {"resource": "xsede.stampede", "cores": 256, "walltime": 60,
+                     "project": "TG-MCB090174"},
+                    {"resource": "xsede.comet", "cores": 96, "walltime": 60,
+                     "queue": "compute"}],
+                database_url=os.environ["RADICAL_PILOT_DBURL"])
     """
 
     #---------------------------------------------------------------------------
     #
-    def __init__(self):
+    def __init__(self,
+                 resources,
+                 cleanup=False,
+                 database_url=None,
+                 database_name=None):
         """Creates a new ExecutionContext instance.
+
+        Arguments:
+        resources - list of dictionaries describing the pilot of every
+        resource: resource, cores and walltime, and optionally queue,
+        project, access_schema and username
         """
+        if not resources:
+            raise EnsemblemdError(msg="MultiClusterEnvironment needs at least one resource.")
+
+        for r in resources:
+            for key in ["resource", "cores", "walltime"]:
+                if key not in r:
+                    raise EnsemblemdError(
+                        msg="Resource description {0} lacks '{1}'.".format(r, key))
+
+        self._allocate_called = False
+        self._umgr = None
+        self._umgrs = OrderedDict()
+        self._session = None
+        self._pilot = None
+        self._pilots = []
+        self._pmgr = None
+        self._exctype = None
+        self._excvalue = None
+        self._traceback = None
+
+        self._resources = resources
+        self._resource_key = ", ".join([r["resource"] for r in resources])
+        self._cores = sum([r["cores"] for r in resources])
+        self._walltime = max([r["walltime"] for r in resources])
+        self._cleanup = cleanup
+        self._database_url = database_url
+        self._database_name = database_name
+
+        # not supported across resources
+        self._resize_policy = None
+
+        #shared data
+        self._shared_data = None
+
+        # checkpoint to resume from in run()
+        self._resume = None
+
+        # seconds of plugin preparation done while the pilots were queued
+        self._hidden_time = 0.0
+
+        self._logger  = ru.get_logger('radical.entk.MultiClusterEnvironment')
+        self._reporter = ru.LogReporter(name='radical.entk.MultiClusterEnvironment')
+
         super(MultiClusterEnvironment, self).__init__()
 
+    # --------------------------------------------------------------------------
+    #
+    def get_logger(self):
+        return self._logger
+
     #---------------------------------------------------------------------------
     #
     def get_name(self):
         """Returns the name of the execution context.
         """
-        return CONTEXT_NAME
\ No newline at end of file
+        return CONTEXT_NAME
+
+    @property
+    def name(self):
+        """Returns the name of the execution context.
+        """
+        return CONTEXT_NAME
+
+    @property
+    def shared_data(self):
+        return self._shared_data
+
+    @shared_data.setter
+    def shared_data(self,data):
+        self._shared_data = data
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def capacity(self):
+        """Returns the number of cores of all pilots that are not in a
+        final state.
+        """
+        final = [radical.pilot.DONE, radical.pilot.CANCELED, radical.pilot.FAILED]
+        return sum([p.description['cores'] for p in self._pilots if p.state not in final])
+
+    @property
+    def hidden_time(self):
+        """Returns the seconds the plugins spent preparing and pre-staging
+        tasks while the pilots waited in the queue.
+        """
+        return self._hidden_time
+
+    @property
+    def throughput(self):
+        """Returns the tasks completed per hour on every resource.
+        """
+        if self._umgr is None:
+            return {}
+        return self._umgr.throughput
+
+    #---------------------------------------------------------------------------
+    #
+    def allocate(self, wait=False):
+        """Allocates a pilot on every resource.
+
+        Arguments:
+        wait - wait until all pilots are active
+        """
+        #-----------------------------------------------------------------------
+        #
+        def pilot_state_cb (pilot, state) :
+            self.get_logger().info("Pilot {0} on {1} state has changed to {2}".format(
+                pilot.uid, pilot.description['resource'], state))
+
+            # units of a failed pilot fail as well and are handled by the
+            # failure policy of the pattern, new units go to other resources
+            if state == radical.pilot.FAILED:
+                self.get_logger().error("Resource error: pilot {0} FAILED.".format(pilot.uid))
+                self._reporter.error("Pilot {0} on {1} failed.".format(pilot.uid, pilot.description['resource']))
+
+        self._allocate_called = True
+
+        self._reporter.title('EnsembleMD (%s)' % version)
+        self._reporter.info('Starting Allocation on {0} resource(s)'.format(len(self._resources)))
+
+        if not self._database_url:
+            self._database_url = os.getenv ("RADICAL_PILOT_DBURL", None)
+
+        if  not self._database_url :
+            raise EnsemblemdError(msg="no database URL (set RADICAL_PILOT_DBURL)")
+
+        if self._database_name is None:
+            self._session = radical.pilot.Session(database_url=self._database_url)
+        else:
+            db_url = self._database_url + '/' + self._database_name
+            self._session = radical.pilot.Session(database_url=db_url)
+
+        try:
+
+            for username in set([r.get("username") for r in self._resources]):
+                if username is not None:
+                    c = radical.pilot.Context('ssh')
+                    c.user_id = username
+                    self._session.add_context(c)
+
+            self._pmgr = radical.pilot.PilotManager(session=self._session)
+            self._pmgr.register_callback(pilot_state_cb)
+
+            pilots = OrderedDict()
+            for r in self._resources:
+                pilot = self._submit_pilot(r)
+                pilots.setdefault(r["resource"], []).append(pilot)
+
+                if r["resource"] not in self._umgrs:
+                    self._umgrs[r["resource"]] = radical.pilot.UnitManager(
+                        session=self._session,
+                        scheduler=radical.pilot.SCHED_DIRECT_SUBMISSION)
+                self._umgrs[r["resource"]].add_pilots(pilot)
+
+            self._pilot = self._pilots[0]
+            self._umgr = UnitDispatcher(self._umgrs, pilots, self.get_logger())
+
+            if wait is True:
+                self._pmgr.wait_pilots([p.uid for p in self._pilots], radical.pilot.ACTIVE)
+
+            self._reporter.ok('>> ok')
+
+        except Exception, ex:
+            self.get_logger().exception("Fatal error during resource allocation: {0}.".format(str(ex)))
+            self._reporter.error('Allocation failed: {0}'.format(str(ex)))
+            if self._session:
+                self._session.close()
+            raise
+
+    #---------------------------------------------------------------------------
+    #
+    def _submit_pilot(self, r):
+        """Submits the pilot of a resource and stages the shared data to it.
+        """
+        pdesc = radical.pilot.ComputePilotDescription()
+        pdesc.resource = r["resource"]
+        pdesc.runtime  = r["walltime"]
+        pdesc.cores    = r["cores"]
+        pdesc.cleanup  = self._cleanup
+
+        if r.get("queue") is not None:
+            pdesc.queue = r["queue"]
+
+        if r.get("project") is not None:
+            pdesc.project = r["project"]
+
+        if r.get("access_schema") is not None:
+            pdesc.access_schema = r["access_schema"]
+
+        pilot = self._pmgr.submit_pilots(pdesc)
+        self._pilots.append(pilot)
+        self.get_logger().info("Launched {0}-core pilot on {1}.".format(r["cores"], r["resource"]))
+
+        if self._shared_data is not None:
+            self.get_logger().info("Commencing transfer of shared data to {0}".format(r["resource"]))
+            shared_list = []
+            for f in self._shared_data:
+                if f.startswith('.'):
+                    f = os.getcwd() + f.split('.')[1] + '.' + f.split('.')[2]
+                shared_list.append({
+                    'source': 'file://%s'%f,
+                    'target': 'staging:///%s' %os.path.basename(f),
+                    'action': radical.pilot.TRANSFER
+                })
+
+            pilot.stage_in(shared_list)
+
+        return pilot
+
+    #---------------------------------------------------------------------------
+    #
+    def _wait_active(self):
+        """Waits until the first pilot on any resource is active and returns
+        it.
+        """
+        final = [radical.pilot.DONE, radical.pilot.CANCELED, radical.pilot.FAILED]
+        while True:
+            for pilot in self._pilots:
+                if pilot.state == radical.pilot.ACTIVE:
+                    return pilot
+
+            if not [p for p in self._pilots if p.state not in final]:
+                raise EnsemblemdError(
+                    msg="No pilot on {0} became active.".format(self._resource_key))
+
+            time.sleep(PILOT_POLL_INTERVAL)
+
+    #---------------------------------------------------------------------------
+    #
+    def _bind_unit(self, cud, kernel):
+        """Selects the resource of a unit and binds its kernel to it.
+        """
+        return self._umgr.bind(cud, kernel)
+
+    #---------------------------------------------------------------------------
+    #
+    def deallocate(self):
+        """Deallocates the resources.
+        """
+        self._reporter.info('\nStarting Deallocation..\n')
+        self.get_logger().info("Deallocating {0}".format(self._resource_key))
+
+        if self._exctype != None:
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error: {0}.".format(str(self._excvalue)))
+            traceback.print_tb(self._traceback)
+
+        for key, throughput in self.throughput.items():
+            self.get_logger().info("Throughput on {0}: {1:.1f} tasks/hour".format(key, throughput))
+        self.get_logger().info("Preparation hidden in the queue wait: {0:.1f}s".format(self._hidden_time))
+
+        # the pilot states are read while the session is open
+        for pilot in self._pilots:
+            self._profiler.prof_states(None, 'pilot', pilot)
+
+        self._session.close(cleanup=self._cleanup)
+        self._reporter.ok('>>done \n')
+
+        self._write_profile()
+
+    #---------------------------------------------------------------------------
+    #
+    def run(self, pattern, force_plugin=None, resume=None):
+        """Executes a pattern on the allocated resources. Patterns with an
+        execution plugin for the Dynamic context (Pipeline, BagofTasks) can
+        be run. resume works like in SingleClusterEnvironment.run().
+        """
+        if self._allocate_called is False:
+            raise EnsemblemdError(
+                msg="Resource(s) not allocated. Call allocate() first.")
+
+        self._check_sync_run()
+
+        if not isinstance(pattern, ExecutionPattern):
+            raise TypeError(
+              expected_type=ExecutionPattern,
+              actual_type=type(pattern))
+
+        if resume is True:
+            resume = getattr(pattern, 'checkpoint_file', None)
+        self._resume = resume
+
+        self._engine = Engine()
+        plugin = self._engine.get_execution_plugin_for_pattern(
+            pattern_name=pattern.name,
+            context_name=self.name,
+            plugin_name=force_plugin)
+
+        self._reporter.info('\nVerifying pattern')
+        plugin.verify_pattern(pattern, self)
+        self._reporter.ok('>>ok')
+        try:
+            self._reporter.info('\nStarting pattern execution')
+            plugin.execute_pattern(pattern, self)
+        except WalltimeError, ex:
+            # not an error, the run continues in a later allocation
+            self._report_stop(pattern, ex)
+        except KeyboardInterrupt:
+            self._exctype,self._excvalue,self._traceback = sys.exc_info()
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+        except Exception, ex:
+            self._exctype,self._excvalue,self._traceback = sys.exc_info()
+            self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
+            self._reporter.error("Fatal error during execution: {0}.".format(str(self._excvalue)))
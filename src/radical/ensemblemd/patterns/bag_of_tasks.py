@@ -29,6 +29,10 @@ class BagofTasks(ExecutionPattern):
 
 	"""
 
+	# Journal of completed stages, run(resume=True) skips the recorded
+	# stages. None disables journaling.
+	checkpoint_file = None
+
 	#---------------------------------------------------------------------------
 	#
 	def __init__(self, stages=1,instances=1):
@@ -17,6 +17,13 @@ PATTERN_NAME = "Pipeline"
 #
 class Pipeline(ExecutionPattern):
 
+	# Journal of completed tasks, run(resume=True) continues every pipe
+	# after its last recorded stage. None disables journaling.
+	checkpoint_file = None
+
+	# radical.ensemblemd.TaskCache for kernels that set cache_output_data
+	task_cache = None
+
 	#---------------------------------------------------------------------------
 	#
 	def __init__(self, stages=1,tasks=1):
@@ -7,11 +7,256 @@ __author__    = "Antons Treikalis <antons.treikalis@rutgers.edu>"
 __copyright__ = "Copyright 2014, http://radical.rutgers.edu"
 __license__   = "MIT"
 
+import os
+import re
+import copy
+import pipes
+import numpy as np
+import multiprocessing
+import multiprocessing.pool
+
+from radical.ensemblemd.exceptions import EnsemblemdError
 from radical.ensemblemd.exceptions import NotImplementedError
 from radical.ensemblemd.execution_pattern import ExecutionPattern
 
 PATTERN_NAME = "ReplicaExchange"
 
+BULK_EXCHANGE_METHODS = ["independence", "metropolis", "neighbours"]
+
+# Per-cycle binary swap data file in the pilot staging area. Row j holds the
+# swap matrix column of replica j as little-endian float64 values.
+SWAP_DATA_FILE = "swap_data_{cycle}.dat"
+SWAP_DATA_DTYPE = "<f8"
+
+# Per-cycle energy table in the pilot staging area, written by MD tasks when
+# they finish. Replica j owns the fixed-width record at offset
+# j * struct.calcsize(ENERGY_RECORD_FORMAT): (replica, cycle, temperature,
+# potential energy).
+ENERGY_TABLE_FILE = "energies_{cycle}.dat"
+ENERGY_RECORD_FORMAT = "<iidd"
+
+PREPARATION_POOLS = ["thread", "process"]
+
+# Tokens in input templates have the form @name@, as in the NAMD and Amber
+# examples. Rendering on the target resource reads the template from the
+# staging area, relative to the compute unit's working directory.
+TEMPLATE_TOKEN = "@{0}@"
+TEMPLATE_TOKEN_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+TEMPLATE_STAGING_AREA = "../staging_area"
+
+#-------------------------------------------------------------------------------
+#
+def exchange_row_log_probabilities(swap_matrix, states, columns, a):
+    """Computes the logarithm of the acceptance probability of the exchanges
+    of the replica at position a with every replica, which costs O(N).
+
+    Arguments:
+    swap_matrix - numpy array of dimension-less energies, where each column
+    is a replica and each row is a state
+    states - state (row) currently occupied by each replica
+    columns - column of each replica in swap_matrix
+    a - position of the replica
+
+    Returns:
+    log_p - 1D numpy array, one value per replica
+    """
+    states = np.asarray(states)
+    columns = np.asarray(columns)
+    return -(swap_matrix[states[a], columns] + swap_matrix[states, columns[a]] - \
+             swap_matrix[states[a], columns[a]] - swap_matrix[states, columns])
+
+#-------------------------------------------------------------------------------
+#
+class WeightedSampler(object):
+    """Draws indices from a discrete distribution given by (unnormalized)
+    weights. Cumulative sums are computed once, every draw is a binary search,
+    so a sampler built at the beginning of a cycle can be reused by all
+    replicas.
+    """
+    def __init__(self, weights):
+        """Constructor.
+
+        Arguments:
+        weights - non-negative weights, at least one of them non-zero
+        """
+        self._cdf = np.cumsum(np.asarray(weights, dtype=np.float64))
+        self._total = self._cdf[-1]
+        if not self._total > 0.0:
+            raise EnsemblemdError(
+                msg="Weights of a WeightedSampler must not all be zero.")
+
+    def sample(self, rng=np.random, size=None):
+        """Returns one index (or an array of size indices) drawn with
+        probability proportional to its weight. Indices are always in range.
+
+        Arguments:
+        rng - source of random numbers
+        size - number of indices to draw, None for a single index
+        """
+        u = rng.random_sample(size) * self._total
+        idx = np.searchsorted(self._cdf, u, side="right")
+        return np.minimum(idx, len(self._cdf) - 1)
+
+#-------------------------------------------------------------------------------
+#
+def pair_log_probabilities(swap_matrix, states, columns, a, b):
+    """Computes the logarithm of the acceptance probability for the given
+    replica pairs only, which costs O(len(a)) instead of O(N^2).
+
+    Arguments:
+    swap_matrix - matrix of dimension-less energies, where each column is a
+    replica and each row is a state
+    states - state (row) currently occupied by each replica
+    columns - column of each replica in swap_matrix
+    a, b - positions of the first and the second replica of each pair
+
+    Returns:
+    log_p - 1D numpy array, one value per pair
+    """
+    u = np.asarray(swap_matrix, dtype=np.float64)
+    states = np.asarray(states)
+    columns = np.asarray(columns)
+    s_a, s_b = states[a], states[b]
+    c_a, c_b = columns[a], columns[b]
+    return -(u[s_a, c_b] + u[s_b, c_a] - u[s_a, c_a] - u[s_b, c_b])
+
+#-------------------------------------------------------------------------------
+#
+def metropolis_accept(log_p, rng=np.random):
+    """Accepts or rejects all proposed exchanges at once with the Metropolis
+    criterion.
+
+    Arguments:
+    log_p - logarithm of the acceptance probability of each proposed pair
+    rng - source of random numbers
+
+    Returns:
+    accepted - 1D boolean numpy array
+    """
+    log_p = np.asarray(log_p, dtype=np.float64)
+    return np.log(rng.random_sample(len(log_p))) < log_p
+
+#-------------------------------------------------------------------------------
+#
+def random_pairs(n, rng=np.random):
+    """Splits n replicas into disjoint random pairs. With an odd n one
+    replica is left out.
+
+    Returns:
+    a, b - positions of the first and the second replica of each pair
+    """
+    order = rng.permutation(n)
+    return order[0:n - n % 2:2], order[1:n - n % 2:2]
+
+#-------------------------------------------------------------------------------
+#
+def neighbour_pairs(states, dimensions, dimension=0, parity=0):
+    """Pairs replicas occupying neighbouring states along one dimension of a
+    state grid. States k and k+1 are paired for every k with k % 2 == parity,
+    so alternating the parity between cycles lets every neighbour pair
+    exchange. Other dimensions are left untouched, i.e. replicas are only
+    paired within the group that shares all other coordinates.
+
+    Arguments:
+    states - flat (C-order) index of the grid state occupied by each replica
+    dimensions - shape of the state grid, e.g. [temperatures, umbrellas]
+    dimension - axis of the grid along which replicas are paired
+    parity - 0 for even, 1 for odd pairs
+
+    Returns:
+    a, b - positions of the first and the second replica of each pair
+    """
+    states = np.asarray(states, dtype=np.int64)
+    n_states = int(np.prod(dimensions))
+    if (len(states) and (states.min() < 0 or states.max() >= n_states)) or \
+       len(np.unique(states)) != len(states):
+        raise EnsemblemdError(
+            msg="Replica states must be distinct indices in [0, {0}).".format(n_states))
+
+    occupant = np.empty(n_states, dtype=np.int64)
+    occupant.fill(-1)
+    occupant[states] = np.arange(len(states))
+
+    grid = occupant.reshape(dimensions).swapaxes(dimension, -1)
+    length = grid.shape[-1]
+    a = grid[..., parity:length - 1:2].ravel()
+    b = grid[..., parity + 1:length:2].ravel()
+
+    # states nobody occupies can not take part in an exchange
+    occupied = (a >= 0) & (b >= 0)
+    return a[occupied], b[occupied]
+
+#-------------------------------------------------------------------------------
+#
+def render_template(text, parameters):
+    """Replaces the @name@ tokens of a template with parameter values.
+
+    Arguments:
+    text - template text
+    parameters - dictionary mapping token names to values
+    """
+    for name in sorted(parameters):
+        text = text.replace(TEMPLATE_TOKEN.format(name), str(parameters[name]))
+    return text
+
+#-------------------------------------------------------------------------------
+#
+def template_render_command(template, input_file, parameters):
+    """Returns a shell command which does the same as render_template() with
+    sed, so an input file can be rendered in the pre_exec of a compute unit.
+    Only the parameters are part of the command, the template has to be
+    present on the target resource.
+
+    Arguments:
+    template - path of the template on the target resource
+    input_file - path of the rendered input file
+    parameters - dictionary mapping token names to values
+    """
+    expressions = []
+    for name in sorted(parameters):
+        value = str(parameters[name])
+        if not TEMPLATE_TOKEN_NAME.match(name):
+            raise EnsemblemdError(
+                msg="Invalid template token name '{0}'.".format(name))
+        if "\n" in value:
+            raise EnsemblemdError(
+                msg="Value of template token '{0}' contains a newline."\
+                    .format(name))
+        value = value.replace("\\", "\\\\").replace("&", "\\&")\
+                     .replace("|", "\\|")
+        expressions.append("-e {0}".format(pipes.quote(
+            "s|{0}|{1}|g".format(TEMPLATE_TOKEN.format(name), value))))
+
+    # sed would take the template for its script
+    if not expressions:
+        return "cp {0} {1}".format(pipes.quote(template), pipes.quote(input_file))
+
+    return "sed {0} {1} > {2}".format(" ".join(expressions),
+                                      pipes.quote(template),
+                                      pipes.quote(input_file))
+
+#-------------------------------------------------------------------------------
+#
+def _prepare_replica(args):
+    """Thread pool worker: builds the input file of a replica and prepares it
+    for the MD step.
+    """
+    pattern, replica, build_input = args
+    if build_input:
+        pattern.build_input_file(replica)
+    return replica, pattern.prepare_replica_for_md(replica)
+
+#-------------------------------------------------------------------------------
+#
+def _build_replica_input(args):
+    """Process pool worker: builds the input file of a replica. Returns the
+    modified copy of the replica, since changes made in the worker process are
+    not visible to the caller.
+    """
+    pattern, index, replica = args
+    pattern.build_input_file(replica)
+    return index, replica
+
 class Replica(object):
     """Class representing replica and it's associated data.
 
@@ -26,6 +271,127 @@ class Replica(object):
         """
         self.id = int(my_id)
 
+#-------------------------------------------------------------------------------
+#
+_VIEW_CLASSES = {}
+
+def _column_property(name):
+    """Returns a property reading and writing the registry column name at the
+    index of a replica.
+    """
+    def fget(self):
+        return self._registry._columns[name][self._index]
+    def fset(self, value):
+        self._registry._columns[name][self._index] = value
+    return property(fget, fset)
+
+def _view_class(cls, fields):
+    """Returns the subclass of a replica class whose fields are stored in a
+    ReplicaRegistry. Classes are created once per replica class and fields.
+    """
+    cls = getattr(cls, "_replica_class", cls)
+    key = (cls, tuple(sorted(fields)))
+    if key not in _VIEW_CLASSES:
+        attributes = dict((name, _column_property(name)) for name in fields)
+        attributes["_replica_class"] = cls
+        attributes["_replica_fields"] = key[1]
+        attributes["__reduce__"] = _reduce_view
+        _VIEW_CLASSES[key] = type(cls.__name__, (cls,), attributes)
+    return _VIEW_CLASSES[key]
+
+def _reduce_view(self):
+    """Pickles a replica view as a detached object of the original replica
+    class, holding copies of its field values.
+    """
+    state = dict(self.__dict__)
+    del state["_registry"]
+    del state["_index"]
+    for name in self._replica_fields:
+        state[name] = self._registry._columns[name][self._index].item()
+    return (_detached_replica, (self._replica_class, state))
+
+def _detached_replica(cls, state):
+    """Unpickles a replica view, see _reduce_view().
+    """
+    replica = cls.__new__(cls)
+    replica.__dict__.update(state)
+    return replica
+
+#-------------------------------------------------------------------------------
+#
+class ReplicaRegistry(object):
+    """Array-backed store of per-replica scalar fields. Every field is a
+    contiguous numpy column with one value per replica, and the registered
+    replica objects become views: reading or writing a field attribute of a
+    replica accesses its element of the column. Attributes that are not
+    fields are kept in the replica objects as before.
+    """
+    def __init__(self, replicas, fields):
+        """Constructor. Moves the current field values of the replicas into
+        the columns; fields a replica does not have are set to 0.
+
+        Arguments:
+        replicas - list of Replica objects
+        fields - dictionary mapping attribute names to numpy dtypes
+        """
+        self._replicas = replicas
+        self._columns = {}
+        for name, dtype in fields.items():
+            self._columns[name] = np.zeros(len(replicas), dtype=dtype)
+
+        for index, r in enumerate(replicas):
+            values = {}
+            for name in fields:
+                if hasattr(r, name):
+                    values[name] = getattr(r, name)
+                r.__dict__.pop(name, None)
+
+            r.__class__ = _view_class(type(r), fields)
+            r._registry = self
+            r._index = index
+            for name, value in values.items():
+                self._columns[name][index] = value
+
+    def __len__(self):
+        return len(self._replicas)
+
+    @property
+    def replicas(self):
+        """Returns the list of registered replica objects.
+        """
+        return self._replicas
+
+    @property
+    def fields(self):
+        """Returns the names of the fields.
+        """
+        return self._columns.keys()
+
+    def column(self, name):
+        """Returns the numpy array holding field name of all replicas. Changes
+        to the array are visible through the replica objects.
+
+        Arguments:
+        name - field name
+        """
+        if name not in self._columns:
+            raise EnsemblemdError(
+                msg="Replica registry has no field '{0}'.".format(name))
+        return self._columns[name]
+
+    def swap(self, names, a, b):
+        """Exchanges the values of fields between replicas a[k] and b[k] for
+        all k.
+
+        Arguments:
+        names - list of field names
+        a - array of replica indices
+        b - array of replica indices of the same length
+        """
+        for name in names:
+            column = self.column(name)
+            column[a], column[b] = column[b], column[a]
+
 
 # ------------------------------------------------------------------------------
 #
@@ -35,11 +401,69 @@ class ReplicaExchange(ExecutionPattern):
             .. image:: ../../images/replica_exchange_pattern.*
                :width: 300pt
     """
+    # Setting bulk_exchange to one of BULK_EXCHANGE_METHODS makes the
+    # execution plugins select all exchange partners of a cycle with numpy
+    # instead of calling exchange() once per replica.
+    bulk_exchange = None
+
+    # Seed of the random number generator used for exchange selection. Runs
+    # with the same seed select the same exchange partners.
+    random_seed = None
+
+    # Shape of the state grid for the "neighbours" method, e.g. [16, 8] for
+    # 16 temperatures times 8 umbrella windows. None means a single ladder
+    # with one state per replica.
+    exchange_dimensions = None
+
+    # If True, exchange tasks write their swap matrix columns into a single
+    # binary file per cycle in the staging area (see swap_data_file()) and
+    # the execution plugins transfer back and read only that file instead of
+    # calling build_swap_matrix().
+    aggregate_swap_data = False
+
+    # Checkpoint written by the execution plugins after every exchange step,
+    # e.g. "replica_exchange.chk". Pass it as resume argument to run() to
+    # continue an interrupted run with the cycle after the last complete one.
+    # Use a separate file for every run. None disables checkpointing.
+    checkpoint_file = None
+
+    # Number of workers used by prepare_replicas() to build input files and
+    # prepare replicas for the MD step. None prepares replicas one after the
+    # other. preparation_pool is one of PREPARATION_POOLS; "process" requires
+    # the pattern attributes (except the engine) and the replicas to be
+    # picklable.
+    preparation_workers = None
+    preparation_pool = "thread"
+
+    # Local path of an input file template. The execution plugins stage it
+    # once into the pilot staging area; template_input_command() renders the
+    # input file of a replica from it on the target resource, so only the
+    # replica parameters have to be sent every cycle.
+    input_template = None
+
+    # If set, the execution plugins run the MD step of bundle_size replicas
+    # as one NAMD multi-copy (+replicas) unit instead of one unit per
+    # replica. The MD kernel must be md.namd with the replica's config file
+    # as its only argument.
+    bundle_size = None
+
+    # Dictionary mapping replica attribute names to numpy dtypes, e.g.
+    # {"sid": np.int64, "new_temperature": np.float64}. If set, add_replicas()
+    # moves these attributes into a ReplicaRegistry (see registry), and the
+    # bulk exchange methods read states from its columns. Fields listed in
+    # swap_fields are then exchanged with one array operation per field
+    # instead of calling perform_swap() for every pair.
+    replica_fields = None
+    swap_fields = None
+
     def __init__(self):
         """Constructor.
         """
         super(ReplicaExchange, self).__init__()
         self._replica_objects = None
+        self._rng = None
+        self._exchange_step = 0
+        self._registry = None
 
     #---------------------------------------------------------------------------
     #
@@ -49,6 +473,29 @@ class ReplicaExchange(ExecutionPattern):
         """
         return PATTERN_NAME
 
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def rng(self):
+        """Returns the random number generator (a numpy RandomState) used for
+        exchange selection, seeded with random_seed on first use.
+        """
+        if self._rng is None:
+            self._rng = np.random.RandomState(self.random_seed)
+        return self._rng
+
+    #---------------------------------------------------------------------------
+    #
+    def weighted_choice(self, weights):
+        """Returns an index drawn with probability proportional to its weight.
+        To draw repeatedly from the same weights, build a WeightedSampler once
+        and call its sample() method instead.
+
+        Arguments:
+        weights - list of non-negative weights
+        """
+        return int(WeightedSampler(weights).sample(self.rng))
+
     #---------------------------------------------------------------------------
     #
     def initialize_replicas(self):
@@ -66,6 +513,17 @@ class ReplicaExchange(ExecutionPattern):
         replicas - list of replica objects
         """
         self.replica_objects = replicas
+        if self.replica_fields:
+            self._registry = ReplicaRegistry(replicas, self.replica_fields)
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def registry(self):
+        """Returns the ReplicaRegistry of the replicas, or None if
+        replica_fields is not set.
+        """
+        return self._registry
 
     #---------------------------------------------------------------------------
     #
@@ -93,6 +551,55 @@ class ReplicaExchange(ExecutionPattern):
         raise NotImplementedError(method_name="compose_swap_matrix", \
                                   class_name=type(self))
 
+    #---------------------------------------------------------------------------
+    #
+    def swap_data_file(self, cycle):
+        """Returns the name of the swap data file of a given cycle. Exchange
+        tasks write to this file in the staging area if aggregate_swap_data
+        is set. Cycles are counted from 0, the same way as in the
+        matrix_column_{cycle}_{replica}.dat files.
+
+        Arguments:
+        cycle - cycle number
+        """
+        return SWAP_DATA_FILE.format(cycle=cycle)
+
+    #---------------------------------------------------------------------------
+    #
+    def energy_table_file(self, cycle):
+        """Returns the name of the energy table of a given cycle. MD tasks
+        add a record for their replica to this file in the staging area, so
+        exchange tasks can read the energies of all replicas at once.
+
+        Arguments:
+        cycle - cycle number
+        """
+        return ENERGY_TABLE_FILE.format(cycle=cycle)
+
+    #---------------------------------------------------------------------------
+    #
+    def load_swap_data(self, cycle, replicas):
+        """Reads the swap data file of a given cycle with a single read.
+
+        Arguments:
+        cycle - cycle number
+        replicas - list of Replica objects
+
+        Returns:
+        swap_matrix - 2D numpy array of dimension-less energies, where each
+        column is a replica and each row is a state
+        """
+        name = self.swap_data_file(cycle)
+        size = len(replicas)
+
+        data = np.fromfile(name, dtype=SWAP_DATA_DTYPE)
+        if data.size != size * size:
+            raise EnsemblemdError(
+                msg="Swap data file {0} holds {1} values, expected {2}."\
+                    .format(name, data.size, size * size))
+
+        return data.reshape(size, size).T
+
     #---------------------------------------------------------------------------
     #
     def perform_swap(self, replica_i, replica_j):
@@ -136,6 +643,96 @@ class ReplicaExchange(ExecutionPattern):
         raise NotImplementedError(method_name="prepare_replica_for_md", \
                                   class_name=type(self))
 
+    #---------------------------------------------------------------------------
+    #
+    def template_input_command(self, input_file, parameters):
+        """Returns a pre_exec command which renders an input file from
+        input_template in the staging area.
+
+        Arguments:
+        input_file - name of the input file in the compute unit's working
+        directory
+        parameters - dictionary mapping template token names to the values
+        of a given replica
+        """
+        if self.input_template is None:
+            raise EnsemblemdError(
+                msg="input_template must be set to render input files.")
+
+        template = "{0}/{1}".format(TEMPLATE_STAGING_AREA,
+                                    os.path.basename(self.input_template))
+        return template_render_command(template, input_file, parameters)
+
+    #---------------------------------------------------------------------------
+    #
+    def prepare_replicas(self, replicas, build_input=True):
+        """Builds the input files of replicas and prepares them for the MD
+        step, using preparation_workers threads or processes. Replicas are
+        yielded as soon as they are ready, so the execution plugins can
+        submit their MD tasks while other replicas are still being prepared.
+
+        With a process pool only build_input_file() runs in the workers. The
+        modified replica attributes are copied back to the replica objects
+        and prepare_replica_for_md() runs in the calling process, since the
+        kernels it returns are bound to a resource there.
+
+        Arguments:
+        replicas - list of Replica objects
+        build_input - if True, build_input_file() is called before
+        prepare_replica_for_md()
+
+        Returns:
+        generator of (replica, kernel) tuples in order of completion
+        """
+        workers = self.preparation_workers
+
+        if self.preparation_pool not in PREPARATION_POOLS:
+            raise EnsemblemdError(
+                msg="Unknown preparation_pool '{0}'. Must be one of {1}."\
+                    .format(self.preparation_pool, PREPARATION_POOLS))
+
+        if not workers or len(replicas) < 2:
+            for r in replicas:
+                if build_input:
+                    self.build_input_file(r)
+                yield r, self.prepare_replica_for_md(r)
+            return
+
+        if self.preparation_pool == "thread":
+            pool = multiprocessing.pool.ThreadPool(workers)
+            tasks = [(self, r, build_input) for r in replicas]
+            worker = _prepare_replica
+        else:
+            if not build_input:
+                for r in replicas:
+                    yield r, self.prepare_replica_for_md(r)
+                return
+            # the workers get a copy of the pattern without its replicas, so
+            # every task only sends its own replica
+            shared = copy.copy(self)
+            shared.replica_objects = None
+            shared._registry = None
+            pool = multiprocessing.Pool(workers)
+            tasks = [(shared, i, r) for i, r in enumerate(replicas)]
+            worker = _build_replica_input
+
+        try:
+            for result in pool.imap_unordered(worker, tasks):
+                if self.preparation_pool == "thread":
+                    yield result
+                else:
+                    index, built = result
+                    r = replicas[index]
+                    for name, value in built.__dict__.items():
+                        setattr(r, name, value)
+                    yield r, self.prepare_replica_for_md(r)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
     # --------------------------------------------------------------------------
     #
     def prepare_replica_for_exchange(self, replica):
@@ -168,3 +765,124 @@ class ReplicaExchange(ExecutionPattern):
         """
         raise NotImplementedError(method_name="exchange", class_name=type(self))
 
+    #---------------------------------------------------------------------------
+    #
+    def exchange_replicas(self, replicas, swap_matrix):
+        """Performs the exchange step of a cycle: selects exchange partners and
+        calls perform_swap() for every selected pair.
+
+        If bulk_exchange is not set, exchange() is called for every replica.
+        Otherwise partners are selected with array operations on swap_matrix,
+        using the sid attribute of the replicas as their current state
+        (replica id if there is no sid):
+
+        * "independence" - the replicas draw a partner from all replicas one
+          after the other, like the exchange() loop: every draw sees the
+          states left by the previous swaps, and a replica can take part in
+          several exchanges. Because of this, every draw evaluates one row of
+          acceptance probabilities, which costs O(N) per replica and O(N^2)
+          per cycle
+        * "metropolis" - random disjoint pairs, Metropolis acceptance
+        * "neighbours" - pairs of neighbouring states along one dimension of
+          exchange_dimensions, alternating even and odd pairs; with several
+          dimensions, consecutive steps go through the dimensions in turn.
+          Here sid is the flat index of the occupied grid state and the sid
+          values of exchanged replicas are swapped before perform_swap() is
+          called.
+
+        Arguments:
+        replicas - list of Replica objects
+        swap_matrix - matrix of dimension-less energies, where each column is a 
+        replica and each row is a state
+
+        Returns:
+        pairs - list of (r_i, r_j) tuples of exchanged replicas
+        """
+        pairs = []
+
+        if self.bulk_exchange is None:
+            for r_i in replicas:
+                r_j = self.exchange(r_i, replicas, swap_matrix)
+                if (r_j != r_i):
+                    self.perform_swap(r_i, r_j)
+                    pairs.append((r_i, r_j))
+            return pairs
+
+        if self.bulk_exchange not in BULK_EXCHANGE_METHODS:
+            raise EnsemblemdError(
+                msg="Unknown bulk_exchange method '{0}'. Valid methods are {1}."\
+                    .format(self.bulk_exchange, BULK_EXCHANGE_METHODS))
+
+        registry = self._registry
+        if (registry is not None) and (registry.replicas is not replicas):
+            registry = None
+
+        if (registry is not None) and ("sid" in registry.fields):
+            states = registry.column("sid").copy()
+        else:
+            states = np.array([getattr(r, "sid", r.id) for r in replicas])
+        if (registry is not None) and ("id" in registry.fields):
+            columns = registry.column("id")
+        else:
+            columns = np.array([r.id for r in replicas])
+
+        step = self._exchange_step
+        self._exchange_step += 1
+
+        if self.bulk_exchange == "independence":
+            u = np.asarray(swap_matrix, dtype=np.float64)
+            n = len(replicas)
+            draws = self.rng.random_sample(n)
+            for i in range(n):
+                log_p = exchange_row_log_probabilities(u, states, columns, i)
+                # shifting by the maximum keeps exp() from overflowing; the
+                # row always holds log_p[i] = 0, so the total is positive
+                cdf = np.cumsum(np.exp(log_p - log_p.max()))
+                j = int(np.searchsorted(cdf, draws[i] * cdf[-1], side="right"))
+                j = min(j, n - 1)
+                if j == i:
+                    continue
+                pairs += self._swap_replicas(replicas, registry,
+                                             np.array([i]), np.array([j]))
+                # perform_swap() may exchange the states as well
+                states[i] = getattr(replicas[i], "sid", replicas[i].id)
+                states[j] = getattr(replicas[j], "sid", replicas[j].id)
+            return pairs
+
+        if self.bulk_exchange == "metropolis":
+            a, b = random_pairs(len(replicas), self.rng)
+        else:
+            dimensions = self.exchange_dimensions or [len(replicas)]
+            dimension = step % len(dimensions)
+            parity = (step // len(dimensions)) % 2
+            a, b = neighbour_pairs(states, dimensions, dimension, parity)
+
+        log_p = pair_log_probabilities(swap_matrix, states, columns, a, b)
+        accepted = metropolis_accept(log_p, self.rng)
+        a, b = a[accepted], b[accepted]
+
+        if self.bulk_exchange == "neighbours":
+            if (registry is not None) and ("sid" in registry.fields):
+                sid = registry.column("sid")
+                sid[a], sid[b] = states[b], states[a]
+            else:
+                for i, j in zip(a, b):
+                    replicas[i].sid = int(states[j])
+                    replicas[j].sid = int(states[i])
+
+        return self._swap_replicas(replicas, registry, a, b)
+
+    #---------------------------------------------------------------------------
+    #
+    def _swap_replicas(self, replicas, registry, a, b):
+        """Swaps replicas a[k] and b[k] for all k, either with one array
+        operation per swap_fields entry or by calling perform_swap().
+        """
+        pairs = [(replicas[i], replicas[j]) for i, j in zip(a, b)]
+
+        if (registry is not None) and self.swap_fields:
+            registry.swap(self.swap_fields, a, b)
+        else:
+            for r_i, r_j in pairs:
+                self.perform_swap(r_i, r_j)
+        return pairs
@@ -7,11 +7,40 @@ __author__    = "Ole Weider <ole.weidner@rutgers.edu>"
 __copyright__ = "Copyright 2014, http://radical.rutgers.edu"
 __license__   = "MIT"
 
+import ast
+import imp
+import importlib
+import subprocess
+
+from radical.ensemblemd.exceptions import EnsemblemdError
 from radical.ensemblemd.exceptions import NotImplementedError
 from radical.ensemblemd.execution_pattern import ExecutionPattern
 
 PATTERN_NAME = "SimulationAnalysisLoop"
 
+# Name of the function an extraction module or script provides to be called
+# in-process with the analysis output.
+EXTRACTION_FUNCTION = "extract"
+
+
+# ------------------------------------------------------------------------------
+#
+def _defines_function(path, name):
+    """Returns True if the script at path defines a function name at its top
+    level. The script is parsed, not run.
+    """
+    try:
+        f = open(path)
+        try:
+            tree = ast.parse(f.read(), path)
+        finally:
+            f.close()
+    except (IOError, SyntaxError):
+        # left to the subprocess, which reports the error
+        return False
+    return any(isinstance(node, ast.FunctionDef) and node.name == name
+               for node in tree.body)
+
 
 # ------------------------------------------------------------------------------
 #
@@ -46,11 +75,24 @@ class SimulationAnalysisLoop(ExecutionPattern):
                 # Alternatively: k.copy_input_data to copy the data instead of just linking it
                 k.arguments = ["--inputfile1=output.dat"]
                 return kg
+
+        **Resuming a run**:
+
+        If ``checkpoint_file`` is set, every completed stage is recorded with
+        the working directories of its tasks in that journal file. Passing
+        ``resume=True`` to ``run()`` skips the recorded stages and continues
+        with the first incomplete one.
     """
 
+    # Journal of completed stages, None disables journaling
+    checkpoint_file = None
+
+    # radical.ensemblemd.TaskCache for kernels that set cache_output_data
+    task_cache = None
+
     #---------------------------------------------------------------------------
     #
-    def __init__(self, iterations, simulation_instances=1, analysis_instances=1, adaptive_simulation=False, sim_extraction_script=None):
+    def __init__(self, iterations, simulation_instances=1, analysis_instances=1, adaptive_simulation=False, sim_extraction_script=None, bundle_simulations=False, sim_extraction_function=None):
         """Creates a new SimulationAnalysisLoop.
 
         **Arguments:**
@@ -68,12 +110,38 @@ class SimulationAnalysisLoop(ExecutionPattern):
               The analysis_instances parameter determines the number of independent
               analysis instances launched for each ` analysis_stage`.
 
+            * **bundle_simulations** [`bool` or `int`]
+              If set, simulation instances whose kernels have the same
+              configuration are run as one job (e.g. `mdrun -multidir` for
+              md.gromacs), each instance in its own subdirectory. An integer
+              limits the number of instances per job. Placeholders such as
+              ``$PREV_SIMULATION_INSTANCE_Y`` resolve to the subdirectory of
+              instance Y. Kernels that do not support bundling run as before.
+
+            * **sim_extraction_function** [`callable` or `str`]
+              For adaptive simulations, a function which receives the stdout
+              of the first analysis unit as a string and returns the number
+              of simulation instances of the next iteration. A string names
+              an importable module, optionally followed by ``:function``;
+              the module is imported once and its ``extract`` function is
+              used. If not set and the sim_extraction_script defines an
+              ``extract`` function at its top level, the script is imported
+              once and that function is called in-process. Such a script
+              must keep any other top-level code, e.g. reading its standard
+              input, under ``if __name__ == "__main__":``. Scripts without
+              an ``extract`` function are not imported but run as a
+              separate process with the output on their standard input.
+
         """
         self._iterations = iterations
         self._simulation_instances = simulation_instances
         self._analysis_instances = analysis_instances
         self._adaptive_simulation = adaptive_simulation
         self._sim_extraction_script = sim_extraction_script
+        self._bundle_simulations = bundle_simulations
+        self._sim_extraction_function = sim_extraction_function
+        self._extraction_function = None
+        self._extraction_loaded = False
 
         super(SimulationAnalysisLoop, self).__init__()
 
@@ -225,6 +293,15 @@ class SimulationAnalysisLoop(ExecutionPattern):
         self._adaptive_simulation = value
 
 
+    @property
+    def bundle_simulations(self):
+        return self._bundle_simulations
+
+    @bundle_simulations.setter
+    def bundle_simulations(self,value):
+        self._bundle_simulations = value
+
+
     @property
     def sim_extraction_script(self):
         return self._sim_extraction_script
@@ -232,19 +309,70 @@ class SimulationAnalysisLoop(ExecutionPattern):
     @sim_extraction_script.setter
     def sim_extraction_script(self,script):
         self._sim_extraction_script = script
+        self._extraction_function = None
+        self._extraction_loaded = False
 
-    def get_new_simulation_instances(self,cu_output):
+    @property
+    def sim_extraction_function(self):
+        return self._sim_extraction_function
+
+    @sim_extraction_function.setter
+    def sim_extraction_function(self,function):
+        self._sim_extraction_function = function
+        self._extraction_function = None
+        self._extraction_loaded = False
+
+    def _load_extraction_function(self):
+        """Returns the in-process extraction function, or None if only the
+        extraction script can be run. Modules are loaded once.
+        """
+        if self._extraction_loaded:
+            return self._extraction_function
+
+        source = self._sim_extraction_function
+        if callable(source):
+            self._extraction_function = source
+
+        elif source is not None:
+            module_name, _, function_name = source.partition(':')
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError, ex:
+                raise EnsemblemdError(
+                    msg="Unable to import extraction module {0}: {1}".format(module_name, str(ex)))
+            function_name = function_name or EXTRACTION_FUNCTION
+            if not callable(getattr(module, function_name, None)):
+                raise EnsemblemdError(
+                    msg="Extraction module {0} has no function {1}.".format(module_name, function_name))
+            self._extraction_function = getattr(module, function_name)
+
+        elif (self._sim_extraction_script is not None) and \
+             _defines_function(self._sim_extraction_script, EXTRACTION_FUNCTION):
+            # importing runs the top level of the script, see the
+            # sim_extraction_function documentation
+            module_name = "_enmd_extraction_{0}".format(id(self))
+            module = imp.load_source(module_name, self._sim_extraction_script)
+            self._extraction_function = getattr(module, EXTRACTION_FUNCTION, None)
+
+        self._extraction_loaded = True
+        return self._extraction_function
 
-        if self._sim_extraction_script == None:
+    def get_new_simulation_instances(self,cu_output):
+        """Returns the number of simulation instances of the next iteration
+        for the output of the analysis step.
+        """
+        if self._sim_extraction_function is None and self._sim_extraction_script is None:
             return int(cu_output)
 
-        else:
-            f1=open('temp1.dat','w')
-            f1.write(cu_output)
-            f1.close()
-            import os
-            import subprocess as sp
-            p = sp.Popen('python {0} < temp1.dat'.format(self._sim_extraction_script),stdout=sp.PIPE,stderr=sp.PIPE,shell=True)
-            out,err = p.communicate()
-            os.remove('temp1.dat')
-            return int(out)
+        extract = self._load_extraction_function()
+        if extract is not None:
+            return int(extract(cu_output))
+
+        # fallback: the output is piped into the script, no temporary file
+        p = subprocess.Popen(['python', self._sim_extraction_script],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out,err = p.communicate(cu_output)
+        if p.returncode != 0:
+            raise EnsemblemdError(
+                msg="Extraction script {0} failed: {1}".format(self._sim_extraction_script, err))
+        return int(out)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""Low-overhead instrumentation of execution contexts and plugins.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import time
+import datetime
+import threading
+
+# Fields of every profile event, in the order of the profile columns
+FIELDS = ["pattern", "stage", "iteration", "instance", "probe", "timestamp"]
+
+# Number of events kept, older events are overwritten once it is reached
+DEFAULT_CAPACITY = 1 << 16
+
+# ------------------------------------------------------------------------------
+#
+def _monotonic_clock():
+    """Returns a function that reads a monotonic clock in seconds: the one of
+    Python 3, clock_gettime() on Linux, or time.time() as a last resort.
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1', use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+
+        def monotonic():
+            t = timespec()
+            clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t))
+            return t.tv_sec + t.tv_nsec * 1e-9
+
+        monotonic()
+        return monotonic
+
+    except (ImportError, OSError, AttributeError):
+        return time.time
+
+monotonic = _monotonic_clock()
+
+
+# ------------------------------------------------------------------------------
+#
+def epoch_seconds(timestamp):
+    """Returns a state history timestamp, a datetime in UTC or seconds, as
+    seconds since the epoch.
+    """
+    if isinstance(timestamp, datetime.datetime):
+        return (timestamp - datetime.datetime(1970, 1, 1)).total_seconds()
+    return float(timestamp)
+
+
+# ------------------------------------------------------------------------------
+#
+def _skip(*args, **kwargs):
+    pass
+
+
+# ------------------------------------------------------------------------------
+#
+class Profiler(object):
+    """Collects the profile events of an execution context and the plugins
+    that run on it. Every event has the same fields, see FIELDS: the name
+    of the pattern (None for the execution context itself), the stage, the
+    iteration and instance within the stage if any, the probe and the
+    timestamp in seconds of a monotonic clock.
+
+    Events go into a ring buffer that is allocated up front, so that
+    recording an event does not allocate or write anything else. If more
+    than `capacity` events are recorded, the oldest ones are overwritten.
+    Profiling is enabled by RADICAL_ENMD_PROFILING=1; when it is disabled,
+    prof() and prof_states() do nothing.
+
+    Example::
+
+        profiler.prof(pattern.name, "simulation", "start", iteration=2)
+        ...
+        profiler.prof_states(pattern.name, "simulation", unit, iteration=2, instance=4)
+        profiler.write("enmd_profile_{0}.csv".format(session.uid))
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, enabled=None, capacity=DEFAULT_CAPACITY, clock=None, wallclock=None):
+        """Creates a new Profiler.
+
+        Arguments:
+        enabled - record events, defaults to RADICAL_ENMD_PROFILING=1
+        capacity - number of events kept
+        clock - function returning the timestamps of events, defaults to
+        a monotonic clock
+        wallclock - function returning the time of the clock that state
+        history timestamps are taken on, defaults to time.time
+        """
+        if enabled is None:
+            enabled = os.environ.get('RADICAL_ENMD_PROFILING', '0') == '1'
+
+        self.enabled = enabled
+        self.capacity = capacity
+
+        self._clock = clock or monotonic
+        self._wallclock = wallclock or time.time
+        # relates state history timestamps to the clock of the events
+        self._origin = (self._wallclock(), self._clock())
+
+        self._lock = threading.Lock()
+        self._events = []
+        self._next = 0
+        self._recorded = 0
+
+        if enabled:
+            self._events = [None] * capacity
+        else:
+            self.prof = _skip
+            self.prof_states = _skip
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def recorded(self):
+        """Returns the number of events recorded, including overwritten ones.
+        """
+        return self._recorded
+
+    @property
+    def dropped(self):
+        """Returns the number of events that were overwritten.
+        """
+        return max(0, self._recorded - self.capacity)
+
+    # --------------------------------------------------------------------------
+    #
+    def prof(self, pattern, stage, probe, iteration=None, instance=None):
+        """Records an event now.
+        """
+        event = (pattern, stage, iteration, instance, probe, self._clock())
+        with self._lock:
+            self._events[self._next] = event
+            self._next = (self._next + 1) % self.capacity
+            self._recorded += 1
+
+    # --------------------------------------------------------------------------
+    #
+    def prof_states(self, pattern, stage, obj, iteration=None, instance=None):
+        """Records the state history of a unit or pilot, one event per state
+        with the state as probe. The instance defaults to the uid of the
+        object.
+        """
+        if instance is None:
+            instance = obj.uid
+
+        wall, clock = self._origin
+        for entry in obj.state_history:
+            timestamp = epoch_seconds(entry.timestamp) - wall + clock
+            event = (pattern, stage, iteration, instance, entry.state, timestamp)
+            with self._lock:
+                self._events[self._next] = event
+                self._next = (self._next + 1) % self.capacity
+                self._recorded += 1
+
+    # --------------------------------------------------------------------------
+    #
+    def events(self):
+        """Returns the events kept, oldest first, as tuples of FIELDS.
+        """
+        with self._lock:
+            if self._recorded <= self.capacity:
+                return self._events[:self._recorded]
+            return self._events[self._next:] + self._events[:self._next]
+
+    # --------------------------------------------------------------------------
+    #
+    def write(self, path):
+        """Writes the events to a CSV file. The first line relates the
+        timestamps to the epoch.
+        """
+        wall, clock = self._origin
+        with open(path, 'w') as f:
+            f.write("# epoch {0:.6f} at timestamp {1:.6f}\n".format(wall, clock))
+            f.write(",".join(FIELDS) + "\n")
+            for event in self.events():
+                fields = ["" if v is None else str(v).replace(",", ";") for v in event[:-1]]
+                f.write("{0},{1:.6f}\n".format(",".join(fields), event[-1]))
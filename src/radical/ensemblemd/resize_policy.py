@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""Resize policy for execution contexts whose core demand changes at runtime.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+#-------------------------------------------------------------------------------
+#
+class ResizePolicy(object):
+    """A resize policy decides when an execution context adds pilots to, or
+       removes pilots from, its allocation on the same resource.
+
+       The policy is consulted with the number of cores the next stage
+       requests. Nothing changes while the request stays within `threshold`
+       (a fraction of the current capacity) of the capacity. Beyond it, the
+       context grows by the missing cores (at least `min_pilot_cores`, at most
+       up to `max_cores` in total) or shrinks by cancelling extra pilots that
+       are no longer needed. The pilot created by allocate() is never
+       cancelled.
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, threshold=0.25, min_pilot_cores=1, max_cores=None):
+        """Creates a new ResizePolicy instance.
+
+        Arguments:
+        threshold - tolerated relative deviation between requested cores and
+        capacity before the allocation is resized
+        min_pilot_cores - smallest pilot that is submitted when growing
+        max_cores - upper limit for the total number of cores of all pilots
+        """
+        if threshold < 0:
+            raise EnsemblemdError(
+                msg="Resize threshold must not be negative, got {0}.".format(threshold))
+
+        self.threshold = threshold
+        self.min_pilot_cores = min_pilot_cores
+        self.max_cores = max_cores
+
+    #---------------------------------------------------------------------------
+    #
+    def grow(self, capacity, requested):
+        """Returns the number of cores of the pilot to add for the requested
+        cores, or 0 if the allocation should not grow.
+
+        Arguments:
+        capacity - cores of all active or pending pilots
+        requested - cores requested by the next stage
+        """
+        if requested <= capacity * (1.0 + self.threshold):
+            return 0
+
+        cores = max(requested - capacity, self.min_pilot_cores)
+        if self.max_cores is not None:
+            cores = min(cores, self.max_cores - capacity)
+
+        return max(cores, 0)
+
+    #---------------------------------------------------------------------------
+    #
+    def shrink(self, capacity, requested, pilot_cores):
+        """Returns the indices of the extra pilots to cancel for the
+        requested cores. Pilots are cancelled newest first and only as long
+        as the remaining capacity still covers the request.
+
+        Arguments:
+        capacity - cores of all active or pending pilots
+        requested - cores requested by the next stage
+        pilot_cores - cores of the extra pilots, oldest first
+        """
+        if requested >= capacity * (1.0 - self.threshold):
+            return []
+
+        cancel = []
+        for index in reversed(range(len(pilot_cores))):
+            if capacity - pilot_cores[index] < requested:
+                continue
+            capacity -= pilot_cores[index]
+            cancel.append(index)
+
+        return cancel
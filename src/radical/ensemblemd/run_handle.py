@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""Handle of a pattern started with ExecutionContext.run_async().
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import sys
+import threading
+
+# ------------------------------------------------------------------------------
+#
+class RunHandle(object):
+    """A pattern that runs in the background on a shared allocation. The
+    pattern runs on a copy of the execution context whose unit manager
+    only sees the units of this run, so that several patterns, and several
+    runs of the same plugin, do not interfere.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, context, pattern, run, force_plugin=None, resume=None):
+        """Starts the run.
+
+        Arguments:
+        context - the execution context copy the pattern runs on
+        pattern - the pattern
+        run - the RunUnitManager of the run
+        force_plugin, resume - see ExecutionContext.run()
+        """
+        self._context = context
+        self._pattern = pattern
+        self._run = run
+
+        self._thread = threading.Thread(target=self._execute, name=run.uid,
+                                        args=(force_plugin, resume))
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def uid(self):
+        return self._run.uid
+
+    @property
+    def pattern(self):
+        return self._pattern
+
+    @property
+    def done(self):
+        """Returns True once the pattern finished or failed.
+        """
+        return not self._thread.is_alive()
+
+    @property
+    def error(self):
+        """Returns the exception the pattern failed with, or None.
+        """
+        return self._context._excvalue
+
+    @property
+    def hidden_time(self):
+        """Returns the hidden_time of the run, see the execution context.
+        """
+        return self._context._hidden_time
+
+    # --------------------------------------------------------------------------
+    #
+    def wait(self, timeout=None):
+        """Waits until the pattern finished or the timeout in seconds
+        expired.
+
+        Returns:
+        done - True if the pattern finished
+        """
+        if timeout is not None:
+            self._thread.join(timeout)
+        else:
+            # join() without timeout cannot be interrupted
+            while self._thread.is_alive():
+                self._thread.join(1.0)
+        return self.done
+
+    # --------------------------------------------------------------------------
+    #
+    def _execute(self, force_plugin, resume):
+        try:
+            # run() records the errors of the pattern execution itself
+            self._context.run(self._pattern, force_plugin=force_plugin, resume=resume)
+        except Exception, ex:
+            self._context._exctype, self._context._excvalue, self._context._traceback = sys.exc_info()
+            self._context.get_logger().error("{0} failed: {1}.".format(self.uid, ex))
+        finally:
+            self._run.close()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+
+"""A unit manager shared by patterns that run concurrently on one allocation.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import time
+import threading
+import collections
+import radical.pilot
+
+from radical.ensemblemd.fair_share_policy import FairSharePolicy
+
+FINAL_STATES = [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]
+
+# Seconds between checks while all units waited for are held on the client
+HELD_POLL_INTERVAL = 1.0
+
+# ------------------------------------------------------------------------------
+#
+class RunUnit(object):
+    """A unit submitted by one run. It is held on the client until the
+    fair-share policy releases it, then it stands for the ComputeUnit it
+    was submitted as.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, uid, description, run):
+        self._uid = uid
+        self._run = run
+        self._unit = None
+        self._state = radical.pilot.NEW
+        self._final = False
+        self.description = description
+
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def name(self):
+        return self.description.name
+
+    @property
+    def cores(self):
+        return getattr(self.description, 'cores', None) or 1
+
+    @property
+    def state(self):
+        if self._unit is not None:
+            return self._unit.state
+        return self._state
+
+    def __getattr__(self, name):
+        # everything else is only known once the unit is released
+        if name.startswith('_'):
+            raise AttributeError(name)
+        unit = self.__dict__.get('_unit')
+        if unit is None:
+            return None
+        return getattr(unit, name)
+
+
+# ------------------------------------------------------------------------------
+#
+class RunUnitManager(object):
+    """The unit manager of one run. It only reports the units of its run to
+    the callbacks and waits of its plugin, and holds units beyond the
+    run's share. Everything else is passed to the shared unit manager.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, uid, weight, shared):
+        self.uid = uid
+        self.weight = weight
+        self._shared = shared
+        self._callbacks = []
+        self._units = collections.OrderedDict()
+        self._held = collections.deque()
+        # cores of released units that are not final yet
+        self._running = 0
+        # cores released so far, runs that got less go first
+        self._served = 0
+        self._count = 0
+        # (unit, state) recorded for the callbacks, see _drain()
+        self._pending = collections.deque()
+        self._delivering = False
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def demand(self):
+        return self._running + sum([u.cores for u in self._held])
+
+    # --------------------------------------------------------------------------
+    #
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._shared._umgr, name)
+
+    # --------------------------------------------------------------------------
+    #
+    def register_callback(self, callback):
+        """Registers a unit state callback for the units of this run.
+        """
+        self._callbacks.append(callback)
+
+    # --------------------------------------------------------------------------
+    #
+    def list_units(self):
+        with self._shared._lock:
+            return list(self._units.keys())
+
+    # --------------------------------------------------------------------------
+    #
+    def get_units(self, uids=None):
+        with self._shared._lock:
+            if uids is None:
+                return list(self._units.values())
+            if not isinstance(uids, list):
+                return self._units[uids]
+            return [self._units[uid] for uid in uids]
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_units(self, descriptions):
+        """Queues units of this run, they are submitted as soon as the run's
+        share allows.
+        """
+        single = not isinstance(descriptions, list)
+        if single:
+            descriptions = [descriptions]
+
+        units = []
+        with self._shared._lock:
+            for cud in descriptions:
+                unit = RunUnit("{0}.unit.{1:06d}".format(self.uid, self._count), cud, self)
+                self._count += 1
+                self._units[unit.uid] = unit
+                self._held.append(unit)
+                units.append(unit)
+            runs = self._shared._rebalance()
+        self._shared._notify(runs)
+
+        if single:
+            return units[0]
+        return units
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_units(self, uids=None, state=None, timeout=None):
+        """Waits until the units of this run reach the given states or a
+        final state, see ComputeUnitManager.wait_units().
+        """
+        single = uids is not None and not isinstance(uids, list)
+        units = self.get_units(uids)
+        if single:
+            units = [units]
+
+        if state is None:
+            state = FINAL_STATES
+        elif not isinstance(state, list):
+            state = [state]
+        reached = lambda u: u.state in state or u.state in FINAL_STATES
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while True:
+            with self._shared._lock:
+                if not [u for u in units if not reached(u)]:
+                    break
+                released = [u._unit.uid for u in units if u._unit is not None and not reached(u)]
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+
+            if released:
+                self._shared._umgr.wait_units(released, state=state, timeout=remaining)
+            else:
+                with self._shared._cond:
+                    self._shared._cond.wait(min(HELD_POLL_INTERVAL, remaining or HELD_POLL_INTERVAL))
+
+        states = [u.state for u in units]
+        if single:
+            return states[0]
+        return states
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_units(self, uids=None):
+        """Cancels units of this run, held ones are never submitted.
+        """
+        units = self.get_units(uids)
+        if not isinstance(units, list):
+            units = [units]
+
+        with self._shared._lock:
+            released = [u._unit.uid for u in units if u._unit is not None]
+            held = [u for u in units if u in self._held]
+            for unit in held:
+                self._held.remove(unit)
+
+        if released:
+            self._shared._umgr.cancel_units(released)
+
+        runs = []
+        with self._shared._lock:
+            for unit in held:
+                unit._state = radical.pilot.CANCELED
+                runs += self._shared._record(unit, radical.pilot.CANCELED)
+            self._shared._cond.notify_all()
+        self._shared._notify(runs)
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        """Cancels what is left of the run and gives its share to the other
+        runs.
+        """
+        with self._shared._lock:
+            unfinished = [u.uid for u in self._units.values() if u.state not in FINAL_STATES]
+        if unfinished:
+            self.cancel_units(unfinished)
+        self._shared.remove(self)
+
+    # --------------------------------------------------------------------------
+    #
+    def _drain(self):
+        """Passes the recorded unit states to the callbacks of the run, in
+        the order they were recorded. Called without the lock, so that the
+        callbacks of different runs do not wait for each other. Only one
+        thread at a time delivers the states of a run, states recorded
+        meanwhile are delivered by that thread.
+        """
+        while True:
+            with self._shared._lock:
+                if self._delivering or not self._pending:
+                    return
+                self._delivering = True
+                unit, state = self._pending.popleft()
+
+            try:
+                for cb in self._callbacks:
+                    try:
+                        cb(unit, state)
+                    except Exception, ex:
+                        self._shared._logger.exception("Unit state callback of {0} failed: {1}".format(self.uid, ex))
+            finally:
+                with self._shared._lock:
+                    self._delivering = False
+
+    # --------------------------------------------------------------------------
+    #
+    def _admit(self, share, free, capacity):
+        """Takes the held units that fit into the run's share and the free
+        cores. A run that has nothing running may exceed its share, so that
+        shares of less than a task do not starve it, and units larger than
+        the capacity are passed on as they are.
+        """
+        batch = []
+        while self._held:
+            cores = self._held[0].cores
+            if self._running == 0 and cores > capacity:
+                pass
+            elif cores > free or (self._running > 0 and self._running + cores > share):
+                break
+            unit = self._held.popleft()
+            self._running += cores
+            self._served += cores
+            free -= cores
+            batch.append(unit)
+        return batch
+
+
+# ------------------------------------------------------------------------------
+#
+class SharedUnitManager(object):
+    """Multiplexes the unit manager of an execution context among runs. The
+    units of each run are released to the unit manager according to the
+    fair-share policy and their state callbacks are only passed to the run
+    that submitted them.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, umgr, resource, policy, logger):
+        """Creates a new SharedUnitManager.
+
+        Arguments:
+        umgr - the unit manager of the execution context
+        resource - the execution context, for its capacity
+        policy - the FairSharePolicy, defaults to FairSharePolicy()
+        logger - the execution context's logger
+        """
+        if policy is None:
+            policy = FairSharePolicy()
+
+        self._umgr = umgr
+        self._resource = resource
+        self._policy = policy
+        self._logger = logger
+
+        # held while units are released, so that the states of released
+        # units are recorded once their runs know them. Callbacks run
+        # without it, see RunUnitManager._drain()
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+
+        self._runs = []
+        self._count = 0
+        # ComputeUnit uid -> RunUnit
+        self._units = {}
+        # states reported by the unit manager while units were submitted
+        self._early = {}
+
+        self._umgr.register_callback(self._unit_state_cb)
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def active(self):
+        """Returns True while runs are in progress.
+        """
+        return len(self._runs) > 0
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, weight=1.0):
+        """Returns the RunUnitManager of a new run.
+        """
+        with self._lock:
+            run = RunUnitManager("run.{0:04d}".format(self._count), weight, self)
+            self._count += 1
+            self._runs.append(run)
+            self._logger.info("Started {0} with fair-share weight {1}, {2} run(s) in progress.".format(
+                run.uid, weight, len(self._runs)))
+            return run
+
+    # --------------------------------------------------------------------------
+    #
+    def remove(self, run):
+        """Ends a run, its share goes to the other runs.
+        """
+        runs = []
+        with self._lock:
+            if run in self._runs:
+                self._runs.remove(run)
+                self._logger.info("Finished {0}, {1} run(s) in progress.".format(run.uid, len(self._runs)))
+                runs = self._rebalance()
+        self._notify(runs)
+
+    # --------------------------------------------------------------------------
+    #
+    def shares(self):
+        """Returns the dictionary run uid -> cores of the current shares.
+        """
+        with self._lock:
+            return self._policy.shares(self._resource.capacity,
+                dict([(r.uid, r.demand) for r in self._runs]),
+                dict([(r.uid, r.weight) for r in self._runs]))
+
+    # --------------------------------------------------------------------------
+    #
+    def _rebalance(self):
+        """Releases the held units that fit into the shares of their runs.
+        Called with the lock held.
+
+        Returns:
+        runs - the runs that states were recorded for, see _notify()
+        """
+        touched = []
+        if not self._runs:
+            return touched
+
+        capacity = self._resource.capacity
+        shares = self.shares()
+        free = capacity - sum([r._running for r in self._runs])
+
+        for run in sorted(self._runs, key=lambda r: (r._running / float(r.weight), r._served / float(r.weight))):
+            batch = run._admit(shares[run.uid], free, capacity)
+            if not batch:
+                continue
+            free -= sum([u.cores for u in batch])
+
+            units = self._umgr.submit_units([u.description for u in batch])
+            if not isinstance(units, list):
+                units = [units]
+            for unit, cu in zip(batch, units):
+                unit._unit = cu
+                self._units[cu.uid] = unit
+
+            self._logger.debug("Released {0} unit(s) of {1}, share {2:.1f} cores.".format(
+                len(batch), run.uid, shares[run.uid]))
+
+            # final states may release further units
+            early = [(unit, self._early.pop(unit._unit.uid, [])) for unit in batch]
+            for unit, states in early:
+                for state in states:
+                    touched += self._record(unit, state)
+
+        self._cond.notify_all()
+        return touched
+
+    # --------------------------------------------------------------------------
+    #
+    def _unit_state_cb(self, cu, state):
+        with self._lock:
+            unit = self._units.get(cu.uid)
+            if unit is None:
+                self._early.setdefault(cu.uid, []).append(state)
+                return
+            runs = self._record(unit, state)
+        self._notify(runs)
+
+    # --------------------------------------------------------------------------
+    #
+    def _record(self, unit, state):
+        """Records a state for the callbacks of the unit's run and releases
+        held units when it frees cores. Called with the lock held.
+
+        Returns:
+        runs - the runs that states were recorded for, see _notify()
+        """
+        run = unit._run
+        run._pending.append((unit, state))
+        touched = [run]
+        if state in FINAL_STATES and not unit._final:
+            unit._final = True
+            if unit._unit is not None:
+                run._running -= unit.cores
+                touched += self._rebalance()
+        return touched
+
+    # --------------------------------------------------------------------------
+    #
+    def _notify(self, runs):
+        """Delivers the recorded states of the runs to their callbacks.
+        Called without the lock.
+        """
+        done = set()
+        for run in runs:
+            if run.uid not in done:
+                done.add(run.uid)
+                run._drain()
@@ -9,6 +9,7 @@ __license__   = "MIT"
 
 import os
 import sys
+import time
 import traceback
 import datetime
 import radical.pilot
@@ -16,12 +17,15 @@ import radical.utils as ru
 
 from radical.ensemblemd import version
 from radical.ensemblemd.engine import Engine
-from radical.ensemblemd.exceptions import EnsemblemdError, TypeError
+from radical.ensemblemd.exceptions import EnsemblemdError, TypeError, WalltimeError
 from radical.ensemblemd.execution_pattern import ExecutionPattern
 from radical.ensemblemd.execution_context import ExecutionContext
 
 CONTEXT_NAME = "Static"
 
+# Seconds between checks of the pilot states while waiting for a pilot
+PILOT_POLL_INTERVAL = 5
+
 #-------------------------------------------------------------------------------
 #
 class SingleClusterEnvironment(ExecutionContext):
@@ -41,13 +45,30 @@ class SingleClusterEnvironment(ExecutionContext):
 				 cleanup=False, 
 				 database_url=None, 
 				 database_name=None,
-				 access_schema=None):
+				 access_schema=None,
+				 resize_policy=None,
+				 pilots=1):
 		"""Creates a new ExecutionContext instance.
+
+		If a resize_policy (radical.ensemblemd.ResizePolicy) is given, the
+		context submits extra pilots on the same resource, or cancels them,
+		when a pattern's core demand changes at runtime (see resize()).
+
+		With pilots > 1, the cores are requested as that many smaller
+		pilots, which usually wait less in the batch queue. Tasks are
+		late-bound to whichever pilots are active, so the pattern starts
+		as soon as the first pilot is, and the shared data is staged to
+		every pilot.
 		"""
+		if not 1 <= pilots <= cores:
+			raise EnsemblemdError(
+				msg="Number of pilots must be between 1 and the number of cores, got {0}.".format(pilots))
+
 		self._allocate_called = False
 		self._umgr = None
 		self._session = None
 		self._pilot = None
+		self._pilots = []
 		self._pmgr = None
 		self._exctype = None
 		self._excvalue = None
@@ -63,11 +84,20 @@ class SingleClusterEnvironment(ExecutionContext):
 		self._database_url = database_url
 		self._database_name = database_name
 		self._schema = access_schema
+		self._resize_policy = resize_policy
+		self._num_pilots = pilots
+		self._allocate_time = None
+
+		# seconds of plugin preparation done while the pilot was queued
+		self._hidden_time = 0.0
 
 
 		#shared data
 		self._shared_data = None
 
+		# checkpoint to resume from in run()
+		self._resume = None
+
 		self._logger  = ru.get_logger('radical.entk.SingleClusterEnvironment')
 		self._reporter = ru.LogReporter(name='radical.entk.SingleClusterEnvironment')
 
@@ -94,6 +124,31 @@ class SingleClusterEnvironment(ExecutionContext):
 	@shared_data.setter
 	def shared_data(self,data):
 		self._shared_data = data
+
+	@property
+	def hidden_time(self):
+		"""Returns the seconds the plugins spent preparing and pre-staging
+		tasks while the pilot waited in the queue.
+		"""
+		return self._hidden_time
+
+	@property
+	def resize_policy(self):
+		return self._resize_policy
+
+	@resize_policy.setter
+	def resize_policy(self, policy):
+		self._resize_policy = policy
+
+	#---------------------------------------------------------------------------
+	#
+	@property
+	def capacity(self):
+		"""Returns the number of cores of all pilots that are not in a
+		final state.
+		"""
+		final = [radical.pilot.DONE, radical.pilot.CANCELED, radical.pilot.FAILED]
+		return sum([p.description['cores'] for p in self._pilots if p.state not in final])
 	
 
 	#---------------------------------------------------------------------------
@@ -101,10 +156,8 @@ class SingleClusterEnvironment(ExecutionContext):
 	def deallocate(self):
 		"""Deallocates the resources.
 		"""
-		profiling = int(os.environ.get('RADICAL_ENMD_PROFILING',0))
 		self._reporter.info('\nStarting Deallocation..\n')
-		if profiling == 1:
-			start_time = datetime.datetime.now()
+		self._profiler.prof(None, 'deallocate', 'start')
 
 		self.get_logger().info("Deallocating Cluster")
 
@@ -112,45 +165,18 @@ class SingleClusterEnvironment(ExecutionContext):
 			self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue)))
 			self._reporter.error("Fatal error: {0}.".format(str(self._excvalue)))
 			traceback.print_tb(self._traceback)
-		
+
+		self.get_logger().info("Preparation hidden in the queue wait: {0:.1f}s".format(self._hidden_time))
+
+		# the pilot states are read while the session is open
+		for pilot in self._pilots:
+			self._profiler.prof_states(None, 'pilot', pilot)
 
 		self._session.close(cleanup=self._cleanup)
 		self._reporter.ok('>>done \n')    
 
-		profiling = int(os.environ.get('RADICAL_ENMD_PROFILING',0))
-		if profiling == 1:
-			stop_time = datetime.datetime.now()
-			f1 = open('enmd_core_overhead.csv','a')
-			f1.write('deallocate,start_time,{0}\n'.format(start_time))
-			f1.write('deallocate,stop_time,{0}\n'.format(stop_time))
-			f1.close()
-
-			f1 = open('pilot_profile_{mysession}.csv'.format(mysession=self._session.uid),'w')
-			title = "uid, New, PendingLaunch, Launching, PendingActive, Active, Canceled, Done"
-			f1.write(title + "\n\n")
-			st_data = {}
-			for st in self._pilot.state_history:
-				st_dict = st.as_dict()
-				st_data["{0}".format( st_dict["state"] )] = {}
-				st_data["{0}".format( st_dict["state"] )] = st_dict["timestamp"]
-
-			states = ['New','PendingLaunch','Launching','PendingActive','Active','Canceled','Done']
-
-			for state in states:
-				if (state in st_data) is False:
-					st_data[state] = None
-
-			line = "{uid}, {New}, {PendingLaunch}, {Launching}, {PendingActive}, {Active}, {Canceled}, {Done}".format(
-							uid=self._pilot.uid,
-							New=st_data['New'],
-							PendingLaunch=st_data['PendingLaunch'],
-							Launching=(st_data['Launching']),
-							PendingActive=(st_data['PendingActive']),
-							Active=(st_data['Active']),
-							Canceled=(st_data['Canceled']),
-							Done=(st_data['Done']),
-						)
-			f1.write(line + '\n')
+		self._profiler.prof(None, 'deallocate', 'stop')
+		self._write_profile()
 
 	#---------------------------------------------------------------------------
 	#
@@ -162,10 +188,11 @@ class SingleClusterEnvironment(ExecutionContext):
 		def pilot_state_cb (pilot, state) :
 			self.get_logger().info("Resource {0} state has changed to {1}".format(self._resource_key, state))
 
+			# units of a failed pilot fail as well and are handled by the
+			# failure policy of the pattern
 			if state == radical.pilot.FAILED:
-				self.get_logger().error("Resource error: ")
-				self.get_logger().error("Pattern execution FAILED.")
-				sys.exit(1)
+				self.get_logger().error("Resource error: pilot {0} FAILED.".format(pilot.uid))
+				self._reporter.error("Pilot {0} failed.".format(pilot.uid))
 
 			if state == radical.pilot.DONE:
 				self.get_logger().info("Resource allocation time over.")
@@ -184,9 +211,7 @@ class SingleClusterEnvironment(ExecutionContext):
 
 		self._reporter.info('Starting Allocation')
 
-		profiling = int(os.environ.get('RADICAL_ENMD_PROFILING',0))
-		if profiling == 1:
-			start_time = datetime.datetime.now()
+		self._profiler.prof(None, 'allocate', 'start')
 
 		if not self._database_url:
 			self._database_url = os.getenv ("RADICAL_PILOT_DBURL", None)
@@ -212,55 +237,33 @@ class SingleClusterEnvironment(ExecutionContext):
 			pmgr.register_callback(pilot_state_cb)
 			self._pmgr = pmgr
 
-			pdesc = radical.pilot.ComputePilotDescription()
-			pdesc.resource = self._resource_key
-			pdesc.runtime  = self._walltime
-			pdesc.cores    = self._cores
-
-			if self._queue is not None:
-				pdesc.queue = self._queue
-
-			pdesc.cleanup = self._cleanup
-
-			if self._project is not None:
-				pdesc.project = self._project
-
-			pdesc.access_schema = self._schema
-
 			self.get_logger().info("Requesting resources on {0}".format(self._resource_key))
 
-			self._pilot = pmgr.submit_pilots(pdesc)
-			self.get_logger().info("Launched {0}-core pilot on {1}.".format(self._cores, self._resource_key))
-
-			if self._shared_data is not None:
-				self.get_logger().info("Commencing transfer of shared data to {0}".format(self._resource_key))
-				shared_list = []
-				for f in self._shared_data:
-					if f.startswith('.'):
-						f = os.getcwd() + f.split('.')[1] + '.' + f.split('.')[2]
-					shared_dict =   {
-										'source': 'file://%s'%f,
-										'target': 'staging:///%s' %os.path.basename(f),
-										'action': radical.pilot.TRANSFER
-									}
+			self._allocate_time = datetime.datetime.now()
 
-					shared_list.append(shared_dict)
-
-				self._pilot.stage_in(shared_list)
+			# the remainder of the split goes to the first pilots
+			share, rest = divmod(self._cores, self._num_pilots)
+			for i in range(self._num_pilots):
+				self._submit_pilot(share + (1 if i < rest else 0), self._walltime)
+			self._pilot = self._pilots[0]
 
 			if wait is True:
-				self._pilot.wait(radical.pilot.ACTIVE)
+				self._wait_active()
+
+			# With several pilots or a resize policy, units are late-bound
+			# to whichever pilots are active when they are scheduled
+			if (self._resize_policy is None) and (self._num_pilots == 1):
+				scheduler = radical.pilot.SCHED_DIRECT_SUBMISSION
+			else:
+				scheduler = radical.pilot.SCHED_BACKFILLING
 
 			self._umgr = radical.pilot.UnitManager(
 				session=self._session,
-				scheduler=radical.pilot.SCHED_DIRECT_SUBMISSION)
+				scheduler=scheduler)
 
-			self._umgr.add_pilots(self._pilot)
+			self._umgr.add_pilots(self._pilots)
 
-			
-
-			if profiling == 1:
-				stop_time = datetime.datetime.now()
+			self._profiler.prof(None, 'allocate', 'stop')
 
 			self._reporter.ok('>> ok')
 
@@ -271,19 +274,137 @@ class SingleClusterEnvironment(ExecutionContext):
 				self._session.close()
 			raise
 
-		finally:
-			if profiling == 1:
-				title = 'step,probe,timestamp'
-				f1 = open('enmd_core_overhead.csv','w')
-				f1.write(title+'\n\n')
-				f1.write('allocate,start_time,{0}\n'.format(start_time))
-				f1.write('allocate,stop_time,{0}\n'.format(stop_time))
-				f1.close()
+	#---------------------------------------------------------------------------
+	#
+	def _submit_pilot(self, cores, walltime):
+		"""Submits a pilot on the resource and stages the shared data to it.
+		"""
+		pdesc = radical.pilot.ComputePilotDescription()
+		pdesc.resource = self._resource_key
+		pdesc.runtime  = walltime
+		pdesc.cores    = cores
+
+		if self._queue is not None:
+			pdesc.queue = self._queue
+
+		pdesc.cleanup = self._cleanup
+
+		if self._project is not None:
+			pdesc.project = self._project
+
+		pdesc.access_schema = self._schema
+
+		pilot = self._pmgr.submit_pilots(pdesc)
+		self._pilots.append(pilot)
+		self.get_logger().info("Launched {0}-core pilot on {1}.".format(cores, self._resource_key))
+
+		if self._shared_data is not None:
+			self.get_logger().info("Commencing transfer of shared data to {0}".format(self._resource_key))
+			shared_list = []
+			for f in self._shared_data:
+				if f.startswith('.'):
+					f = os.getcwd() + f.split('.')[1] + '.' + f.split('.')[2]
+				shared_dict =   {
+									'source': 'file://%s'%f,
+									'target': 'staging:///%s' %os.path.basename(f),
+									'action': radical.pilot.TRANSFER
+								}
+
+				shared_list.append(shared_dict)
+
+			pilot.stage_in(shared_list)
+
+		return pilot
+
+	#---------------------------------------------------------------------------
+	#
+	def _wait_active(self):
+		"""Waits until the first pilot of the allocation is active and
+		returns it.
+		"""
+		final = [radical.pilot.DONE, radical.pilot.CANCELED, radical.pilot.FAILED]
+		while True:
+			for pilot in self._pilots:
+				if pilot.state == radical.pilot.ACTIVE:
+					return pilot
+
+			if not [p for p in self._pilots if p.state not in final]:
+				raise EnsemblemdError(
+					msg="No pilot on {0} became active.".format(self._resource_key))
+
+			time.sleep(PILOT_POLL_INTERVAL)
+
+	#---------------------------------------------------------------------------
+	#
+	def _bind_unit(self, cud, kernel):
+		"""Binds the kernel of a unit to the resource and sets the resource
+		specific parts of the unit description.
+		"""
+		kernel._bind_to_resource(self._resource_key)
+
+		cud.pre_exec   = kernel._cu_def_pre_exec
+		cud.executable = kernel._cu_def_executable
+		cud.arguments  = kernel.arguments
+		cud.mpi        = kernel.uses_mpi
+
+		return self._resource_key
 
 	#---------------------------------------------------------------------------
 	#
-	def run(self, pattern, force_plugin=None):
-		"""Creates a new SingleClusterEnvironment instance.
+	def resize(self, cores):
+		"""Adapts the allocation to a pattern stage that requests the given
+		number of cores, as decided by the resize policy. Extra pilots get
+		the walltime that is left of the allocation; units submitted after
+		the call are scheduled onto the active pilots.
+
+		Arguments:
+		cores - number of cores requested by the next stage
+
+		Returns:
+		capacity - number of cores of the pilots after resizing
+		"""
+		if (self._resize_policy is None) or (self._allocate_called is False):
+			return self.capacity
+
+		capacity = self.capacity
+		grow = self._resize_policy.grow(capacity, cores)
+
+		if grow > 0:
+			elapsed = (datetime.datetime.now() - self._allocate_time).total_seconds() / 60
+			walltime = int(self._walltime - elapsed)
+			if walltime < 1:
+				self.get_logger().info("Not resizing, allocation walltime is used up.")
+				return capacity
+
+			self._reporter.info("Resizing allocation on {0}: adding {1} core(s) for {2} requested core(s)".format(self._resource_key, grow, cores))
+			pilot = self._submit_pilot(grow, walltime)
+			self._umgr.add_pilots(pilot)
+
+		else:
+			# the pilots created by allocate() are never cancelled
+			final = [radical.pilot.DONE, radical.pilot.CANCELED, radical.pilot.FAILED]
+			extra = [p for p in self._pilots[self._num_pilots:] if p.state not in final]
+			cancel = self._resize_policy.shrink(capacity, cores, [p.description['cores'] for p in extra])
+
+			for index in cancel:
+				pilot = extra[index]
+				self._reporter.info("Resizing allocation on {0}: removing {1}-core pilot for {2} requested core(s)".format(self._resource_key, pilot.description['cores'], cores))
+				self._umgr.remove_pilots(pilot.uid)
+				self._pmgr.cancel_pilots(pilot.uid)
+
+		return self.capacity
+
+	#---------------------------------------------------------------------------
+	#
+	def run(self, pattern, force_plugin=None, resume=None):
+		"""Executes a pattern on the allocated resources.
+
+		If resume is set, plugins that support checkpoints continue the run
+		recorded in the given checkpoint file instead of starting from
+		scratch: the ReplicaExchange plugins restore their last cycle, the
+		SimulationAnalysisLoop, Pipeline and BagofTasks plugins skip the
+		stages recorded in their journal. resume=True uses the pattern's
+		checkpoint_file.
 		"""
 		# Make sure resources were allocated.
 		if self._allocate_called is False:
@@ -291,12 +412,18 @@ class SingleClusterEnvironment(ExecutionContext):
 				msg="Resource(s) not allocated. Call allocate() first."
 			)
 
+		self._check_sync_run()
+
 		# Some basic type checks.
 		if not isinstance(pattern, ExecutionPattern):
 			raise TypeError(
 			  expected_type=ExecutionPattern,
 			  actual_type=type(pattern))
 
+		if resume is True:
+			resume = getattr(pattern, 'checkpoint_file', None)
+		self._resume = resume
+
 		self._engine = Engine()
 		plugin = self._engine.get_execution_plugin_for_pattern(
 			pattern_name=pattern.name,
@@ -310,6 +437,9 @@ class SingleClusterEnvironment(ExecutionContext):
 		try:
 			self._reporter.info('\nStarting pattern execution')
 			plugin.execute_pattern(pattern, self)
+		except WalltimeError, ex:
+			# not an error, the run continues in a later allocation
+			self._report_stop(pattern, ex)
 		except KeyboardInterrupt:
 			self._exctype,self._excvalue,self._traceback = sys.exc_info()           
 			self.get_logger().error("Fatal error during execution: {0}.".format(str(self._excvalue))) 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""Straggler policy for the tasks of an execution pattern.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import math
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+#-------------------------------------------------------------------------------
+#
+class StragglerPolicy(object):
+    """A straggler policy lets an execution plugin launch a duplicate of a
+       task that runs much longer than the other tasks of its stage, e.g.
+       because it landed on a slow node. The runtimes of the finished tasks
+       of a stage are collected while the stage runs. Once `min_fraction`
+       of the stage has finished, a task that has been executing for more
+       than `multiple` times the `quantile` of these runtimes is duplicated,
+       provided the pilot has enough idle cores. Whichever copy finishes
+       first is used, the other one is canceled.
+
+       The state of the running tasks is checked every `poll_interval`
+       seconds.
+
+       Example::
+
+            pattern.straggler_policy = StragglerPolicy(quantile=0.5, multiple=2.0)
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, quantile=0.5, multiple=3.0, min_fraction=0.5,
+                 poll_interval=10):
+        """Creates a new StragglerPolicy instance.
+
+        Arguments:
+        quantile - quantile of the finished runtimes tasks are compared to
+        multiple - factor of the quantile after which a task is a straggler
+        min_fraction - fraction of finished tasks before stragglers are duplicated
+        poll_interval - seconds between checks of the running tasks
+        """
+        if not 0.0 <= quantile <= 1.0:
+            raise EnsemblemdError(
+                msg="Straggler quantile must be between 0 and 1, got {0}.".format(quantile))
+
+        if not 0.0 <= min_fraction <= 1.0:
+            raise EnsemblemdError(
+                msg="Straggler min_fraction must be between 0 and 1, got {0}.".format(min_fraction))
+
+        if multiple < 1.0 or poll_interval <= 0:
+            raise EnsemblemdError(
+                msg="Straggler multiple must be at least 1 and poll_interval positive.")
+
+        self.quantile = quantile
+        self.multiple = multiple
+        self.min_fraction = min_fraction
+        self.poll_interval = poll_interval
+
+    #---------------------------------------------------------------------------
+    #
+    def threshold(self, runtimes, total):
+        """Returns the runtime in seconds after which a task of a stage is a
+        straggler, or None if too few tasks have finished yet.
+
+        Arguments:
+        runtimes - runtimes of the finished tasks of the stage
+        total - number of tasks in the stage
+        """
+        needed = max(1, int(math.ceil(self.min_fraction * total)))
+        if len(runtimes) < needed:
+            return None
+
+        ordered = sorted(runtimes)
+        index = int(round(self.quantile * (len(ordered) - 1)))
+        return self.multiple * ordered[index]
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""Content-addressed cache of task outputs, shared between runs.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+
+# Index of the cache entries, kept in the cache directory
+INDEX_FILE = "index.json"
+
+# Read size when hashing input files
+HASH_BLOCK_SIZE = 1 << 20
+
+#-------------------------------------------------------------------------------
+#
+class TaskCache(object):
+    """A task cache keeps the outputs of deterministic tasks in a local
+       directory, keyed by a hash of everything that determines them: the
+       bound executable, arguments, pre_exec commands and environment of the
+       task and the contents of its input files. A task with a known key is
+       not executed again; its cached outputs are staged to where the task
+       would have produced them.
+
+       Only tasks whose kernel declares its outputs with
+       ``Kernel.cache_output_data`` are cached. If `max_size` (bytes) is
+       set, the least recently used entries are evicted once the cache grows
+       beyond it.
+
+       Example::
+
+            pattern.task_cache = TaskCache("~/.radical/enmd_task_cache",
+                                           max_size=10 * 1024**3)
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, path, max_size=None):
+        """Creates a new TaskCache instance.
+
+        Arguments:
+        path - cache directory, created if it does not exist
+        max_size - size limit of the cache in bytes, None for no limit
+        """
+        self._path = os.path.abspath(os.path.expanduser(path))
+        self._max_size = max_size
+        self._lock = threading.RLock()
+
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+
+        self._index = {}
+        index = os.path.join(self._path, INDEX_FILE)
+        if os.path.exists(index):
+            try:
+                f = open(index)
+                self._index = json.load(f)
+                f.close()
+            except ValueError:
+                raise EnsemblemdError(
+                    msg="Task cache index {0} is corrupt.".format(index))
+
+    #---------------------------------------------------------------------------
+    #
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def size(self):
+        """Returns the size of all cache entries in bytes.
+        """
+        with self._lock:
+            return sum([entry["size"] for entry in self._index.values()])
+
+    #---------------------------------------------------------------------------
+    #
+    def key(self, description, input_files=None):
+        """Returns the cache key of a task.
+
+        Arguments:
+        description - JSON serializable description of the task
+        input_files - list of (name, local path) tuples of the input files
+        whose contents the outputs depend on
+        """
+        digest = hashlib.sha1()
+        digest.update(json.dumps(description, sort_keys=True))
+
+        for name, path in sorted(input_files or []):
+            digest.update("\0{0}\0".format(name))
+            f = open(path, "rb")
+            try:
+                block = f.read(HASH_BLOCK_SIZE)
+                while block:
+                    digest.update(block)
+                    block = f.read(HASH_BLOCK_SIZE)
+            finally:
+                f.close()
+
+        return digest.hexdigest()
+
+    #---------------------------------------------------------------------------
+    #
+    def lookup(self, key):
+        """Returns the directory with the cached outputs of a task, or None
+        if the task is not cached. A hit marks the entry as recently used.
+        """
+        with self._lock:
+            if key not in self._index:
+                return None
+
+            entry = os.path.join(self._path, key)
+            if not os.path.isdir(entry):
+                # removed behind our back
+                del self._index[key]
+                self._write_index()
+                return None
+
+            self._index[key]["last_used"] = time.time()
+            self._write_index()
+            return entry
+
+    #---------------------------------------------------------------------------
+    #
+    def pending_path(self, key):
+        """Returns the directory the outputs of a running task are staged to
+        before they are committed.
+        """
+        return os.path.join(self._path, "{0}.pending".format(key))
+
+    #---------------------------------------------------------------------------
+    #
+    def commit(self, key):
+        """Adds the staged outputs of a finished task to the cache. Returns
+        the directory of the entry, or None if it did not fit into the cache.
+        """
+        with self._lock:
+            pending = self.pending_path(key)
+            if not os.path.isdir(pending):
+                return None
+
+            entry = os.path.join(self._path, key)
+            if os.path.exists(entry):
+                shutil.rmtree(pending)
+            else:
+                os.rename(pending, entry)
+
+            size = 0
+            for root, dirs, files in os.walk(entry):
+                for f in files:
+                    size += os.path.getsize(os.path.join(root, f))
+
+            self._index[key] = {"size": size, "last_used": time.time()}
+            self._evict()
+            self._write_index()
+
+            if key not in self._index:
+                return None
+            return entry
+
+    #---------------------------------------------------------------------------
+    #
+    def discard(self, key):
+        """Removes the staged outputs of a failed task.
+        """
+        pending = self.pending_path(key)
+        if os.path.isdir(pending):
+            shutil.rmtree(pending, ignore_errors=True)
+
+    #---------------------------------------------------------------------------
+    #
+    def _evict(self):
+        """Removes least recently used entries until the cache fits into
+        max_size.
+        """
+        if self._max_size is None:
+            return
+
+        lru = sorted(self._index.keys(), key=lambda k: self._index[k]["last_used"])
+        size = self.size
+        while size > self._max_size and lru:
+            key = lru.pop(0)
+            size -= self._index.pop(key)["size"]
+            shutil.rmtree(os.path.join(self._path, key), ignore_errors=True)
+
+    #---------------------------------------------------------------------------
+    #
+    def _write_index(self):
+        """Atomically replaces the index file.
+        """
+        index = os.path.join(self._path, INDEX_FILE)
+        tmp = index + ".tmp"
+        f = open(tmp, "w")
+        json.dump(self._index, f)
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.rename(tmp, index)
@@ -128,3 +128,22 @@ class SimpleKernelTests(unittest.TestCase):
         k._bind_to_resource("stampede.tacc.utexas.edu")
         assert k.arguments == ['lsdm.py', '-f','config.ini','-c','tmpha.gro','-n','out.nn','-w','weight.w'], k.arguments
         assert k._cu_def_post_exec == None, k._cu_def_post_exec
+
+    #-------------------------------------------------------------------------
+    #
+    def test__namd_kernel(self):
+        """Tests that the NAMD kernel keeps the user's pre_exec when it is
+           bound more than once.
+        """
+        k = radical.ensemblemd.Kernel(name="md.namd")
+        k.arguments = ["input.namd"]
+        k.pre_exec = ["cp template.namd input.namd"]
+
+        k._bind_to_resource("xsede.stampede")
+        k._bind_to_resource("xsede.stampede")
+        assert k._cu_def_pre_exec == ["module load TACC && module load namd/2.9",
+                                      "cp template.namd input.namd"], k._cu_def_pre_exec
+
+        k._bind_to_resource("xsede.gordon")
+        assert k._cu_def_pre_exec == ["module load namd/2.9",
+                                      "cp template.namd input.namd"], k._cu_def_pre_exec
@@ -0,0 +1,55 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+
+#-----------------------------------------------------------------------------
+#
+class ReplicaExchangeBundlingTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__bundle_namd_units(self):
+        """ Tests merging of replica units into NAMD multi-copy units.
+        """
+        import radical.pilot
+        from radical.ensemblemd.exec_plugins.replica_exchange.bundling import bundle_namd_units
+
+        shared = {'source': 'staging:///alanin.psf',
+                  'target': 'alanin.psf',
+                  'action': radical.pilot.COPY}
+        cus = []
+        for r in range(5):
+            cu                = radical.pilot.ComputeUnitDescription()
+            cu.name           = "md ;1 ;{0}".format(r)
+            cu.executable     = "namd2"
+            cu.arguments      = ["alanin_{0}_1.namd".format(r)]
+            cu.cores          = 2
+            cu.pre_exec       = ["module load namd"]
+            cu.post_exec      = ["echo {0}".format(r)]
+            cu.input_staging  = [shared, "alanin_{0}_1.namd".format(r)]
+            cus.append(cu)
+
+        bundles = bundle_namd_units(cus, 2, 1)
+        assert len(bundles) == 3
+
+        bundle = bundles[0]
+        assert bundle.arguments[:3] == ["+replicas", "2", "bundle_1_0.namd"]
+        assert bundle.cores == 4
+        assert bundle.pre_exec[0] == "module load namd"
+        assert len(bundle.pre_exec) == 2
+        assert "alanin_0_1.namd alanin_1_1.namd" in bundle.pre_exec[1]
+        assert bundle.post_exec == ["echo 0", "echo 1"]
+        assert bundle.input_staging == [shared, "alanin_0_1.namd", "alanin_1_1.namd"]
+        assert bundles[2].arguments[1] == "1"
@@ -0,0 +1,49 @@
+""" Tests cases
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+#-----------------------------------------------------------------------------
+#
+class ReplicaExchangeCheckpointTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # clean up after ourselves
+        shutil.rmtree(self.tmpdir)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__checkpoint(self):
+        """ Tests that checkpointing is opt-in and that a replica that cannot
+            be pickled leaves the previous checkpoint intact.
+        """
+        import cPickle as pickle
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+        from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import write_checkpoint
+        from radical.ensemblemd.exec_plugins.replica_exchange.checkpoint import read_checkpoint
+
+        pattern = ReplicaExchange()
+        assert pattern.checkpoint_file is None
+
+        path = os.path.join(self.tmpdir, "re.chk")
+        replicas = [Replica(i) for i in range(2)]
+        write_checkpoint(path, 1, pattern, replicas, [(1, [(0, 1)])])
+
+        replicas[0].lock = threading.Lock()
+        with self.assertRaises((TypeError, pickle.PicklingError)):
+            write_checkpoint(path, 2, pattern, replicas, [])
+        assert os.listdir(self.tmpdir) == ["re.chk"]
+
+        pattern.add_replicas([Replica(i) for i in range(2)])
+        assert read_checkpoint(path, pattern)["cycle"] == 1
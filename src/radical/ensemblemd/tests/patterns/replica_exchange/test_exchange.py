@@ -0,0 +1,284 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+
+#-----------------------------------------------------------------------------
+#
+class ReplicaExchangeBulkExchangeTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__log_probabilities(self):
+        """ Tests the vectorized row probabilities against the per-pair loop.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import exchange_row_log_probabilities
+
+        n = 8
+        swap_matrix = np.outer(1.0 / np.linspace(0.6, 1.2, n),
+                               np.linspace(-120.0, -80.0, n))
+
+        for i in range(n):
+            log_p = exchange_row_log_probabilities(swap_matrix, range(n), range(n), i)
+            for j in range(n):
+                expected = -(swap_matrix[i][j] + swap_matrix[j][i] - \
+                             swap_matrix[i][i] - swap_matrix[j][j])
+                assert abs(log_p[j] - expected) < 1e-9
+
+    #-------------------------------------------------------------------------
+    #
+    def test__exchange_replicas(self):
+        """ Tests that metropolis exchange swaps every replica at most once
+            and that exchanges keep the parameters a permutation.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+        class TestPattern(ReplicaExchange):
+            def perform_swap(self, replica_i, replica_j):
+                replica_i.parameter, replica_j.parameter = \
+                    replica_j.parameter, replica_i.parameter
+
+        replicas = [Replica(i) for i in range(10)]
+        for r in replicas:
+            r.parameter = r.id
+
+        # all pairs are equally likely
+        swap_matrix = np.zeros((10, 10))
+
+        for method in ["independence", "metropolis"]:
+            pattern = TestPattern()
+            pattern.bulk_exchange = method
+            pairs = pattern.exchange_replicas(replicas, swap_matrix)
+
+            seen = [r.id for pair in pairs for r in pair]
+            if method == "metropolis":
+                assert len(seen) == len(set(seen))
+            assert sorted(r.parameter for r in replicas) == range(10)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__independence_statistics(self):
+        """ Tests that independence exchange swaps replicas as often as the
+            per-replica exchange() loop.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+        class TestPattern(ReplicaExchange):
+            def perform_swap(self, replica_i, replica_j):
+                replica_i.parameter, replica_j.parameter = \
+                    replica_j.parameter, replica_i.parameter
+
+            def exchange(self, r_i, replicas, swap_matrix):
+                # independence sampling as in the replica exchange usecases
+                ps = [np.exp(-(swap_matrix[r_i.sid][r_j.id] + swap_matrix[r_j.sid][r_i.id] - \
+                               swap_matrix[r_i.sid][r_i.id] - swap_matrix[r_j.sid][r_j.id]))
+                      for r_j in replicas]
+                return replicas[self.weighted_choice(ps)]
+
+        n = 6
+        cycles = 4000
+        # reduced energies of a temperature exchange, kT in kcal/mol
+        swap_matrix = np.outer(1.0 / np.linspace(0.596, 0.656, n),
+                               np.linspace(-120.0, -110.0, n))
+
+        rates = []
+        for method in [None, "independence"]:
+            replicas = [Replica(i) for i in range(n)]
+            for r in replicas:
+                r.sid = r.id
+                r.parameter = r.id
+
+            pattern = TestPattern()
+            pattern.bulk_exchange = method
+            pattern.random_seed = 3
+
+            # how often the replica at each position is exchanged
+            counts = np.zeros(n)
+            for c in range(cycles):
+                for r_i, r_j in pattern.exchange_replicas(replicas, swap_matrix):
+                    counts[r_i.id] += 1
+                    counts[r_j.id] += 1
+            rates.append(counts / cycles)
+
+        assert rates[0].min() > 0.2
+        assert np.abs(rates[0] - rates[1]).max() < 0.05
+
+    #-------------------------------------------------------------------------
+    #
+    def test__weighted_sampler(self):
+        """ Tests that sampled indices are in range and never have zero weight.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import WeightedSampler
+
+        weights = [0.0, 1.0, 0.0, 3.0, 0.0]
+        rng = np.random.RandomState(1)
+        idx = WeightedSampler(weights).sample(rng, size=10000)
+        assert set(idx) == set([1, 3])
+        assert 0.7 < np.mean(idx == 3) < 0.8
+
+    #-------------------------------------------------------------------------
+    #
+    def test__random_seed(self):
+        """ Tests that patterns with the same seed select the same partners.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+        class TestPattern(ReplicaExchange):
+            def perform_swap(self, replica_i, replica_j):
+                pass
+
+        replicas = [Replica(i) for i in range(50)]
+        swap_matrix = np.random.rand(50, 50)
+
+        selected = []
+        for run in range(2):
+            pattern = TestPattern()
+            pattern.bulk_exchange = "independence"
+            pattern.random_seed = 7
+            pairs = pattern.exchange_replicas(replicas, swap_matrix)
+            selected.append([(r_i.id, r_j.id) for r_i, r_j in pairs])
+
+        assert selected[0] == selected[1]
+
+    #-------------------------------------------------------------------------
+    #
+    def test__neighbour_pairs(self):
+        """ Tests even/odd and multi-dimensional neighbour pairing.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import neighbour_pairs
+
+        a, b = neighbour_pairs(range(6), [6], 0, 0)
+        assert list(a) == [0, 2, 4] and list(b) == [1, 3, 5]
+
+        a, b = neighbour_pairs(range(6), [6], 0, 1)
+        assert list(a) == [1, 3] and list(b) == [2, 4]
+
+        # 3 temperatures x 2 umbrellas: only pairs within one umbrella window
+        a, b = neighbour_pairs(range(6), [3, 2], 0, 0)
+        assert list(a) == [0, 1] and list(b) == [2, 3]
+
+        # ... and only pairs within one temperature
+        a, b = neighbour_pairs(range(6), [3, 2], 1, 0)
+        assert list(a) == [0, 2, 4] and list(b) == [1, 3, 5]
+
+    #-------------------------------------------------------------------------
+    #
+    def test__neighbour_exchange(self):
+        """ Tests that neighbour exchange moves replicas along the ladder.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+        class TestPattern(ReplicaExchange):
+            def perform_swap(self, replica_i, replica_j):
+                pass
+
+        replicas = [Replica(i) for i in range(4)]
+        for r in replicas:
+            r.sid = r.id
+
+        pattern = TestPattern()
+        pattern.bulk_exchange = "neighbours"
+
+        # all exchanges are accepted
+        swap_matrix = np.zeros((4, 4))
+        pattern.exchange_replicas(replicas, swap_matrix)
+        assert [r.sid for r in replicas] == [1, 0, 3, 2]
+        pattern.exchange_replicas(replicas, swap_matrix)
+        assert [r.sid for r in replicas] == [2, 0, 3, 1]
+
+    #-------------------------------------------------------------------------
+    #
+    def test__load_swap_data(self):
+        """ Tests reading the aggregated swap data file of a cycle.
+        """
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+        replicas = [Replica(i) for i in range(4)]
+        swap_matrix = np.arange(16, dtype=float).reshape(4, 4)
+
+        pattern = ReplicaExchange()
+        name = pattern.swap_data_file(0)
+        # row j of the file is column j of the swap matrix
+        swap_matrix.T.astype("<f8").tofile(name)
+        try:
+            assert (pattern.load_swap_data(0, replicas) == swap_matrix).all()
+        finally:
+            os.remove(name)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__replica_registry(self):
+        """ Tests that replica attributes are views of the registry columns.
+        """
+        import cPickle as pickle
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaRegistry
+
+        replicas = [Replica(i) for i in range(5)]
+        for r in replicas:
+            r.temperature = 300.0 + r.id
+            r.name = "r%d" % r.id
+
+        registry = ReplicaRegistry(replicas, {"id": np.int64,
+                                              "temperature": np.float64})
+        assert isinstance(replicas[0], Replica)
+        assert list(registry.column("temperature")) == [300.0, 301.0, 302.0, 303.0, 304.0]
+
+        registry.column("temperature")[:] += 10.0
+        replicas[1].temperature = 0.0
+        assert replicas[0].temperature == 310.0
+        assert registry.column("temperature")[1] == 0.0
+        assert replicas[2].name == "r2"
+
+        registry.swap(["temperature"], np.array([0, 2]), np.array([3, 4]))
+        assert list(registry.column("temperature")) == [313.0, 0.0, 314.0, 310.0, 312.0]
+
+        copy = pickle.loads(pickle.dumps(replicas[3]))
+        assert type(copy) is Replica
+        assert copy.temperature == 310.0 and copy.name == "r3"
+
+    #-------------------------------------------------------------------------
+    #
+    def test__registry_exchange(self):
+        """ Tests that swap_fields are exchanged without perform_swap().
+        """
+        from radical.ensemblemd.patterns.replica_exchange import Replica
+        from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+        class TestPattern(ReplicaExchange):
+            replica_fields = {"id": np.int64, "sid": np.int64,
+                              "temperature": np.float64}
+            swap_fields = ["temperature"]
+            bulk_exchange = "neighbours"
+
+        replicas = [Replica(i) for i in range(4)]
+        for r in replicas:
+            r.sid = r.id
+            r.temperature = 300.0 + 100 * r.id
+
+        pattern = TestPattern()
+        pattern.add_replicas(replicas)
+
+        # all exchanges are accepted
+        pairs = pattern.exchange_replicas(replicas, np.zeros((4, 4)))
+        assert len(pairs) == 2
+        assert [r.sid for r in replicas] == [1, 0, 3, 2]
+        assert [r.temperature for r in replicas] == [400.0, 300.0, 600.0, 500.0]
@@ -0,0 +1,113 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+from radical.ensemblemd.patterns.replica_exchange import Replica
+from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+
+
+#-----------------------------------------------------------------------------
+#
+class _TestPattern(ReplicaExchange):
+    # defined at module level, so the process pool can pickle it
+
+    def build_input_file(self, replica):
+        replica.input_file = "input_{0}.namd".format(replica.id)
+
+    def prepare_replica_for_md(self, replica):
+        return replica.input_file
+
+
+#-----------------------------------------------------------------------------
+#
+class ReplicaExchangePreparationTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__prepare_replicas(self):
+        """ Tests serial, thread and process pool replica preparation.
+        """
+        for workers, pool in [(None, "thread"), (4, "thread"), (2, "process")]:
+            replicas = [Replica(i) for i in range(10)]
+
+            pattern = _TestPattern()
+            pattern.preparation_workers = workers
+            pattern.preparation_pool = pool
+            prepared = list(pattern.prepare_replicas(replicas))
+
+            assert sorted(r.id for r, k in prepared) == range(10)
+            for r, kernel in prepared:
+                assert r in replicas
+                assert kernel == "input_{0}.namd".format(r.id)
+                assert r.input_file == kernel
+
+    #-------------------------------------------------------------------------
+    #
+    def test__unknown_pool(self):
+        """ Tests that an unknown preparation pool raises an error.
+        """
+        from radical.ensemblemd.exceptions import EnsemblemdError
+
+        pattern = _TestPattern()
+        pattern.preparation_workers = 2
+        pattern.preparation_pool = "cluster"
+        with self.assertRaises(EnsemblemdError):
+            list(pattern.prepare_replicas([Replica(0), Replica(1)]))
+
+    #-------------------------------------------------------------------------
+    #
+    def test__template_render_command(self):
+        """ Tests that input files rendered with sed match render_template().
+        """
+        import shutil
+        import tempfile
+        import subprocess
+        from radical.ensemblemd.patterns.replica_exchange import render_template
+        from radical.ensemblemd.patterns.replica_exchange import template_render_command
+
+        template = "temperature @nt@\noutput @somename@\nold @oldname@ @nt@\n"
+        parameters = {"nt": 300.5,
+                      "somename": "alanin_1_2",
+                      "oldname": "../staging_area/a|b&c\\d 'e'"}
+
+        workdir = tempfile.mkdtemp()
+        try:
+            f = open(os.path.join(workdir, "template.namd"), "w")
+            f.write(template)
+            f.close()
+
+            for values in [parameters, {}]:
+                cmd = template_render_command("template.namd", "input.namd", values)
+                subprocess.check_call(cmd, shell=True, cwd=workdir)
+
+                f = open(os.path.join(workdir, "input.namd"))
+                rendered = f.read()
+                f.close()
+                assert rendered == render_template(template, values)
+        finally:
+            shutil.rmtree(workdir)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__pickle_pattern(self):
+        """ Tests that patterns are pickled without their engine, as the
+            process pool does.
+        """
+        import cPickle as pickle
+
+        pattern = _TestPattern()
+        pattern.preparation_workers = 3
+        copy = pickle.loads(pickle.dumps(pattern, pickle.HIGHEST_PROTOCOL))
+        assert copy.preparation_workers == 3
+        assert copy._engine is pattern._engine
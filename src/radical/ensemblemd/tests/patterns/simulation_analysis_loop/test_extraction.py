@@ -0,0 +1,75 @@
+""" Tests cases
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from radical.ensemblemd.patterns.simulation_analysis_loop import SimulationAnalysisLoop
+
+#-----------------------------------------------------------------------------
+#
+class SimulationAnalysisLoopExtractionTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # clean up after ourselves
+        shutil.rmtree(self.workdir)
+
+    def _write_script(self, name, content):
+        path = os.path.join(self.workdir, name)
+        f = open(path, "w")
+        f.write(content)
+        f.close()
+        return path
+
+    #-------------------------------------------------------------------------
+    #
+    def test__extraction_function(self):
+        """ Tests extraction with a callable and with a module name.
+        """
+        sal = SimulationAnalysisLoop(1, adaptive_simulation=True,
+                                     sim_extraction_function=lambda out: len(out.split()))
+        assert sal.get_new_simulation_instances("a b c") == 3
+
+        sal.sim_extraction_function = "string:atoi"
+        assert sal.get_new_simulation_instances("12") == 12
+
+    #-------------------------------------------------------------------------
+    #
+    def test__extraction_script(self):
+        """ Tests in-process loading of scripts and the subprocess fallback.
+        """
+        output = "header\n8\n"
+
+        script = self._write_script("extract_fn.py",
+            "import sys\n\n"
+            "def extract(output):\n"
+            "    return int(output.splitlines()[1]) * 2\n\n"
+            "if __name__ == '__main__':\n"
+            "    print extract(sys.stdin.read())\n")
+        sal = SimulationAnalysisLoop(1, adaptive_simulation=True, sim_extraction_script=script)
+        assert sal.get_new_simulation_instances(output) == 16
+        assert sal._extraction_function is not None
+
+        script = self._write_script("extract_stdin.py",
+            "import sys\n\n"
+            "if __name__ == '__main__':\n"
+            "    print sys.stdin.readlines()[1].strip()\n")
+        sal = SimulationAnalysisLoop(1, adaptive_simulation=True, sim_extraction_script=script)
+        assert sal.get_new_simulation_instances(output) == 8
+
+        # without an extract function the script is never imported
+        script = self._write_script("extract_unguarded.py",
+            "import sys\n"
+            "print sys.stdin.read().split()[1]\n")
+        sal = SimulationAnalysisLoop(1, adaptive_simulation=True, sim_extraction_script=script)
+        assert sal.get_new_simulation_instances(output) == 8
+        assert sal.get_new_simulation_instances("header 5") == 5
+        assert sal._extraction_function is None
+        assert script not in [getattr(m, "__file__", None) for m in sys.modules.values()]
@@ -0,0 +1,130 @@
+""" Tests cases
+"""
+import os
+import sys
+import logging
+import tempfile
+import unittest
+
+from radical.ensemblemd.emulator import EmulationModel, EmulatedPilot, EmulatedUnitManager
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, name, cores=1):
+        self.name = name
+        self.cores = cores
+        self.input_staging = None
+        self.output_staging = None
+
+#-----------------------------------------------------------------------------
+#
+class EmulatorTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    def _umgr(self, model, cores=10, walltime=60):
+        pilot = EmulatedPilot("pilot.0000", "xsede.stampede", cores, walltime, "/emulated/pilot.0000/")
+        return EmulatedUnitManager(pilot, model, logging.getLogger("test"))
+
+    #-------------------------------------------------------------------------
+    #
+    def test__makespan(self):
+        """ Tests the virtual makespan and utilization of a bag of tasks.
+        """
+        import radical.pilot
+
+        umgr = self._umgr(EmulationModel(duration=10, queue_wait=50, launch_overhead=0))
+        units = umgr.submit_units([_Description("t{0}".format(i)) for i in range(100)])
+        states = umgr.wait_units([u.uid for u in units])
+        umgr.close()
+
+        assert states == [radical.pilot.DONE] * 100
+        m = umgr.metrics
+        assert m["queue_wait"] == 50
+        assert 150 <= m["makespan"] < 151
+        assert m["utilization"] > 0.99
+        assert m["done"] == 100
+
+    #-------------------------------------------------------------------------
+    #
+    def test__callbacks_and_timeout(self):
+        """ Tests that units submitted by callbacks run and that timeouts
+            advance the virtual clock.
+        """
+        import radical.pilot
+
+        umgr = self._umgr(EmulationModel(duration=[5, 20]), cores=1)
+
+        def cb(unit, state):
+            if state == radical.pilot.DONE and unit.name == "first":
+                umgr.submit_units(_Description("second"))
+        umgr.register_callback(cb)
+
+        first = umgr.submit_units(_Description("first"))
+        assert umgr.wait_units(first.uid, timeout=1) == radical.pilot.EXECUTING
+        assert 1 <= umgr.now < 2
+
+        umgr.wait_units()
+        umgr.wait_units()
+        assert [u.name for u in umgr.get_units()] == ["first", "second"]
+        assert 25.2 <= umgr.now < 26
+
+    #-------------------------------------------------------------------------
+    #
+    def test__walltime(self):
+        """ Tests that units still running at the end of the walltime fail.
+        """
+        import radical.pilot
+
+        umgr = self._umgr(EmulationModel(duration=100), walltime=1)
+        unit = umgr.submit_units(_Description("long"))
+        assert umgr.wait_units(unit.uid) == radical.pilot.FAILED
+        assert "walltime" in unit.stderr
+
+    #-------------------------------------------------------------------------
+    #
+    def test__from_profile(self):
+        """ Tests that durations are replayed from an execution profile.
+        """
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as f:
+            f.write("uid, stage, Scheduling, Executing, AgentStagingOutputPending, Done\n\n")
+            f.write("unit.0000, stage_1, 2016-01-01 10:00:00.000000, 2016-01-01 10:00:01.000000, 2016-01-01 10:00:31.500000, None\n")
+            f.write("unit.0001, stage_1, 1.0, 2.0, None, 12.0\n")
+
+        try:
+            model = EmulationModel.from_profile(path, queue_wait=5)
+        finally:
+            os.remove(path)
+
+        assert model.duration == [30.5, 10.0]
+        assert model.queue_wait == 5
+        assert [model.task_duration(None) for i in range(3)] == [30.5, 10.0, 30.5]
+
+        # the profile of the Profiler
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'w') as f:
+            f.write("# epoch 1451642400.000000 at timestamp 10.000000\n")
+            f.write("pattern,stage,iteration,instance,probe,timestamp\n")
+            f.write("sal,simulation,1,,start,10.000000\n")
+            f.write("sal,simulation,1,unit.0000,Executing,11.000000\n")
+            f.write("sal,simulation,1,unit.0000,StagingOutput,31.000000\n")
+            f.write("sal,simulation,1,unit.0000,Done,32.000000\n")
+            f.write("sal,simulation,1,unit.0001,Executing,12.000000\n")
+            f.write("sal,simulation,1,unit.0001,Done,17.500000\n")
+
+        try:
+            model = EmulationModel.from_profile(path)
+        finally:
+            os.remove(path)
+
+        assert model.duration == [20.0, 5.5]
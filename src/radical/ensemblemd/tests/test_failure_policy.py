@@ -0,0 +1,138 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+from radical.ensemblemd.failure_policy import FailurePolicy
+
+#-----------------------------------------------------------------------------
+#
+class _Unit(object):
+
+    def __init__(self, uid, description, state):
+        self.uid = uid
+        self.name = description
+        self.state = state
+        self.stderr = "error"
+
+
+class _UnitManager(object):
+    # units of a description fail for the given number of attempts
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.submitted = []
+
+    def submit_units(self, descriptions):
+        import radical.pilot
+        if not isinstance(descriptions, list):
+            return self.submit_units([descriptions])[0]
+        units = []
+        for d in descriptions:
+            state = radical.pilot.DONE
+            if self.failures.get(d, 0) > 0:
+                self.failures[d] -= 1
+                state = radical.pilot.FAILED
+            units.append(_Unit("unit.{0}".format(len(self.submitted)), d, state))
+            self.submitted.append(d)
+        return units
+
+    def wait_units(self, uids):
+        pass
+
+
+class _Pilot(object):
+
+    def __init__(self):
+        import radical.pilot
+        self.state = radical.pilot.ACTIVE
+
+
+class _Resource(object):
+
+    def __init__(self, failures):
+        self._umgr = _UnitManager(failures)
+        self._pilots = [_Pilot()]
+
+#-----------------------------------------------------------------------------
+#
+class FailurePolicyTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__policy(self):
+        """ Tests retries, backoff and the abort fraction of a policy.
+        """
+        policy = FailurePolicy()
+        assert policy.retry(1) is False
+        assert policy.abort(1, 100) is True
+
+        policy = FailurePolicy(max_retries=2, backoff=1, backoff_factor=3,
+                               max_backoff=5, max_failure_fraction=0.01)
+        assert policy.retry(2) is True
+        assert policy.retry(3) is False
+        assert [policy.delay(a) for a in (1, 2, 3)] == [1, 3, 5]
+        assert policy.abort(1, 100) is False
+        assert policy.abort(2, 100) is True
+
+        with self.assertRaises(EnsemblemdError):
+            FailurePolicy(max_failure_fraction=2)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__failure_handler(self):
+        """ Tests resubmission of failed units from their descriptions.
+        """
+        from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+        import logging
+
+        resource = _Resource({"b": 2, "d": 5})
+        policy = FailurePolicy(max_retries=2, max_failure_fraction=0.25)
+        handler = FailureHandler(resource, policy, logging.getLogger("test"))
+
+        units = handler.wait_units(handler.submit_units(["a", "b", "c", "d"]))
+        assert [u.name for u in units] == ["a", "b", "c", "d"]
+        assert units[1].uid == "unit.6"
+        assert resource._umgr.submitted == ["a", "b", "c", "d", "b", "d", "b", "d"]
+        assert handler.retried == 4
+        assert handler.given_up == 1
+
+        resource._umgr.failures = {"e": 5}
+        with self.assertRaises(EnsemblemdError):
+            handler.wait_units([handler.submit_units("e")])
+
+    #-------------------------------------------------------------------------
+    #
+    def test__retry_unit(self):
+        """ Tests that retry_unit() schedules the resubmission after the
+            backoff instead of blocking the callback.
+        """
+        import time
+        import logging
+        from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+
+        resource = _Resource({"a": 1})
+        policy = FailurePolicy(max_retries=1, backoff=0.2)
+        handler = FailureHandler(resource, policy, logging.getLogger("test"))
+
+        unit = handler.submit_units("a")
+        start = time.time()
+        assert handler.retry_unit(unit) == 1
+        assert time.time() - start < 0.1
+        assert resource._umgr.submitted == ["a"]
+
+        handler.wait_retries()
+        assert time.time() - start >= 0.2
+        assert resource._umgr.submitted == ["a", "a"]
+        assert handler.retried == 1
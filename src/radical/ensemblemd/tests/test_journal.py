@@ -0,0 +1,103 @@
+""" Tests cases
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from radical.ensemblemd.exec_plugins.journal import Journal
+from radical.ensemblemd.exec_plugins.journal import open_journal
+from radical.ensemblemd.exec_plugins.journal import replay_journal
+
+#-----------------------------------------------------------------------------
+#
+class _Object(object):
+    pass
+
+#-----------------------------------------------------------------------------
+#
+class JournalTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, "run.journal")
+
+    def tearDown(self):
+        # clean up after ourselves
+        shutil.rmtree(self.workdir)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__append_replay(self):
+        """ Tests that records are replayed in order and torn records ignored.
+        """
+        journal = Journal(self.path)
+        journal.append({'stage': 'pre_loop', 'working_dirs': {'pre_loop': '/a'}})
+        journal.append({'stage': 'iteration_1/simulation', 'iteration': 'iteration_1',
+                        'working_dirs': {'simulation_1': '/b'}})
+
+        f = open(self.path, 'a')
+        f.write('{"stage": "iteration_1/ana')
+        f.close()
+
+        records = replay_journal(self.path)
+        assert [r['stage'] for r in records] == ['pre_loop', 'iteration_1/simulation']
+        assert records[1]['working_dirs'] == {'simulation_1': '/b'}
+
+    #-------------------------------------------------------------------------
+    #
+    def test__open_journal(self):
+        """ Tests starting a new journal and resuming an existing one.
+        """
+        pattern = _Object()
+        resource = _Object()
+
+        pattern.checkpoint_file = None
+        assert open_journal(pattern, resource) == (None, [])
+
+        Journal(self.path).append({'stage': 'stage_1', 'working_dirs': {}})
+
+        resource._resume = self.path
+        journal, records = open_journal(pattern, resource)
+        assert journal.path == self.path
+        assert len(records) == 1
+
+        resource._resume = None
+        pattern.checkpoint_file = self.path
+        journal, records = open_journal(pattern, resource)
+        assert records == []
+        assert not os.path.exists(self.path)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__resume_torn(self):
+        """ Tests that a run can be resumed repeatedly after a torn write.
+        """
+        pattern = _Object()
+        resource = _Object()
+        resource._resume = self.path
+
+        Journal(self.path).append({'stage': 'stage_1', 'working_dirs': {}})
+        f = open(self.path, 'a')
+        f.write('{"stage": "stage_2", "wor')
+        f.close()
+
+        journal, records = open_journal(pattern, resource)
+        assert [r['stage'] for r in records] == ['stage_1']
+        journal.append({'stage': 'stage_2', 'working_dirs': {}})
+
+        journal, records = open_journal(pattern, resource)
+        assert [r['stage'] for r in records] == ['stage_1', 'stage_2']
+        journal.append({'stage': 'stage_3', 'working_dirs': {}})
+
+        records = replay_journal(self.path)
+        assert [r['stage'] for r in records] == ['stage_1', 'stage_2', 'stage_3']
+
+        # journals torn by earlier versions are still replayed
+        f = open(self.path, 'a')
+        f.write('{"stage": "stage_4", "wor{"stage": "stage_4"}\n')
+        f.close()
+        assert len(replay_journal(self.path)) == 3
@@ -0,0 +1,78 @@
+""" Tests cases
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import radical.ensemblemd
+
+#-----------------------------------------------------------------------------
+#
+class _Pipeline(radical.ensemblemd.EoP):
+
+    def stage_1(self, instance):
+        k = radical.ensemblemd.Kernel(name="misc.mkfile")
+        k.arguments = ["--size=1000", "--filename=asciifile.dat"]
+        return k
+
+    def stage_2(self, instance):
+        k = radical.ensemblemd.Kernel(name="misc.ccount")
+        k.arguments = ["--inputfile=asciifile.dat", "--outputfile=cfreqs.dat"]
+        k.link_input_data = "$STAGE_1/asciifile.dat"
+        k.download_output_data = "cfreqs.dat > pipeline-{0}.dat".format(instance)
+        return k
+
+
+class _Loop(radical.ensemblemd.SimulationAnalysisLoop):
+
+    def simulation_stage(self, iteration, instance):
+        k = radical.ensemblemd.Kernel(name="misc.mkfile")
+        k.arguments = ["--size=1000", "--filename=asciifile.dat"]
+        return k
+
+    def analysis_stage(self, iteration, instance):
+        k = radical.ensemblemd.Kernel(name="misc.ccount")
+        k.arguments = ["--inputfile=asciifile.dat", "--outputfile=cfreqs.dat"]
+        k.link_input_data = "$PREV_SIMULATION_INSTANCE_1/asciifile.dat"
+        k.download_output_data = "cfreqs.dat > loop-{0}-{1}.dat".format(iteration, instance)
+        return k
+
+#-----------------------------------------------------------------------------
+#
+class LocalEnvironmentTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+
+        self.cluster = radical.ensemblemd.LocalEnvironment(cores=2, cleanup=True)
+        self.cluster.allocate()
+
+    def tearDown(self):
+        # clean up after ourselves
+        self.cluster.deallocate()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__pipeline(self):
+        """ Tests that a Pipeline runs on a LocalEnvironment.
+        """
+        self.cluster.run(_Pipeline(stages=2, tasks=2))
+        for task in [1, 2]:
+            assert os.path.getsize("pipeline-{0}.dat".format(task)) > 0
+
+    #-------------------------------------------------------------------------
+    #
+    def test__simulation_analysis_loop(self):
+        """ Tests that a SimulationAnalysisLoop runs on a LocalEnvironment.
+        """
+        self.cluster.run(_Loop(iterations=2, simulation_instances=1, analysis_instances=1))
+        for iteration in [1, 2]:
+            assert os.path.getsize("loop-{0}-1.dat".format(iteration)) > 0
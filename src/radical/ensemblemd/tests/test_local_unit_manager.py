@@ -0,0 +1,106 @@
+""" Tests cases
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, executable, arguments=None, cores=1,
+                 input_staging=None, output_staging=None):
+        self.name = executable
+        self.executable = executable
+        self.arguments = arguments
+        self.cores = cores
+        self.mpi = False
+        self.pre_exec = None
+        self.post_exec = None
+        self.input_staging = input_staging
+        self.output_staging = output_staging
+
+#-----------------------------------------------------------------------------
+#
+class LocalUnitManagerTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        from radical.ensemblemd.local_unit_manager import LocalPilot, LocalUnitManager
+
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+
+        self.pilot = LocalPilot("pilot.0000", "local.localhost", 2, os.path.join(self.workdir, "sandbox"))
+        self.umgr = LocalUnitManager(self.pilot, logging.getLogger("test"))
+
+    def tearDown(self):
+        # clean up after ourselves
+        self.umgr.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__staging(self):
+        """ Tests that units stage their data through the local sandbox.
+        """
+        import radical.pilot
+
+        with open("input.txt", "w") as f:
+            f.write("hello\n")
+        self.pilot.stage_in({'source': 'input.txt', 'target': 'staging:///shared.txt',
+                             'action': radical.pilot.LINK})
+
+        cud = _Description("/bin/cat", ["in.txt", "shared.txt", ">", "out.txt"],
+            input_staging=["input.txt > in.txt",
+                           {'source': 'staging:///shared.txt', 'target': 'shared.txt',
+                            'action': radical.pilot.LINK}],
+            output_staging=[{'source': 'out.txt', 'target': 'result.txt',
+                             'action': radical.pilot.TRANSFER}])
+
+        unit = self.umgr.submit_units(cud)
+        assert self.umgr.wait_units(unit.uid) == radical.pilot.DONE
+        assert open("result.txt").read() == "hello\nhello\n"
+        assert not os.path.islink("result.txt")
+        assert os.path.islink(os.path.join(unit.working_directory, "in.txt"))
+
+    #-------------------------------------------------------------------------
+    #
+    def test__cores(self):
+        """ Tests that no more units run at once than cores are available.
+        """
+        import radical.pilot
+
+        running = []
+        def cb(unit, state):
+            if state == radical.pilot.EXECUTING:
+                running.append(len([u for u in self.umgr.get_units() if u.state == radical.pilot.EXECUTING]))
+        self.umgr.register_callback(cb)
+
+        units = self.umgr.submit_units([_Description("/bin/sleep", ["0.2"]) for i in range(4)]
+                                       + [_Description("/bin/true", cores=3)])
+        states = self.umgr.wait_units([u.uid for u in units])
+        assert states == [radical.pilot.DONE] * 4 + [radical.pilot.FAILED]
+        assert max(running) <= 2
+
+    #-------------------------------------------------------------------------
+    #
+    def test__failure_and_cancel(self):
+        """ Tests that failing units fail and that units can be canceled.
+        """
+        import radical.pilot
+
+        failing = self.umgr.submit_units(_Description("/bin/ls", ["/does/not/exist"]))
+        sleeping = self.umgr.submit_units(_Description("/bin/sleep", ["30"]))
+        self.umgr.wait_units(sleeping.uid, state=radical.pilot.EXECUTING, timeout=10)
+        self.umgr.cancel_units(sleeping.uid)
+
+        states = self.umgr.wait_units([failing.uid, sleeping.uid], timeout=10)
+        assert states == [radical.pilot.FAILED, radical.pilot.CANCELED]
+        assert "exist" in failing.stderr
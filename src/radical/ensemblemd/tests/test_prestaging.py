@@ -0,0 +1,105 @@
+""" Tests cases
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+import unittest
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, input_staging):
+        self.input_staging = input_staging
+
+
+class _Pilot(object):
+
+    def __init__(self):
+        import radical.pilot
+        self.state = radical.pilot.PENDING_ACTIVE
+        self.staged = []
+
+    def stage_in(self, directives):
+        self.staged += directives
+
+
+class _Resource(object):
+
+    def __init__(self):
+        self._pilots = [_Pilot()]
+        self._resource_key = "xsede.stampede"
+        self._hidden_time = 0.0
+        self.waited = 0
+
+    def _wait_active(self):
+        import radical.pilot
+        self.waited += 1
+        self._pilots[0].state = radical.pilot.ACTIVE
+        return self._pilots[0]
+
+#-----------------------------------------------------------------------------
+#
+class PreStagerTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        fd, self.path = tempfile.mkstemp(suffix=".dat")
+        os.close(fd)
+
+    def tearDown(self):
+        # clean up after ourselves
+        os.remove(self.path)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__prestage(self):
+        """ Tests that uploads are pre-staged while the pilot is queued.
+        """
+        import radical.pilot
+        from radical.ensemblemd.exec_plugins.prestaging import PreStager
+
+        resource = _Resource()
+        prestager = PreStager(resource, logging.getLogger("test"))
+        time.sleep(0.05)
+
+        cuds = [_Description(["{0} > in.dat".format(self.path),
+                              {'source': 'staging:///shared.dat', 'target': 'shared.dat',
+                               'action': radical.pilot.LINK}]),
+                _Description([{'source': self.path, 'target': 'other.dat',
+                               'action': radical.pilot.TRANSFER}])]
+        prestager.release(cuds)
+        prestager.release(cuds)
+
+        assert resource.waited == 1
+        assert resource._hidden_time >= 0.05
+
+        staged = resource._pilots[0].staged
+        assert len(staged) == 1
+        assert staged[0]['target'] == 'staging:///prestaged/0/{0}'.format(os.path.basename(self.path))
+
+        assert cuds[0].input_staging[0] == {'source': staged[0]['target'], 'target': 'in.dat',
+                                            'action': radical.pilot.COPY}
+        assert cuds[0].input_staging[1]['action'] == radical.pilot.LINK
+        assert cuds[1].input_staging[0]['source'] == staged[0]['target']
+
+    #-------------------------------------------------------------------------
+    #
+    def test__active(self):
+        """ Tests that nothing is pre-staged or hidden on an active pilot.
+        """
+        import radical.pilot
+        from radical.ensemblemd.exec_plugins.prestaging import PreStager
+
+        resource = _Resource()
+        resource._pilots[0].state = radical.pilot.ACTIVE
+
+        cud = _Description(["{0} > in.dat".format(self.path)])
+        PreStager(resource, logging.getLogger("test")).release(cud)
+
+        assert resource._pilots[0].staged == []
+        assert resource._hidden_time == 0.0
+        assert cud.input_staging == ["{0} > in.dat".format(self.path)]
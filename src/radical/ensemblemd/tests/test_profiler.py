@@ -0,0 +1,97 @@
+""" Tests cases
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+from radical.ensemblemd.profiler import Profiler, FIELDS
+
+#-----------------------------------------------------------------------------
+#
+class _State(object):
+
+    def __init__(self, state, timestamp):
+        self.state = state
+        self.timestamp = timestamp
+
+
+class _Unit(object):
+
+    def __init__(self, uid, state_history):
+        self.uid = uid
+        self.state_history = state_history
+
+
+class _Clock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+#-----------------------------------------------------------------------------
+#
+class ProfilerTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__ring_buffer(self):
+        """ Tests that the oldest events are overwritten.
+        """
+        profiler = Profiler(enabled=True, capacity=3, clock=_Clock(0.0))
+        for i in range(5):
+            profiler.prof("sal", "simulation", "start", iteration=i)
+
+        assert profiler.recorded == 5
+        assert profiler.dropped == 2
+        assert [e[2] for e in profiler.events()] == [2, 3, 4]
+        assert profiler.events()[0] == ("sal", "simulation", 2, None, "start", 4.0)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__disabled(self):
+        """ Tests that a disabled profiler does not record anything.
+        """
+        profiler = Profiler(enabled=False)
+        profiler.prof("sal", "simulation", "start")
+        profiler.prof_states("sal", "simulation", _Unit("unit.0000", [_State("Done", 1.0)]))
+
+        assert profiler.recorded == 0
+        assert profiler.events() == []
+
+    #-------------------------------------------------------------------------
+    #
+    def test__states_and_write(self):
+        """ Tests that state histories are related to the profiler clock and
+            that the profile is written with a single schema.
+        """
+        profiler = Profiler(enabled=True, clock=_Clock(99.0), wallclock=lambda: 1000.0)
+        unit = _Unit("unit.0000", [_State("Executing", 1010.0), _State("Done", 1030.5)])
+        profiler.prof_states("re", "md_step", unit, iteration=1)
+
+        assert profiler.events() == [("re", "md_step", 1, "unit.0000", "Executing", 110.0),
+                                     ("re", "md_step", 1, "unit.0000", "Done", 130.5)]
+
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        try:
+            profiler.write(path)
+            lines = open(path).read().splitlines()
+        finally:
+            os.remove(path)
+
+        assert lines[0] == "# epoch 1000.000000 at timestamp 100.000000"
+        assert lines[1] == ",".join(FIELDS)
+        assert lines[2] == "re,md_step,1,unit.0000,Executing,110.000000"
@@ -0,0 +1,49 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+from radical.ensemblemd.resize_policy import ResizePolicy
+
+#-----------------------------------------------------------------------------
+#
+class ResizePolicyTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__grow(self):
+        """ Tests the cores added for a growing core demand.
+        """
+        policy = ResizePolicy(threshold=0.25, min_pilot_cores=16, max_cores=128)
+
+        assert policy.grow(64, 64) == 0
+        assert policy.grow(64, 80) == 0
+        assert policy.grow(64, 96) == 32
+        assert policy.grow(64, 82) == 18
+        assert policy.grow(120, 160) == 8
+        assert policy.grow(128, 256) == 0
+
+        policy = ResizePolicy(threshold=0.0, min_pilot_cores=16)
+        assert policy.grow(64, 65) == 16
+
+    #-------------------------------------------------------------------------
+    #
+    def test__shrink(self):
+        """ Tests the extra pilots cancelled for a shrinking core demand.
+        """
+        policy = ResizePolicy(threshold=0.25)
+
+        assert policy.shrink(96, 80, [16, 16]) == []
+        assert policy.shrink(96, 32, [16, 16]) == [1, 0]
+        assert policy.shrink(96, 56, [32, 16]) == [1]
+        assert policy.shrink(112, 70, [16, 32]) == [1]
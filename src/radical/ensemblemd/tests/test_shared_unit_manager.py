@@ -0,0 +1,245 @@
+""" Tests cases
+"""
+import os
+import sys
+import logging
+import unittest
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, name, cores=1):
+        self.name = name
+        self.cores = cores
+
+
+class _Unit(object):
+
+    def __init__(self, uid, description):
+        import radical.pilot
+        self.uid = uid
+        self.name = description.name
+        self.state = radical.pilot.NEW
+
+
+class _UnitManager(object):
+    """Reports the scheduling of units while they are submitted, like the
+    local unit manager, and completes them on request.
+    """
+
+    def __init__(self):
+        self.units = []
+        self.callbacks = []
+
+    def register_callback(self, cb):
+        self.callbacks.append(cb)
+
+    def submit_units(self, descriptions):
+        import radical.pilot
+        units = []
+        for cud in descriptions:
+            unit = _Unit("unit.{0:04d}".format(len(self.units)), cud)
+            self.units.append(unit)
+            self._set_state(unit, radical.pilot.SCHEDULING)
+            units.append(unit)
+        return units
+
+    def complete(self, unit):
+        import radical.pilot
+        self._set_state(unit._unit, radical.pilot.DONE)
+
+    def cancel_units(self, uids):
+        import radical.pilot
+        for unit in self.units:
+            if unit.uid in uids:
+                self._set_state(unit, radical.pilot.CANCELED)
+
+    def _set_state(self, unit, state):
+        unit.state = state
+        for cb in self.callbacks:
+            cb(unit, state)
+
+
+class _Resource(object):
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+
+#-----------------------------------------------------------------------------
+#
+class SharedUnitManagerTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__shares(self):
+        """ Tests the max-min fair shares of the FairSharePolicy.
+        """
+        from radical.ensemblemd.fair_share_policy import FairSharePolicy
+
+        policy = FairSharePolicy()
+        assert policy.shares(8, {'a': 1, 'b': 10}, {'a': 1, 'b': 1}) == {'a': 1.0, 'b': 7.0}
+        assert policy.shares(9, {'a': 10, 'b': 10}, {'a': 2, 'b': 1}) == {'a': 6.0, 'b': 3.0}
+        assert policy.shares(8, {'a': 0, 'b': 10}, {'a': 1, 'b': 1}) == {'a': 0.0, 'b': 8.0}
+
+        policy = FairSharePolicy(work_conserving=False)
+        assert policy.shares(8, {'a': 1, 'b': 10}, {'a': 1, 'b': 1}) == {'a': 4.0, 'b': 4.0}
+
+    #-------------------------------------------------------------------------
+    #
+    def test__fair_share(self):
+        """ Tests that units are held beyond the share of their run and that
+            callbacks only see the units of their run.
+        """
+        import radical.pilot
+        from radical.ensemblemd.shared_unit_manager import SharedUnitManager
+
+        umgr = _UnitManager()
+        shared = SharedUnitManager(umgr, _Resource(4), None, logging.getLogger("test"))
+        a = shared.add()
+        b = shared.add()
+
+        seen = {'a': [], 'b': []}
+        a.register_callback(lambda unit, state: seen['a'].append((unit.name, state)))
+        b.register_callback(lambda unit, state: seen['b'].append((unit.name, state)))
+
+        units_a = a.submit_units([_Description("a{0}".format(i)) for i in range(8)])
+        assert len(umgr.units) == 4
+
+        units_b = b.submit_units([_Description("b{0}".format(i)) for i in range(4)])
+        assert len(umgr.units) == 4
+        assert units_b[0].state == radical.pilot.NEW
+
+        umgr.complete(units_a[0])
+        umgr.complete(units_a[1])
+        assert [u.name for u in umgr.units[4:]] == ["b0", "b1"]
+        assert units_b[0].state == radical.pilot.SCHEDULING
+
+        # the other run ended, its share goes to the remaining one
+        b.cancel_units()
+        shared.remove(b)
+        assert [u.name for u in umgr.units[6:]] == ["a4", "a5"]
+
+        assert ("a0", radical.pilot.SCHEDULING) in seen['a']
+        assert [n for n, s in seen['a'] if s == radical.pilot.DONE] == ["a0", "a1"]
+        assert [n for n, s in seen['b']] == ["b0", "b1", "b0", "b1", "b2", "b3"]
+        assert [s for n, s in seen['b'][2:]] == [radical.pilot.CANCELED] * 4
+        assert a.list_units()[0] == "run.0000.unit.000000"
+
+    #-------------------------------------------------------------------------
+    #
+    def test__callbacks_unlocked(self):
+        """ Tests that a callback of one run does not hold up the callbacks
+            of another run.
+        """
+        import threading
+        import radical.pilot
+        from radical.ensemblemd.shared_unit_manager import SharedUnitManager
+
+        umgr = _UnitManager()
+        shared = SharedUnitManager(umgr, _Resource(4), None, logging.getLogger("test"))
+        a = shared.add()
+        b = shared.add()
+
+        entered = threading.Event()
+        seen_b = threading.Event()
+        result = []
+
+        def slow_cb(unit, state):
+            if state == radical.pilot.DONE:
+                entered.set()
+                seen_b.wait(2.0)
+                result.append(seen_b.is_set())
+
+        a.register_callback(slow_cb)
+        b.register_callback(lambda unit, state: state == radical.pilot.DONE and seen_b.set())
+
+        unit_a = a.submit_units(_Description("a0"))
+        unit_b = b.submit_units(_Description("b0"))
+
+        thread = threading.Thread(target=umgr.complete, args=(unit_a,))
+        thread.start()
+        entered.wait(2.0)
+        umgr.complete(unit_b)
+        thread.join()
+        assert result == [True]
+
+    #-------------------------------------------------------------------------
+    #
+    def test__plugin_state(self):
+        """ Tests that concurrent runs get execution plugins with their own
+            working directories and task counters.
+        """
+        import threading
+        from radical.ensemblemd.engine import get_engine
+
+        plugins = {}
+
+        def run(name, pattern):
+            plugin = get_engine().get_execution_plugin_for_pattern(pattern, "Static", None)
+            plugins[(name, pattern)] = plugin
+            plugin.working_dirs["stage_1"] = {"task_1": name}
+            if pattern == "Pipeline":
+                plugin.tot_fin_tasks[0] += 1
+
+        threads = []
+        for pattern in ("Pipeline", "SimulationAnalysisLoop"):
+            for name in ("run.0000", "run.0001"):
+                threads.append(threading.Thread(target=run, args=(name, pattern)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(id(p) for p in plugins.values())) == 4
+        for (name, pattern), plugin in plugins.items():
+            assert plugin.working_dirs == {"stage_1": {"task_1": name}}
+            if pattern == "Pipeline":
+                assert plugin.tot_fin_tasks == [1]
+
+    #-------------------------------------------------------------------------
+    #
+    def test__run_walltime(self):
+        """ Tests that runs started with run_async() count the walltime from
+            the activation of the shared pilot, not from their own start.
+        """
+        import time
+        import radical.pilot
+        from radical.ensemblemd.execution_context import ExecutionContext
+        from radical.ensemblemd.execution_pattern import ExecutionPattern
+        from radical.ensemblemd.local_unit_manager import LocalSession, LocalState
+
+        class _Pilot(object):
+            state = radical.pilot.ACTIVE
+            state_history = [LocalState(radical.pilot.ACTIVE, time.time() - 120)]
+
+        class _Context(ExecutionContext):
+            capacity = 4
+
+            def __init__(self):
+                ExecutionContext.__init__(self)
+                self._allocate_called = True
+                self._walltime = 10
+                self._pilots = [_Pilot()]
+                self._umgr = _UnitManager()
+                self._session = LocalSession("test")
+                self.seen = []
+
+            def get_logger(self):
+                return logging.getLogger("test")
+
+            def run(self, pattern, force_plugin=None, resume=None):
+                self.seen.append(self.remaining_walltime)
+
+        context = _Context()
+        context.run_async(ExecutionPattern()).wait()
+        assert 470 < context.seen[0] <= 480
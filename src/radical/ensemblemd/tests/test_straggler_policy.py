@@ -0,0 +1,152 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+from radical.ensemblemd.straggler_policy import StragglerPolicy
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.cores = 1
+
+
+class _Unit(object):
+
+    def __init__(self, uid, name, start, duration):
+        import radical.pilot
+        self.uid = uid
+        self.name = name
+        self.state = radical.pilot.EXECUTING
+        self.stderr = None
+        self.start = start
+        self.duration = duration
+
+
+class _UnitManager(object):
+    # units execute for the given durations of their description, a clock
+    # advances while units are waited for
+
+    def __init__(self, durations):
+        self.durations = durations
+        self.units = []
+        self.canceled = []
+        self.now = 0
+
+    def time(self):
+        return self.now
+
+    def submit_units(self, descriptions):
+        if not isinstance(descriptions, list):
+            return self.submit_units([descriptions])[0]
+        units = []
+        for d in descriptions:
+            unit = _Unit("unit.{0}".format(len(self.units)), d.name, self.now, self.durations[d.name].pop(0))
+            self.units.append(unit)
+            units.append(unit)
+        return units
+
+    def wait_units(self, uids, timeout=None):
+        import radical.pilot
+        self.now += timeout
+        for unit in self.units:
+            if unit.state == radical.pilot.EXECUTING and unit.start + unit.duration <= self.now:
+                unit.state = radical.pilot.DONE
+
+    def cancel_units(self, uid):
+        import radical.pilot
+        for unit in self.units:
+            if unit.uid == uid:
+                unit.state = radical.pilot.CANCELED
+                self.canceled.append(uid)
+
+
+class _Pilot(object):
+
+    def __init__(self):
+        import radical.pilot
+        self.state = radical.pilot.ACTIVE
+
+
+class _Resource(object):
+
+    def __init__(self, durations, capacity):
+        self._umgr = _UnitManager(durations)
+        self.capacity = capacity
+        self._pilots = [_Pilot()]
+
+#-----------------------------------------------------------------------------
+#
+class StragglerPolicyTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__threshold(self):
+        """ Tests the straggler threshold of a stage.
+        """
+        policy = StragglerPolicy(quantile=0.5, multiple=3.0, min_fraction=0.5)
+        assert policy.threshold([10, 20], 8) is None
+        assert policy.threshold([10, 20, 30, 40, 50], 8) == 90.0
+        assert policy.threshold([], 0) is None
+
+        with self.assertRaises(EnsemblemdError):
+            StragglerPolicy(quantile=1.5)
+
+    #-------------------------------------------------------------------------
+    #
+    def _run(self, capacity):
+        from radical.ensemblemd.exec_plugins import failure_handler
+        import logging
+
+        resource = _Resource({"a": [10], "b": [10], "c": [10], "d": [100, 10]}, capacity)
+        policy = StragglerPolicy(quantile=0.5, multiple=2.0, poll_interval=10)
+        handler = failure_handler.FailureHandler(resource, None, logging.getLogger("test"), policy)
+
+        clock = failure_handler.time
+        failure_handler.time = resource._umgr
+        try:
+            descriptions = [_Description(n) for n in ["a", "b", "c", "d"]]
+            units = handler.wait_units(handler.submit_units(descriptions))
+        finally:
+            failure_handler.time = clock
+
+        return resource, handler, units
+
+    #-------------------------------------------------------------------------
+    #
+    def test__speculation(self):
+        """ Tests that a straggler is duplicated and the first copy wins.
+        """
+        import radical.pilot
+
+        resource, handler, units = self._run(capacity=8)
+        assert [u.name for u in units] == ["a", "b", "c", "d"]
+        assert units[3].uid == "unit.4"
+        assert resource._umgr.canceled == ["unit.3"]
+        assert resource._umgr.now == 40
+        assert handler.speculated == 1
+        assert all([u.state == radical.pilot.DONE for u in units])
+
+    #-------------------------------------------------------------------------
+    #
+    def test__no_idle_cores(self):
+        """ Tests that stragglers are not duplicated on a busy pilot.
+        """
+        resource, handler, units = self._run(capacity=1)
+        assert units[3].uid == "unit.3"
+        assert resource._umgr.now == 100
+        assert handler.speculated == 0
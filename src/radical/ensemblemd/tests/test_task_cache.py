@@ -0,0 +1,172 @@
+""" Tests cases
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+from radical.ensemblemd.task_cache import TaskCache
+
+#-----------------------------------------------------------------------------
+#
+class TaskCacheTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        self.workdir = tempfile.mkdtemp()
+        self.cache = TaskCache(os.path.join(self.workdir, "cache"))
+
+        self.input = os.path.join(self.workdir, "input.dat")
+        f = open(self.input, "w")
+        f.write("input")
+        f.close()
+
+    def tearDown(self):
+        # clean up after ourselves
+        shutil.rmtree(self.workdir)
+
+    def _fill(self, key, content):
+        pending = self.cache.pending_path(key)
+        os.makedirs(pending)
+        f = open(os.path.join(pending, "out.dat"), "w")
+        f.write(content)
+        f.close()
+        return self.cache.commit(key)
+
+    #-------------------------------------------------------------------------
+    #
+    def test__key(self):
+        """ Tests that the key depends on the description and input contents.
+        """
+        descr = {"executable": "/bin/echo", "arguments": ["a"]}
+        key = self.cache.key(descr, [("input.dat", self.input)])
+
+        assert key == self.cache.key(dict(descr), [("input.dat", self.input)])
+        assert key != self.cache.key({"executable": "/bin/echo", "arguments": ["b"]},
+                                     [("input.dat", self.input)])
+
+        f = open(self.input, "w")
+        f.write("changed")
+        f.close()
+        assert key != self.cache.key(descr, [("input.dat", self.input)])
+
+    #-------------------------------------------------------------------------
+    #
+    def test__commit_lookup(self):
+        """ Tests that committed outputs are found, also by a new cache.
+        """
+        assert self.cache.lookup("abc") is None
+
+        entry = self._fill("abc", "output")
+        assert entry is not None
+        assert self.cache.lookup("abc") == entry
+        assert open(os.path.join(entry, "out.dat")).read() == "output"
+        assert self.cache.size == len("output")
+
+        cache = TaskCache(self.cache.path)
+        assert cache.lookup("abc") == entry
+
+        self.cache.discard("abc")
+        assert self.cache.lookup("abc") == entry
+
+    #-------------------------------------------------------------------------
+    #
+    def test__discard(self):
+        """ Tests that the outputs of failed tasks are not cached.
+        """
+        os.makedirs(self.cache.pending_path("abc"))
+        self.cache.discard("abc")
+
+        assert not os.path.exists(self.cache.pending_path("abc"))
+        assert self.cache.commit("abc") is None
+        assert self.cache.lookup("abc") is None
+
+    #-------------------------------------------------------------------------
+    #
+    def test__evict(self):
+        """ Tests that the least recently used entries are evicted.
+        """
+        self.cache = TaskCache(os.path.join(self.workdir, "small"), max_size=10)
+
+        self._fill("a", "1234")
+        time.sleep(0.01)
+        self._fill("b", "1234")
+        time.sleep(0.01)
+        assert self.cache.lookup("a") is not None
+        time.sleep(0.01)
+        self._fill("c", "1234")
+
+        assert self.cache.lookup("b") is None
+        assert self.cache.lookup("a") is not None
+        assert self.cache.lookup("c") is not None
+        assert self.cache.size == 8
+
+        assert self._fill("d", "12345678901") is None
+
+    #-------------------------------------------------------------------------
+    #
+    def test__memo_upstream(self):
+        """ Tests that tasks reading the outputs of earlier tasks hit the
+            cache in a later session, whose sandbox paths differ.
+        """
+        import logging
+        import radical.pilot
+        from radical.ensemblemd.exec_plugins.memoization import TaskMemo
+
+        class _Object(object):
+            pass
+
+        def session(sandbox):
+            pilot = _Object()
+            pilot.sandbox = sandbox
+            pilot.state = radical.pilot.ACTIVE
+            pilot.stage_in = lambda directives: None
+            resource = _Object()
+            resource._resource_key = "xsede.stampede"
+            resource._pilots = [pilot]
+            resource._pilot = pilot
+            resource._shared_data = None
+            return TaskMemo(self.cache, resource, logging.getLogger("test"))
+
+        def task(name, source=None):
+            cud = _Object()
+            cud.name = name
+            cud.executable = "/bin/" + name
+            cud.arguments = cud.pre_exec = cud.output_staging = None
+            cud.cores, cud.mpi = 1, False
+            cud.input_staging = []
+            if source is not None:
+                cud.input_staging = [{'source': source, 'target': 'in.dat',
+                                      'action': radical.pilot.LINK}]
+            kernel = _Object()
+            kernel.cache_output_data = ["out.dat"]
+            kernel.environment = None
+            return cud, kernel
+
+        def run(memo, cud, kernel, working_directory):
+            assert memo.prepare(cud, kernel) is None
+            f = open(os.path.join(self.cache.pending_path(memo._pending[cud.name]), "out.dat"), "w")
+            f.write(cud.name)
+            f.close()
+            unit = _Object()
+            unit.name, unit.state = cud.name, radical.pilot.DONE
+            unit.working_directory = working_directory
+            memo.complete([unit])
+
+        first = session("sftp://a.org/s1/pilot.0000/")
+        run(first, *(task("produce") + ("file://localhost/s1/pilot.0000/unit.000000/",)))
+        run(first, *(task("consume", "/s1/pilot.0000/unit.000000/out.dat") +
+                     ("file://localhost/s1/pilot.0000/unit.000001/",)))
+
+        # inputs of tasks that are not cached cannot be keyed
+        cud, kernel = task("other", "/s1/pilot.0000/unit.000009/out.dat")
+        assert first.prepare(cud, kernel) is None
+        assert "other" not in first._pending
+
+        second = session("sftp://a.org/s2/pilot.0000/")
+        produced = second.prepare(*task("produce"))
+        assert produced.startswith("sftp://a.org/s2/pilot.0000/staging_area/task_cache/")
+        assert second.prepare(*task("consume", produced + "/out.dat")) is not None
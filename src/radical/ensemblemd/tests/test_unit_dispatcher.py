@@ -0,0 +1,154 @@
+""" Tests cases
+"""
+import os
+import sys
+import unittest
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, cores=1, input_staging=None):
+        self.executable = None
+        self.cores = cores
+        self.input_staging = input_staging
+
+
+class _Kernel(object):
+    """A kernel whose executable lives in a different place on every
+    resource.
+    """
+    name = "misc.sim"
+    _cu_def_pre_exec = ["module load sim"]
+    arguments = ["-v"]
+    uses_mpi = False
+
+    def _bind_to_resource(self, key):
+        self.bound = key
+        self._cu_def_executable = "/{0}/bin/sim".format(key)
+
+
+class _Unit(object):
+
+    def __init__(self, uid):
+        import radical.pilot
+        self.uid = uid
+        self.state = radical.pilot.EXECUTING
+
+
+class _Pilot(object):
+
+    def __init__(self, resource, cores, sandbox):
+        import radical.pilot
+        self.description = {'resource': resource, 'cores': cores}
+        self.state = radical.pilot.ACTIVE
+        self.sandbox = sandbox
+
+
+class _UnitManager(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.units = []
+        self.callbacks = []
+
+    def register_callback(self, cb):
+        self.callbacks.append(cb)
+
+    def submit_units(self, description):
+        unit = _Unit("{0}.unit.{1}".format(self.name, len(self.units)))
+        self.units.append(unit)
+        return unit
+
+    def list_units(self):
+        return [u.uid for u in self.units]
+
+    def finish(self, unit, state):
+        unit.state = state
+        for cb in self.callbacks:
+            cb(unit, state)
+
+#-----------------------------------------------------------------------------
+#
+class UnitDispatcherTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        from collections import OrderedDict
+        from radical.ensemblemd.unit_dispatcher import UnitDispatcher
+        import logging
+
+        self.umgrs = OrderedDict([("a", _UnitManager("a")), ("b", _UnitManager("b"))])
+        self.pilots = OrderedDict([
+            ("a", [_Pilot("a", 2, "sftp://a.org/home/u/rp.session.1/pilot.0000/")]),
+            ("b", [_Pilot("b", 4, "sftp://b.org/home/u/rp.session.1/pilot.0001/")])])
+        self.dispatcher = UnitDispatcher(self.umgrs, self.pilots, logging.getLogger("test"))
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__free_cores(self):
+        """ Tests that units are spread over the free cores of all resources.
+        """
+        units = self.dispatcher.submit_units([_Description() for i in range(6)])
+        resources = [u.uid.split('.')[0] for u in units]
+        assert resources.count("a") == 2
+        assert resources.count("b") == 4
+
+    #-------------------------------------------------------------------------
+    #
+    def test__throughput(self):
+        """ Tests that measured runtimes steer units to the faster resource.
+        """
+        import time
+        import radical.pilot
+
+        cud = _Description()
+        assert self.dispatcher.bind(cud, _Kernel()) == "a"
+        unit = self.dispatcher.submit_units(cud)
+        self.dispatcher._started[unit.uid] = time.time() - 100
+        self.umgrs["a"].finish(unit, radical.pilot.DONE)
+        assert self.dispatcher._runtimes["a"].keys() == ["misc.sim"]
+        assert self.dispatcher._runtimes["a"]["misc.sim"] > 99
+
+        # without measurements b is assumed to be as fast as a
+        assert self.dispatcher.bind(_Description(), _Kernel()) == "a"
+
+        self.dispatcher._runtimes["b"]["misc.sim"] = 10
+        assert self.dispatcher.bind(_Description(), _Kernel()) == "b"
+        assert self.dispatcher.throughput["a"] > 0
+        assert self.dispatcher.throughput["b"] == 0
+
+    #-------------------------------------------------------------------------
+    #
+    def test__affinity(self):
+        """ Tests that units run where the data they link to is.
+        """
+        import radical.pilot
+
+        cud = _Description(input_staging=[
+            {'source': 'staging:///shared.dat', 'target': 'shared.dat', 'action': radical.pilot.LINK},
+            {'source': '/home/u/rp.session.1/pilot.0000/unit.0001/out.dat', 'target': 'in.dat',
+             'action': radical.pilot.COPY}])
+
+        for i in range(8):
+            assert self.dispatcher.place(cud) == "a"
+
+    #-------------------------------------------------------------------------
+    #
+    def test__bind(self):
+        """ Tests that kernels are bound to the selected resource.
+        """
+        kernel = _Kernel()
+        cud = _Description()
+        key = self.dispatcher.bind(cud, kernel)
+        assert kernel.bound == key
+        assert cud.executable == "/{0}/bin/sim".format(key)
+
+        unit = self.dispatcher.submit_units(cud)
+        assert unit.uid.startswith(key)
+        assert self.dispatcher._bound == {}
@@ -0,0 +1,180 @@
+""" Tests cases
+"""
+import os
+import sys
+import logging
+import unittest
+
+from radical.ensemblemd.exceptions import EnsemblemdError, WalltimeError
+from radical.ensemblemd.walltime_policy import WalltimePolicy, RuntimeEstimates
+
+#-----------------------------------------------------------------------------
+#
+class _Description(object):
+
+    def __init__(self, name, executable="/bin/sim", cores=1):
+        self.name = name
+        self.executable = executable
+        self.cores = cores
+
+
+class _Unit(object):
+
+    def __init__(self, uid, description):
+        self.uid = uid
+        self.name = description.name
+        self.state_history = []
+
+
+class _UnitManager(object):
+    # units run for the given seconds when finish() is called
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.callbacks = []
+        self.submitted = []
+
+    def register_callback(self, cb):
+        self.callbacks.append(cb)
+
+    def submit_units(self, descriptions):
+        if not isinstance(descriptions, list):
+            return self.submit_units([descriptions])[0]
+        units = []
+        for d in descriptions:
+            unit = _Unit("unit.{0}".format(len(self.submitted)), d)
+            self.submitted.append(unit)
+            units.append(unit)
+        return units
+
+    def finish(self):
+        import radical.pilot
+        from radical.ensemblemd.local_unit_manager import LocalState
+        for unit in self.submitted:
+            unit.state_history = [LocalState(radical.pilot.EXECUTING, 100.0),
+                                  LocalState(radical.pilot.DONE, 100.0 + self.runtime)]
+            for cb in self.callbacks:
+                cb(unit, radical.pilot.DONE)
+
+
+class _Pilot(object):
+
+    def __init__(self):
+        import radical.pilot
+        self.state = radical.pilot.ACTIVE
+
+
+class _Resource(object):
+
+    def __init__(self, runtime, remaining):
+        self._umgr = _UnitManager(runtime)
+        self._pilots = [_Pilot()]
+        self._runtimes = RuntimeEstimates()
+        self.walltime_policy = WalltimePolicy(margin=10, safety=0.0)
+        self.remaining_walltime = remaining
+
+#-----------------------------------------------------------------------------
+#
+class WalltimePolicyTestCases(unittest.TestCase):
+    # silence deprecation warnings under py3
+
+    def setUp(self):
+        # clean up fragments from previous tests
+        pass
+
+    def tearDown(self):
+        # clean up after ourselves
+        pass
+
+    #-------------------------------------------------------------------------
+    #
+    def test__policy(self):
+        """ Tests the admission test and the runtime estimates.
+        """
+        policy = WalltimePolicy(margin=60, safety=0.5)
+        assert policy.admits(None, 10) is True
+        assert policy.admits(100, None) is True
+        assert policy.admits(100, 210) is True
+        assert policy.admits(100, 209) is False
+
+        with self.assertRaises(EnsemblemdError):
+            WalltimePolicy(margin=-1)
+
+        estimates = RuntimeEstimates()
+        estimates.record(_Description("sim ;1 ;1"), 30.0)
+        estimates.record(_Description("sim ;1 ;12"), 50.0)
+        assert estimates.estimate(_Description("sim ;2 ;3")) == 50.0
+        assert estimates.estimate(_Description("sim ;2 ;3", cores=16)) is None
+        assert estimates.estimate(_Description("ana ;2 ;3")) is None
+
+    #-------------------------------------------------------------------------
+    #
+    def test__admission(self):
+        """ Tests that the FailureHandler refuses tasks that cannot finish.
+        """
+        from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+
+        resource = _Resource(runtime=100, remaining=500)
+        failures = FailureHandler(resource, None, logging.getLogger("test"))
+
+        # unknown kernels are admitted, their runtimes recorded
+        failures.submit_units([_Description("sim ;1 ;{0}".format(i)) for i in range(4)])
+        resource._umgr.finish()
+        assert resource._runtimes.estimate(_Description("sim ;2 ;1")) == 100
+
+        resource.remaining_walltime = 105
+        failures.submit_units(_Description("ana ;1 ;1"))
+
+        with self.assertRaises(WalltimeError):
+            failures.submit_units([_Description("ana ;2 ;1"), _Description("sim ;2 ;1")])
+        assert isinstance(failures.error, WalltimeError)
+        assert len(resource._umgr.submitted) == 5
+
+    #-------------------------------------------------------------------------
+    #
+    def test__active_since(self):
+        """ Tests that the walltime is counted from the time a pilot became
+            active according to its state history.
+        """
+        import datetime
+        import radical.pilot
+        from radical.ensemblemd.local_unit_manager import LocalState
+        from radical.ensemblemd.walltime_policy import active_since
+
+        queued, active = _Pilot(), _Pilot()
+        queued.state = radical.pilot.PENDING_ACTIVE
+        queued.state_history = [LocalState(radical.pilot.PENDING_ACTIVE, 50.0)]
+        active.state_history = [LocalState(radical.pilot.PENDING_ACTIVE, 50.0),
+                                LocalState(radical.pilot.ACTIVE, 100.0)]
+        assert active_since([]) is None
+        assert active_since([queued]) is None
+        assert active_since([queued, active]) == 100.0
+
+        active.state_history[1] = LocalState(radical.pilot.ACTIVE, datetime.datetime(1970, 1, 1, 0, 2))
+        assert active_since([queued, active]) == 120.0
+
+    #-------------------------------------------------------------------------
+    #
+    def test__single_callback(self):
+        """ Tests that the FailureHandlers of successive runs share a single
+            unit state callback and drop out of it once released.
+        """
+        import gc
+        from radical.ensemblemd.exec_plugins.failure_handler import FailureHandler
+
+        resource = _Resource(runtime=100, remaining=None)
+        handlers = []
+        for run in range(3):
+            failures = FailureHandler(resource, None, logging.getLogger("test"))
+            failures.submit_units(_Description("sim ;{0} ;1".format(run)))
+            handlers.append(failures)
+        assert len(resource._umgr.callbacks) == 1
+
+        # every unit is recorded once, by the handler that submitted it
+        resource._umgr.finish()
+        key = resource._runtimes.signature(_Description("sim ;1 ;1"))
+        assert resource._runtimes._runtimes[key] == (3, 100)
+
+        del handlers, failures
+        gc.collect()
+        assert len(resource._unit_state_dispatcher) == 0
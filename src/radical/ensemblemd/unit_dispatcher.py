@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+
+"""Dispatching of compute units to the pilots of several resources.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import time
+import urlparse
+import threading
+import radical.pilot
+
+# Weight of a new runtime sample in the runtime estimate of a resource
+RUNTIME_SMOOTHING = 0.3
+
+FINAL_STATES = [radical.pilot.DONE, radical.pilot.FAILED, radical.pilot.CANCELED]
+
+# ------------------------------------------------------------------------------
+#
+class UnitDispatcher(object):
+    """Provides the unit manager interface the execution plugins use on top
+    of one unit manager per resource. Every unit is bound to one resource
+    before it is submitted: to the resource that holds the working
+    directories it links or copies from, otherwise to the resource that is
+    expected to finish it first. The estimate uses the free cores of each
+    resource and the runtimes measured for the unit's kernel there. The
+    executable of a kernel differs per resource, so runtimes are kept by
+    kernel name.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, umgrs, pilots, logger):
+        """Creates a new UnitDispatcher.
+
+        Arguments:
+        umgrs - dictionary of resource key -> UnitManager
+        pilots - dictionary of resource key -> list of pilots of the resource
+        logger - the execution context's logger
+        """
+        self._umgrs = umgrs
+        self._pilots = pilots
+        self._logger = logger
+        self._lock = threading.RLock()
+
+        # id(description) -> (description, resource key, kernel name) of the
+        # units that are bound but not submitted yet, and of the submitted
+        # units that are not done and may be resubmitted
+        self._bound = {}
+        self._placed = {}
+        # uid -> (resource key, cores, id(description), kernel name) of units
+        # that are not final
+        self._running = {}
+        # uid -> time the unit started executing
+        self._started = {}
+        # resource key -> {kernel name: runtime estimate in seconds}
+        self._runtimes = dict([(key, {}) for key in umgrs])
+        # resource key -> number of units done
+        self._done = dict([(key, 0) for key in umgrs])
+        self._created = time.time()
+
+        for umgr in umgrs.values():
+            umgr.register_callback(self._state_cb)
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def throughput(self):
+        """Returns the units completed per hour on every resource.
+        """
+        hours = max(time.time() - self._created, 1.0) / 3600.0
+        return dict([(key, done / hours) for key, done in self._done.items()])
+
+    # --------------------------------------------------------------------------
+    #
+    def bind(self, cud, kernel):
+        """Selects the resource a unit runs on, binds its kernel to the
+        resource and sets the resource specific parts of the description.
+
+        Returns:
+        resource_key - the resource the unit is submitted to
+        """
+        key = self.place(cud, kernel)
+        kernel._bind_to_resource(key)
+
+        cud.pre_exec   = kernel._cu_def_pre_exec
+        cud.executable = kernel._cu_def_executable
+        cud.arguments  = kernel.arguments
+        cud.mpi        = kernel.uses_mpi
+
+        with self._lock:
+            self._bound[id(cud)] = (cud, key, _runtime_name(cud, kernel))
+        return key
+
+    # --------------------------------------------------------------------------
+    #
+    def place(self, cud, kernel=None):
+        """Returns the resource a unit should run on.
+
+        Arguments:
+        cud - the unit description
+        kernel - the kernel of the unit, if known
+        """
+        key = self._affinity(cud)
+        if key is not None:
+            return key
+
+        cores = cud.cores or 1
+        name = _runtime_name(cud, kernel)
+        best, best_finish = None, None
+        with self._lock:
+            for key in self._umgrs:
+                finish = self._finish_time(key, cores, name)
+                if finish is not None and (best is None or finish < best_finish):
+                    best, best_finish = key, finish
+
+        if best is None:
+            # all pilots are gone, let the unit fail on the first resource
+            best = self._umgrs.keys()[0]
+        return best
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_units(self, descriptions):
+        """Submits one or a list of unit descriptions to the unit managers of
+        the resources they were bound to, like UnitManager.submit_units().
+        """
+        if not isinstance(descriptions, list):
+            return self.submit_units([descriptions])[0]
+
+        units = []
+        with self._lock:
+            for cud in descriptions:
+                # descriptions resubmitted by the failure handler go to the
+                # resource they were bound to before
+                bound = self._bound.pop(id(cud), None) or self._placed.get(id(cud))
+                if bound is not None:
+                    key, name = bound[1], bound[2]
+                else:
+                    key, name = self.place(cud), _runtime_name(cud, None)
+                self._placed[id(cud)] = (cud, key, name)
+
+                unit = self._umgrs[key].submit_units(cud)
+                self._running[unit.uid] = (key, cud.cores or 1, id(cud), name)
+                units.append(unit)
+
+        return units
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_units(self, uids=None, state=None, timeout=None):
+        """Waits for units on all resources, like UnitManager.wait_units().
+        """
+        if uids is not None and not isinstance(uids, list):
+            uids = [uids]
+
+        start = time.time()
+        for key, umgr in self._umgrs.items():
+            remaining = None
+            if timeout is not None:
+                remaining = max(0, timeout - (time.time() - start))
+
+            if uids is None:
+                umgr.wait_units(state=state, timeout=remaining)
+            else:
+                mine = [uid for uid in uids if self._resource_of(uid) == key]
+                if mine:
+                    umgr.wait_units(mine, state=state, timeout=remaining)
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_units(self, uids):
+        """Cancels units on the resources they run on.
+        """
+        if not isinstance(uids, list):
+            uids = [uids]
+
+        for key, umgr in self._umgrs.items():
+            mine = [uid for uid in uids if self._resource_of(uid) == key]
+            if mine:
+                umgr.cancel_units(mine)
+
+    # --------------------------------------------------------------------------
+    #
+    def register_callback(self, callback):
+        """Registers a unit state callback with the unit managers of all
+        resources.
+        """
+        for umgr in self._umgrs.values():
+            umgr.register_callback(callback)
+
+    # --------------------------------------------------------------------------
+    #
+    def _resource_of(self, uid):
+        with self._lock:
+            if uid in self._running:
+                return self._running[uid][0]
+        # final units are looked up in the unit managers
+        for key, umgr in self._umgrs.items():
+            if uid in umgr.list_units():
+                return key
+        return None
+
+    # --------------------------------------------------------------------------
+    #
+    def _state_cb(self, unit, state):
+        """Measures the runtimes of the units of every resource.
+        """
+        with self._lock:
+            if state == radical.pilot.EXECUTING:
+                self._started[unit.uid] = time.time()
+
+            if state not in FINAL_STATES or unit.uid not in self._running:
+                return
+
+            key, cores, descr, name = self._running.pop(unit.uid)
+            started = self._started.pop(unit.uid, None)
+            if state != radical.pilot.DONE:
+                return
+
+            self._placed.pop(descr, None)
+            self._done[key] += 1
+            if started is not None:
+                runtime = time.time() - started
+                estimate = self._runtimes[key].get(name)
+                if estimate is not None:
+                    runtime = RUNTIME_SMOOTHING * runtime + (1 - RUNTIME_SMOOTHING) * estimate
+                self._runtimes[key][name] = runtime
+
+    # --------------------------------------------------------------------------
+    #
+    def _affinity(self, cud):
+        """Returns the resource whose pilot sandbox holds the sources of the
+        unit's linked or copied input data, or None.
+        """
+        for d in cud.input_staging or []:
+            if not isinstance(d, dict) or d.get('action') not in [radical.pilot.LINK, radical.pilot.COPY]:
+                continue
+            if d['source'].startswith('staging://'):
+                # shared data is staged to every pilot
+                continue
+
+            path = urlparse.urlparse(d['source']).path
+            for key, pilots in self._pilots.items():
+                for pilot in pilots:
+                    sandbox = urlparse.urlparse(str(pilot.sandbox)).path
+                    if sandbox and path.startswith(sandbox):
+                        return key
+        return None
+
+    # --------------------------------------------------------------------------
+    #
+    def _finish_time(self, key, cores, name):
+        """Returns the time until a unit of the given size would finish on a
+        resource, or None if the resource has no usable pilots.
+        """
+        pilots = [p for p in self._pilots[key] if p.state not in FINAL_STATES]
+        capacity = sum([p.description['cores'] for p in pilots])
+        if capacity == 0:
+            return None
+
+        load = cores + sum([c for (k, c, d, e) in self._running.values() if k == key])
+        load += sum([(cud.cores or 1) for (cud, k, n) in self._bound.values() if k == key])
+
+        runtime = self._runtime(key, name)
+        finish = runtime * (1 + max(0, load - capacity) / float(capacity))
+
+        # units wait for a pilot in the queue at least one runtime
+        if not [p for p in pilots if p.state == radical.pilot.ACTIVE]:
+            finish += runtime
+        return finish
+
+    # --------------------------------------------------------------------------
+    #
+    def _runtime(self, key, name):
+        """Returns the runtime estimate of a kernel on a resource. Without
+        measurements on the resource, the mean of the other resources is
+        used, or 1 if the kernel has not run anywhere.
+        """
+        if name in self._runtimes[key]:
+            return self._runtimes[key][name]
+
+        known = [r[name] for r in self._runtimes.values() if name in r]
+        if known:
+            return sum(known) / len(known)
+        return 1.0
+
+
+# ------------------------------------------------------------------------------
+#
+def _runtime_name(cud, kernel):
+    """Returns the name the runtimes of a unit are kept under: the name of
+    its kernel, or the executable of units that were not bound by the
+    dispatcher.
+    """
+    if kernel is not None:
+        return kernel.name
+    return cud.executable
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""Walltime policy for the admission of tasks to a pilot of limited walltime.
+"""
+
+__author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
+__copyright__ = "Copyright 2016, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import re
+import threading
+import radical.pilot
+
+from radical.ensemblemd.exceptions import EnsemblemdError
+from radical.ensemblemd.profiler import epoch_seconds
+
+#-------------------------------------------------------------------------------
+#
+class WalltimePolicy(object):
+    """A walltime policy keeps an execution context from starting work that
+       cannot finish before the pilots reach their walltime.
+
+       The execution context records the runtime of every finished task
+       under the signature of its kernel (see RuntimeEstimates). A task is
+       only admitted if the longest runtime recorded for its signature,
+       increased by `safety` and `margin` seconds, is shorter than the
+       remaining walltime. Tasks without estimate are always admitted. The
+       SimulationAnalysisLoop plugins apply the same test to the walltime
+       used by the previous iterations before starting the next one.
+
+       When a task or iteration is not admitted, the run stops cleanly: the
+       stages completed so far are kept in the pattern's checkpoint_file and
+       run(pattern, resume=True) continues from there in a new allocation.
+
+       Example::
+
+            cluster.walltime_policy = WalltimePolicy(margin=120)
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self, margin=60, safety=0.1):
+        """Creates a new WalltimePolicy instance.
+
+        Arguments:
+        margin - seconds kept free at the end of the walltime, e.g. for
+        output staging
+        safety - fraction added to the runtime estimates
+        """
+        if margin < 0 or safety < 0:
+            raise EnsemblemdError(
+                msg="Walltime margin and safety must not be negative.")
+
+        self.margin = margin
+        self.safety = safety
+
+    #---------------------------------------------------------------------------
+    #
+    def admits(self, estimate, remaining):
+        """Returns True if work of the given estimated runtime can finish in
+        the remaining walltime.
+
+        Arguments:
+        estimate - estimated runtime in seconds, None if unknown
+        remaining - remaining walltime in seconds, None if unlimited
+        """
+        if estimate is None or remaining is None:
+            return True
+        return estimate * (1.0 + self.safety) + self.margin <= remaining
+
+
+#-------------------------------------------------------------------------------
+#
+def active_since(pilots):
+    """Returns the time in seconds the first of the pilots became active,
+    taken from their state histories, or None if none has been active.
+
+    Arguments:
+    pilots - list of pilots
+    """
+    times = []
+    for pilot in pilots or []:
+        for entry in getattr(pilot, 'state_history', None) or []:
+            if entry.state == radical.pilot.ACTIVE:
+                times.append(epoch_seconds(entry.timestamp))
+    if not times:
+        return None
+    return min(times)
+
+
+#-------------------------------------------------------------------------------
+#
+class RuntimeEstimates(object):
+    """Runtimes of finished tasks per kernel signature. The signature of a
+       task is its name with all numbers removed, its executable and its
+       cores, so that the instances and iterations of a kernel share it.
+    """
+
+    #---------------------------------------------------------------------------
+    #
+    def __init__(self):
+        self._lock = threading.Lock()
+        # signature -> (number of runtimes, longest runtime)
+        self._runtimes = {}
+
+    #---------------------------------------------------------------------------
+    #
+    @staticmethod
+    def signature(cud):
+        """Returns the kernel signature of a unit description.
+        """
+        name = re.sub(r'\d+', '#', getattr(cud, 'name', None) or '')
+        return (name, getattr(cud, 'executable', None), getattr(cud, 'cores', None) or 1)
+
+    #---------------------------------------------------------------------------
+    #
+    def record(self, cud, runtime):
+        """Records the runtime in seconds of a finished task.
+        """
+        key = self.signature(cud)
+        with self._lock:
+            count, longest = self._runtimes.get(key, (0, 0.0))
+            self._runtimes[key] = (count + 1, max(longest, runtime))
+
+    #---------------------------------------------------------------------------
+    #
+    def estimate(self, cud):
+        """Returns the longest runtime recorded for the kernel of a unit
+        description, or None.
+        """
+        with self._lock:
+            if self.signature(cud) not in self._runtimes:
+                return None
+            return self._runtimes[self.signature(cud)][1]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""
+.. module:: namd_energy_index
+.. moduleauthor::  <antons.treikalis@rutgers.edu>
+"""
+
+__copyright__ = "Copyright 2013-2014, http://radical.rutgers.edu"
+__license__ = "MIT"
+
+import os
+import sys
+import struct
+
+# (replica, cycle, temperature, potential) - must match ENERGY_RECORD_FORMAT
+# of radical.ensemblemd.patterns.replica_exchange
+ENERGY_RECORD_FORMAT = "<iidd"
+
+#-------------------------------------------------------------------------------
+#
+def write_energy_record(table_name, replica_id, cycle, temperature, potential):
+    """Writes the energy record of one replica into the energy table of the
+    current cycle. Every replica owns a fixed-width slot at offset
+    replica_id * record size, so MD tasks finishing in any order can write
+    concurrently without locking.
+
+    Arguments:
+    table_name - path to the energy table in the staging area
+    replica_id - id of the replica
+    cycle - current cycle
+    temperature - replica temperature
+    potential - replica potential energy
+    """
+    record = struct.pack(ENERGY_RECORD_FORMAT, int(replica_id), int(cycle),
+                         float(temperature), float(potential))
+
+    fd = os.open(table_name, os.O_WRONLY | os.O_CREAT, 0644)
+    try:
+        os.lseek(fd, len(record) * int(replica_id), os.SEEK_SET)
+        os.write(fd, record)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    """This module is executed after the MD run of a replica. It reads
+    temperature and potential energy from the .history file and adds them to
+    the energy table of the cycle, so exchange tasks do not have to open the
+    .history files of all replicas.
+    """
+
+    history_name = str(sys.argv[1])
+    table_name = str(sys.argv[2])
+    replica_id = int(sys.argv[3])
+    replica_cycle = int(sys.argv[4])
+
+    f = open(history_name)
+    data = f.readline().split()
+    f.close()
+
+    write_energy_record(table_name, replica_id, replica_cycle,
+                        float(data[0]), float(data[1]))
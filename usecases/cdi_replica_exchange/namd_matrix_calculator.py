@@ -10,6 +10,11 @@ __license__ = "MIT"
 
 import os
 import sys
+import mmap
+import struct
+
+# (replica, cycle, temperature, potential) - must match namd_energy_index.py
+ENERGY_RECORD_FORMAT = "<iidd"
 
 #-------------------------------------------------------------------------------
 #
@@ -65,6 +70,73 @@ def get_historical_data(history_name):
     os.chdir(home_dir)
     return float(data[0]), float(data[1]), path_to_replica_folder
 
+#-------------------------------------------------------------------------------
+#
+def read_energy_table(table_name, replicas):
+    """Reads temperatures and potential energies of all replicas from the 
+    energy table of a cycle, which is written by the MD tasks (see 
+    namd_energy_index.py). The table is memory-mapped and read in one pass.
+
+    Arguments:
+    table_name - path to the energy table in the staging area
+    replicas - number of replicas
+
+    Returns:
+    temperatures - list of replica temperatures, None for missing records
+    energies - list of replica potential energies, None for missing records
+    """
+    temperatures = [None]*replicas
+    energies = [None]*replicas
+    record_size = struct.calcsize(ENERGY_RECORD_FORMAT)
+
+    f = open(table_name, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return temperatures, energies
+        table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+    try:
+        for j in range(min(replicas, size // record_size)):
+            rid, cycle, temperature, potential = \
+                struct.unpack_from(ENERGY_RECORD_FORMAT, table, j*record_size)
+            # slots of replicas that did not report are zero-filled holes
+            if rid == j and temperature != 0.0:
+                temperatures[j] = temperature
+                energies[j] = potential
+    finally:
+        table.close()
+
+    return temperatures, energies
+
+#-------------------------------------------------------------------------------
+#
+def write_swap_column(swap_data, replicas, replica_id, swap_column):
+    """Writes the swap matrix column of one replica into the swap data file 
+    of the current cycle, which is shared by the exchange tasks of all 
+    replicas. The file is extended to its full size by whichever task comes 
+    first; every task then writes its own row with a single positioned write,
+    so no locking is needed.
+
+    Arguments:
+    swap_data - path to the swap data file in the staging area
+    replicas - number of replicas
+    replica_id - id of this replica, used as row index
+    swap_column - list of dimension-less energies of this replica
+    """
+    row_size = 8 * replicas
+    fd = os.open(swap_data, os.O_RDWR | os.O_CREAT, 0644)
+    try:
+        if os.fstat(fd).st_size < row_size * replicas:
+            os.ftruncate(fd, row_size * replicas)
+        os.lseek(fd, row_size * int(replica_id), os.SEEK_SET)
+        os.write(fd, struct.pack('<%dd' % replicas, *swap_column))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 #-------------------------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -78,24 +150,30 @@ if __name__ == '__main__':
     replica_cycle = str(sys.argv[2])
     replicas = int(str(sys.argv[3]))
     base_name = str(sys.argv[4])
+    # optional: name of the per-cycle swap data file in the staging area
+    if len(sys.argv) > 5:
+        swap_data = str(sys.argv[5])
+    else:
+        swap_data = None
 
     pwd = os.getcwd()
 
-    # getting history data for self
-    history_name = base_name + "_" + \
-                   replica_id + "_" + \
-                   replica_cycle + ".history"
-    replica_temp, \
-    replica_energy, \
-    path_to_replica_folder = get_historical_data( history_name )
+    # getting energy data for all replicas from the energy table of this
+    # cycle, falling back to .history files of replicas missing in the table
+    table_name = os.path.join("..", "staging_area", \
+                              "energies_" + replica_cycle + ".dat")
+    if os.path.exists(table_name):
+        temperatures, energies = read_energy_table(table_name, replicas)
+    else:
+        temperatures = [None]*replicas
+        energies = [None]*replicas
 
-    # getting history data for all replicas
     # we rely on the fact that last cycle for every replica is the same, 
     # e.g. == replica_cycle but this is easily changeble for arbitrary cycle 
     # numbers
-    temperatures = [0.0]*replicas
-    energies = [0.0]*replicas
     for j in range(replicas):
+        if temperatures[j] is not None:
+            continue
         history_name = base_name + "_" + str(j) + "_" + \
                        replica_cycle + ".history" 
         try:
@@ -103,7 +181,10 @@ if __name__ == '__main__':
             temperatures[j] = rj_temp
             energies[j] = rj_energy
         except:
-             pass 
+            temperatures[j] = 0.0
+            energies[j] = 0.0
+
+    replica_energy = energies[int(replica_id)]
 
     # init swap column
     swap_column = [0.0]*replicas
@@ -111,6 +192,13 @@ if __name__ == '__main__':
     for j in range(replicas):        
         swap_column[j] = reduced_energy(temperatures[j], replica_energy)
 
+    #---------------------------------------------------------------------------
+    # writing to the shared swap data file
+    if swap_data is not None:
+        write_swap_column(os.path.join("..", "staging_area", swap_data), \
+                          replicas, replica_id, swap_column)
+        sys.exit(0)
+
     #---------------------------------------------------------------------------
     # writing to file
     outfile = "matrix_column_{cycle}_{replica}.dat"\
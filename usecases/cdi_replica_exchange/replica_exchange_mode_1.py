@@ -10,7 +10,6 @@ import os
 import sys
 import json
 import math
-import random
 import pprint
 import optparse
 from os import path
@@ -20,6 +19,7 @@ from radical.ensemblemd import EnsemblemdError
 from radical.ensemblemd import SingleClusterEnvironment
 from radical.ensemblemd.patterns.replica_exchange import Replica
 from radical.ensemblemd.patterns.replica_exchange import ReplicaExchange
+from radical.ensemblemd.patterns.replica_exchange import render_template
 
 #-------------------------------------------------------------------------------
 #
@@ -123,6 +123,11 @@ class RePattern(ReplicaExchange):
 		params_url = 'file://%s' % (params_path)
 		self.shared_urls.append(params_url)
 
+		# script adding replica energies to the energy table of a cycle
+		index_path = self.work_dir_local + "/namd_energy_index.py"
+		self.shared_files.append("namd_energy_index.py")
+		self.shared_urls.append('file://%s' % (index_path))
+
 	# --------------------------------------------------------------------------
 	#
 	def initialize_replicas(self):
@@ -190,6 +195,28 @@ class RePattern(ReplicaExchange):
 			coordinates = self.namd_coordinates
 			parameters = self.namd_parameters
 
+		# values of the tokens in main replica input file
+		tokens = {
+			"swap":        replica.swap,
+			"ot":          replica.old_temperature,
+			"nt":          replica.new_temperature,
+			"steps":       self.cycle_steps,
+			"rid":         replica.id,
+			"somename":    outputname,
+			"oldname":     old_name,
+			"cycle":       replica.cycle,
+			"firststep":   first_step,
+			"history":     historyname,
+			"structure":   structure,
+			"coordinates": coordinates,
+			"parameters":  parameters
+		}
+
+		# with an input template the file is rendered on the target resource
+		if self.input_template is not None:
+			replica.input_parameters = tokens
+			return
+
 		# substituting tokens in main replica input file 
 		try:
 			r_file = open( (os.path.join((self.work_dir_local + "/namd_inp/"), \
@@ -200,19 +227,7 @@ class RePattern(ReplicaExchange):
 		tbuffer = r_file.read()
 		r_file.close()
 
-		tbuffer = tbuffer.replace("@swap@",str(replica.swap))
-		tbuffer = tbuffer.replace("@ot@",str(replica.old_temperature))
-		tbuffer = tbuffer.replace("@nt@",str(replica.new_temperature))
-		tbuffer = tbuffer.replace("@steps@",str(self.cycle_steps))
-		tbuffer = tbuffer.replace("@rid@",str(replica.id))
-		tbuffer = tbuffer.replace("@somename@",str(outputname))
-		tbuffer = tbuffer.replace("@oldname@",str(old_name))
-		tbuffer = tbuffer.replace("@cycle@",str(replica.cycle))
-		tbuffer = tbuffer.replace("@firststep@",str(first_step))
-		tbuffer = tbuffer.replace("@history@",str(historyname))
-		tbuffer = tbuffer.replace("@structure@", str(structure))
-		tbuffer = tbuffer.replace("@coordinates@", str(coordinates))
-		tbuffer = tbuffer.replace("@parameters@", str(parameters))
+		tbuffer = render_template(tbuffer, tokens)
 		
 		# write out
 		try:
@@ -256,11 +271,20 @@ class RePattern(ReplicaExchange):
 		copy_out.append(new_vel)
 		copy_out.append(new_ext_system)
 
+		energy_table = "../staging_area/" + \
+					   self.energy_table_file(replica.cycle)
+
 		k = Kernel(name="md.namd")
 		k.arguments            = [input_file]
-		k.upload_input_data    = [str(input_file)] 
+		if self.input_template is not None:
+			k.pre_exec = [self.template_input_command(input_file, \
+													   replica.input_parameters)]
+		else:
+			k.upload_input_data = [str(input_file)]
 		k.copy_output_data = copy_out
 		k.download_output_data = new_history
+		k.post_exec = ["python namd_energy_index.py %s %s %d %d" % \
+					   (new_history, energy_table, replica.id, replica.cycle)]
 
 		replica.cycle += 1
 		return k
@@ -283,15 +307,23 @@ class RePattern(ReplicaExchange):
 		matrix_col = "matrix_column_{cycle}_{replica}.dat"\
 					 .format(cycle=replica.cycle-1, replica=replica.id )
 
-		k = Kernel(name="md.re_exchange")
-		k.arguments = ["--calculator=namd_matrix_calculator.py", 
-					   "--replica_id=" + str(replica.id), 
-					   "--replica_cycle=" + str(replica.cycle-1), 
-					   "--replicas=" + str(self.replicas), 
-					   "--replica_basename=" + str(basename)]
+		arguments = ["--calculator=namd_matrix_calculator.py", 
+					 "--replica_id=" + str(replica.id), 
+					 "--replica_cycle=" + str(replica.cycle-1), 
+					 "--replicas=" + str(self.replicas), 
+					 "--replica_basename=" + str(basename)]
 
+		k = Kernel(name="md.re_exchange")
 		k.upload_input_data    = "namd_matrix_calculator.py"
-		k.download_output_data = matrix_col
+
+		if self.aggregate_swap_data:
+			# column goes into the shared swap data file of this cycle
+			arguments.append("--swap_data=" + \
+							 self.swap_data_file(replica.cycle-1))
+		else:
+			k.download_output_data = matrix_col
+
+		k.arguments = arguments
 
 		return k
 
@@ -386,27 +418,13 @@ class RePattern(ReplicaExchange):
 			new_item = math.exp(item)
 			new_ps.append(new_item)
 		ps = new_ps
-		# index of swap replica within replicas_waiting list
-		j = len(replicas)
-		while j > (len(replicas) - 1):
-			j = self.weighted_choice_sub(ps)
+		# index of swap replica within replicas list
+		j = self.weighted_choice(ps)
 		
 		# actual replica
 		r_j = replicas[j]
 		return r_j
 
-	#---------------------------------------------------------------------------
-	#
-	def weighted_choice_sub(self, weights):
-		"""Adopted from asyncre-bigjob [1]
-		"""
-
-		rnd = random.random() * sum(weights)
-		for i, w in enumerate(weights):
-			rnd -= w
-			if rnd < 0:
-				return i    
-
 # ------------------------------------------------------------------------------
 #
 if __name__ == "__main__":
@@ -436,6 +454,18 @@ if __name__ == "__main__":
 		# set number of cycles
 		re_pattern.nr_cycles = 3
 
+		# select exchange partners of all replicas in bulk, reproducibly
+		re_pattern.bulk_exchange = "independence"
+		re_pattern.random_seed = 42
+
+		# collect swap matrix columns in a single file per cycle
+		re_pattern.aggregate_swap_data = True
+
+		# template is staged once, input files are rendered by the MD tasks
+		re_pattern.input_template = os.path.join(re_pattern.work_dir_local, \
+												 re_pattern.inp_folder, \
+												 re_pattern.inp_basename)
+
 		# initializing replica objects
 		replicas = re_pattern.initialize_replicas()
 
@@ -213,6 +213,7 @@ if __name__ == "__main__":
       # We set the 'instances' of the analysis step to 1. This means that only
       # one instance of the analysis is executed for each iteration
       randomsa = Gromacs_LSDMap(maxiterations=Kconfig.num_iterations, simulation_instances=Kconfig.num_CUs, analysis_instances=1)
+      randomsa.bundle_simulations = getattr(Kconfig, 'bundle_simulations', False)
 
       cluster.run(randomsa)
 
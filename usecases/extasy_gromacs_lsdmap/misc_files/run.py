@@ -10,13 +10,17 @@ Arguments : --mdp = name of the gromacs parameter file
             --top = name of the topology file
             --gro = name of the coordinate file
             --out = name of the output file
+            --multidir = instance directories of a bundled unit; all
+                         instances run as one 'mdrun -multidir' job
+            --np = number of MPI processes of that job; a bundled unit
+                   is not launched with MPI, this script starts the job
+                   with an MPI build of gromacs (gmx_mpi)
 
 '''
 
 
 import os
 import argparse
-from mpi4py import MPI
 
 def write_script(grofile_name,output_grofile_name,grompp_options,ndxfile_options,mdpfile_name,topfile_name,tprfile_name,size,mdrun_options,trrfile_name,edrfile_name):
     with open('run.sh','w') as file:
@@ -54,36 +58,101 @@ def write_script(grofile_name,output_grofile_name,grompp_options,ndxfile_options
         file.write(script)
 
 
+def write_multidir_script(directories,grofile_name,output_grofile_name,grompp_options,ndxfile_options,mdpfile_name,topfile_name,tprfile_name,size,mdrun_options,trrfile_name,edrfile_name):
+    mdrun_multidir = os.environ.get('mdrun_multidir','mpirun -np %d gmx_mpi mdrun' % size)
+    # the gromacs binary is the word before the mdrun command, if any
+    words = mdrun_multidir.split()
+    mdrun_binary = words[words.index('mdrun')-1] if 'mdrun' in words[1:] else words[-1]
+    dirs = ' '.join(directories)
+    with open('run.sh','w') as file:
+        script="""#!/bin/bash
+        if ! command -v %(mdrun_binary)s >/dev/null; then
+            echo "mdrun -multidir needs an MPI build of gromacs: %(mdrun_binary)s not found" >&2
+            exit 1
+        fi
+
+        dirs="%(dirs)s"
+        startgro=%(grofile_name)s
+        tmpstartgro=tmpstart.gro
+        outgro=%(output_grofile_name)s
+
+        # all instances are expected to hold the same number of frames
+        first=$(echo $dirs | cut -d' ' -f1)
+        natoms=$(sed -n '2p' $first/$startgro)
+        nlines_per_frame=$((natoms+3))
+
+        nlines=`wc -l $first/$startgro| cut -d' ' -f1`
+        nframes=$((nlines/nlines_per_frame))
+
+        for d in $dirs; do rm -rf $d/$outgro; done
+
+        for idx in `seq 1 $nframes`; do
+
+            start=$(($nlines_per_frame*(idx-1)+1))
+            end=$(($nlines_per_frame*idx))
+
+            # gromacs preprocessing in every instance directory
+            for d in $dirs; do
+                (cd $d && sed "$start"','"$end"'!d' $startgro > $tmpstartgro && \
+                 gmx grompp %(grompp_options)s %(ndxfile_options)s -f %(mdpfile_name)s -c $tmpstartgro -p %(topfile_name)s -o %(tprfile_name)s)
+            done
+
+            # MD of all instances in one job
+            %(mdrun_multidir)s -multidir $dirs %(mdrun_options)s -s %(tprfile_name)s -o %(trrfile_name)s -e %(edrfile_name)s
+
+            # store data
+            for d in $dirs; do cat $d/confout.gro >> $d/$outgro; done
+
+        done
+        for d in $dirs; do rm -f $d/$tmpstartgro; done
+        """%locals()
+
+        file.write(script)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mdp',dest='mdpfile_name',required=True,type=str)
+    parser.add_argument('--gro',dest='grofile_name',required=True,type=str)
+    parser.add_argument('--top',dest='topfile_name',required=True,type=str)
+    parser.add_argument('--out',dest='output_grofile_name',required=True,type=str)
+    parser.add_argument('--multidir',dest='directories',nargs='+',default=None)
+    parser.add_argument('--np',dest='np',type=int,default=1)
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
 
-    #initialize mpi variables
-
-    comm = MPI.COMM_WORLD # MPI environment
-    size = comm.Get_size() # number of threads
-    rank = comm.Get_rank() # number of the current thread
-    if rank==0:
-        parser = argparse.ArgumentParser()
-        parser.add_argument('--mdp',dest='mdpfile_name',required=True,type=str)
-        parser.add_argument('--gro',dest='grofile_name',required=True,type=str)
-        parser.add_argument('--top',dest='topfile_name',required=True,type=str)
-        parser.add_argument('--out',dest='output_grofile_name',required=True,type=str)
-        args = parser.parse_args()
-
-        tprfile_name='topol.tpr'
-        trrfile_name='traj.trr'
-        edrfile_name='ener.edr'
-
-        grompp_opts = os.environ.get('grompp_options','')
-        mdrun_opts = os.environ.get('mdrun_options','')
-        ndxfile_name = os.environ.get('ndxfile','')
-        if ndxfile_name is not '':
-            ndxfile_opts = '-n ' +ndxfile_name
-        else:
-            ndxfile_opts = ''
+    args = parse_arguments()
+
+    tprfile_name='topol.tpr'
+    trrfile_name='traj.trr'
+    edrfile_name='ener.edr'
 
-        write_script(args.grofile_name,args.output_grofile_name,grompp_opts,ndxfile_opts,args.mdpfile_name,args.topfile_name,tprfile_name,size,mdrun_opts,trrfile_name,edrfile_name)
+    grompp_opts = os.environ.get('grompp_options','')
+    mdrun_opts = os.environ.get('mdrun_options','')
+    ndxfile_name = os.environ.get('ndxfile','')
+    if ndxfile_name is not '':
+        ndxfile_opts = '-n ' +ndxfile_name
+    else:
+        ndxfile_opts = ''
+
+    if args.directories:
+        # bundled unit, not launched with MPI: mdrun -multidir is the only
+        # MPI job
+        write_multidir_script(args.directories,args.grofile_name,args.output_grofile_name,grompp_opts,ndxfile_opts,args.mdpfile_name,args.topfile_name,tprfile_name,args.np,mdrun_opts,trrfile_name,edrfile_name)
         os.system('sh run.sh')
 
     else:
-        pass
+        #initialize mpi variables
+        from mpi4py import MPI
 
+        comm = MPI.COMM_WORLD # MPI environment
+        size = comm.Get_size() # number of threads
+        rank = comm.Get_rank() # number of the current thread
+        if rank==0:
+            write_script(args.grofile_name,args.output_grofile_name,grompp_opts,ndxfile_opts,args.mdpfile_name,args.topfile_name,tprfile_name,size,mdrun_opts,trrfile_name,edrfile_name)
+            os.system('sh run.sh')
+
+        else:
+            pass
@@ -1,5 +1,8 @@
 import sys
 
+def extract(output):
+	return int(output.splitlines()[7])/25
+	#return int(output.splitlines()[6].strip())/25
+
 if __name__ == '__main__':
-	print (int(sys.stdin.readlines()[7]))/25
-	#print int(sys.stdin.readlines()[6].strip())/25
+	print extract(sys.stdin.read())